@@ -1,14 +1,35 @@
 import os
+import sys
+import stat as stat_module
+import atexit
+import signal
 import json
 import subprocess
 import uuid
 import time
+import shutil
 import threading
-from flask import Flask, request, jsonify, render_template, session
+from collections import OrderedDict
+from urllib.parse import urlencode
+from flask import Flask, request, jsonify, render_template, session, send_file
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
-import requests
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from config import Config
+from auth_cache import TokenCache
+from byusi_client import ByUsiClient
+from build_cache import ArtifactCache, read_project_files
+from run_scheduler import RunScheduler
+from process_runner import run_process
+from sandbox_pool import SandboxPool
+from terminal_mux import terminal_mux
+from terminal_backend import load_terminal_backend
+from output_coalescer import OutputCoalescer
+from terminal_registry import TerminalRegistry
+from user_store import UserDB
+from env_registry import EnvironmentRegistry, directory_size
+from ignore_rules import IgnoreRulesCache
+from workspace_watcher import WorkspaceWatcher
+from usage_stats import UsageStats
 
 # 获取当前文件所在目录
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -26,89 +47,131 @@ app.config['PERMANENT_SESSION_LIFETIME'] = Config.PERMANENT_SESSION_LIFETIME
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode=Config.SOCKETIO_ASYNC_MODE)
 
-# 导入终端绑定
-try:
-    from simple_terminal import start_terminal_session, execute_terminal_command, close_terminal_session
-    CPP_TERMINAL_AVAILABLE = False
-    print("使用简化 Python 终端实现")
-except ImportError as e:
-    print(f"终端模块导入失败: {e}")
-    CPP_TERMINAL_AVAILABLE = False
-
-# ByUsi API 配置
-BYUSI_BASE_URL = "https://api.www.cdifit.cn/user/"
-
-class UserDB:
-    def __init__(self, db_path):
-        self.db_path = db_path
-        self.data = self._load_db()
-    
-    def _load_db(self):
-        if os.path.exists(self.db_path):
-            try:
-                with open(self.db_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"加载数据库失败: {e}")
-                return {}
-        return {}
-    
-    def _save_db(self):
-        try:
-            with open(self.db_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-            return True
-        except Exception as e:
-            print(f"保存数据库失败: {e}")
-            return False
+# 导入终端绑定（按 Config.TERMINAL_BACKEND 选择，不可用时自动回退）
+TERMINAL_BACKEND, terminal_backend = load_terminal_backend(Config.TERMINAL_BACKEND)
+CPP_TERMINAL_AVAILABLE = TERMINAL_BACKEND == 'cpp'
+print(f"使用终端实现: {TERMINAL_BACKEND}")
+
+start_terminal_session = terminal_backend.start_terminal_session
+execute_terminal_command = terminal_backend.execute_terminal_command
+close_terminal_session = terminal_backend.close_terminal_session
+write_terminal_input = terminal_backend.write_terminal_input
+resize_terminal = terminal_backend.resize_terminal
+read_terminal_scrollback = terminal_backend.read_terminal_scrollback
+get_terminal_offset = terminal_backend.get_terminal_offset
+pause_terminal_output = terminal_backend.pause_terminal_output
+resume_terminal_output = terminal_backend.resume_terminal_output
+get_terminal_stats = terminal_backend.get_terminal_stats
+set_terminal_output_listener = terminal_backend.set_terminal_output_listener
+
+def terminal_room(terminal_id):
+    return f"terminal_{terminal_id}"
+
+def push_terminal_output(terminal_id, data, offset):
+    """推送合帧后的终端输出到该终端的 Socket.IO 房间
+
+    data 为原始字节，以二进制帧发送，由客户端流式解码；offset 供客户端确认。
+    """
+    socketio.emit('terminal_output', {'data': data, 'offset': offset}, to=terminal_room(terminal_id))
+
+terminal_coalescer = OutputCoalescer(
+    read_terminal_scrollback,
+    pause_terminal_output,
+    resume_terminal_output,
+    push_terminal_output,
+    Config.TERMINAL_FRAME_RATE,
+    Config.TERMINAL_FRAME_BYTES,
+    Config.TERMINAL_ACK_WINDOW,
+    Config.TERMINAL_BACKLOG_LIMIT,
+    Config.TERMINAL_PAUSE_TIMEOUT
+)
+
+def on_terminal_output(terminal_id, chunk, end_offset):
+    terminal_registry.touch(terminal_id)
+    terminal_coalescer.notify(terminal_id, chunk, end_offset)
+
+set_terminal_output_listener(on_terminal_output)
+
+def close_terminal(terminal_id):
+    """停止推送并关闭终端会话，通知仍在连接的客户端"""
+    terminal_coalescer.detach(terminal_id)
+    for sid, connected_id in list(connected_terminals.items()):
+        if connected_id == terminal_id:
+            connected_terminals.pop(sid, None)
+    socketio.emit('terminal_closed', {'terminal_id': terminal_id}, to=terminal_room(terminal_id))
+    close_terminal_session(terminal_id)
+
+# 登记所有终端会话：断线保留、空闲回收和数量上限
+terminal_registry = TerminalRegistry(
+    close_terminal,
+    Config.TERMINAL_REATTACH_GRACE,
+    Config.TERMINAL_TIMEOUT,
+    Config.MAX_TERMINAL_SESSIONS
+)
+
+# ByUsi API 客户端：共享连接池、超时、重试和熔断
+byusi_client = ByUsiClient(
+    Config.BYUSI_BASE_URL,
+    Config.BYUSI_CONNECT_TIMEOUT,
+    Config.BYUSI_READ_TIMEOUT,
+    Config.BYUSI_MAX_RETRIES,
+    Config.BYUSI_RETRY_BACKOFF,
+    Config.BYUSI_POOL_SIZE,
+    Config.BYUSI_BREAKER_THRESHOLD,
+    Config.BYUSI_BREAKER_RESET
+)
+
+# 各工作区（环境中的 /home/user）的忽略规则（内置默认规则 + .gitignore / .ignore），遍历工作区时跳过被忽略的目录
+ignore_rules = IgnoreRulesCache(Config.IGNORE_DEFAULT_PATTERNS)
+
+class FileManager:
+    @staticmethod
+    def _scan_directory(path):
+        """列出目录内容，返回按目录在前、名称排序的 [(名称, 是否目录)]
+
+        使用 os.scandir 返回的条目类型，不需要额外 stat 每个条目。
+        """
+        entries = []
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                entries.append((entry.name, is_dir))
+        entries.sort(key=lambda item: (not item[1], item[0].lower()))
+        return entries
     
-    def get_user_environment(self, user_id):
-        user_id_str = str(user_id)
-        return self.data.get(user_id_str, {}).get('environment_id')
+    @staticmethod
+    def _file_node(name, relative_path):
+        return {
+            'name': name,
+            'path': relative_path,
+            'type': 'file',
+            'extension': os.path.splitext(name)[1].lower()
+        }
     
-    def set_user_environment(self, user_id, env_id, env_type="proot"):
-        user_id_str = str(user_id)
-        if user_id_str not in self.data:
-            self.data[user_id_str] = {}
-        
-        self.data[user_id_str]['environment_id'] = env_id
-        self.data[user_id_str]['environment_type'] = env_type
-        self.data[user_id_str]['created_at'] = time.time()
-        self.data[user_id_str]['last_used'] = time.time()
-        
-        return self._save_db()
-    
-    def update_last_used(self, user_id):
-        user_id_str = str(user_id)
-        if user_id_str in self.data:
-            self.data[user_id_str]['last_used'] = time.time()
-            return self._save_db()
-        return False
-    
-    def set_proot_initialized(self, user_id, initialized=True):
-        """设置 proot 环境初始化状态"""
-        user_id_str = str(user_id)
-        if user_id_str not in self.data:
-            self.data[user_id_str] = {}
-        
-        self.data[user_id_str]['proot_initialized'] = initialized
-        return self._save_db()
+    @staticmethod
+    def _directory_node(name, relative_path):
+        """未加载内容的目录节点"""
+        return {
+            'name': name,
+            'path': relative_path,
+            'type': 'directory',
+            'children': None
+        }
     
-    def is_proot_initialized(self, user_id):
-        """检查 proot 环境是否已初始化"""
-        user_id_str = str(user_id)
-        return self.data.get(user_id_str, {}).get('proot_initialized', False)
-
-class FileManager:
     @staticmethod
     def get_file_tree(env_path, base_path="/home/user"):
-        """获取文件树结构"""
+        """获取完整的文件树结构（递归遍历所有子目录，跳过被忽略的文件和目录）"""
         full_path = os.path.join(env_path, base_path.lstrip('/'))
         
         if not os.path.exists(full_path):
             return None
         
-        def build_tree(path, relative_path):
+        rules = ignore_rules.get(os.path.join(env_path, "home", "user"))
+        
+        def build_tree(path, relative_path, matcher):
             name = os.path.basename(path)
             if not name:
                 name = "/"
@@ -121,26 +184,71 @@ class FileManager:
             }
             
             try:
-                items = os.listdir(path)
-                for item in sorted(items, key=lambda x: (not os.path.isdir(os.path.join(path, x)), x.lower())):
+                for item, is_dir in FileManager._scan_directory(path):
+                    if matcher.ignored(item, is_dir):
+                        continue
                     item_path = os.path.join(path, item)
                     item_relative_path = os.path.join(relative_path, item)
                     
-                    if os.path.isdir(item_path):
-                        tree['children'].append(build_tree(item_path, item_relative_path))
+                    if is_dir:
+                        tree['children'].append(build_tree(item_path, item_relative_path, matcher.child(item)))
                     else:
-                        tree['children'].append({
-                            'name': item,
-                            'path': item_relative_path,
-                            'type': 'file',
-                            'extension': os.path.splitext(item)[1].lower()
-                        })
+                        tree['children'].append(FileManager._file_node(item, item_relative_path))
             except PermissionError:
                 pass
             
             return tree
         
-        return build_tree(full_path, base_path)
+        return build_tree(full_path, base_path, rules.matcher(full_path))
+    
+    @staticmethod
+    def list_directory(env_path, base_path="/home/user", depth=1, offset=0, limit=200):
+        """按层加载文件树：返回 base_path 下 depth 层的内容，每个目录最多 limit 个条目
+
+        超过 depth 层的目录 children 为 None，由客户端展开时再请求；
+        目录条目超过 limit 时 has_more 为 True，客户端用 offset 请求后续条目。
+        被忽略的条目仍然列出（ignored 为 True），但不会展开到下一层。
+        客户端已连接的环境从 workspace_watcher 的缓存中读取目录内容。
+        路径不存在或不是目录时返回 None。
+        """
+        full_path = os.path.join(env_path, base_path.lstrip('/'))
+        if not os.path.isdir(full_path):
+            return None
+        rules = ignore_rules.get(os.path.join(env_path, "home", "user"))
+        
+        def build_node(path, relative_path, matcher, remaining, start):
+            node = {
+                'name': os.path.basename(relative_path.rstrip('/')) or "/",
+                'path': relative_path,
+                'type': 'directory',
+                'children': [],
+                'offset': start,
+                'total': 0,
+                'has_more': False
+            }
+            try:
+                entries = workspace_watcher.scan_directory(env_path, path, FileManager._scan_directory)
+            except OSError:
+                return node
+            
+            page = entries[start:start + limit]
+            node['total'] = len(entries)
+            node['has_more'] = start + len(page) < len(entries)
+            for item, is_dir in page:
+                item_relative_path = os.path.join(relative_path, item)
+                ignored = matcher.ignored(item, is_dir)
+                if not is_dir:
+                    child = FileManager._file_node(item, item_relative_path)
+                elif remaining > 1 and not ignored:
+                    child = build_node(os.path.join(path, item), item_relative_path, matcher.child(item), remaining - 1, 0)
+                else:
+                    child = FileManager._directory_node(item, item_relative_path)
+                if ignored:
+                    child['ignored'] = True
+                node['children'].append(child)
+            return node
+        
+        return build_node(full_path, base_path, rules.matcher(full_path), max(1, depth), max(0, offset))
     
     @staticmethod
     def create_file(env_path, file_path, content=""):
@@ -170,6 +278,33 @@ class FileManager:
             print(f"创建目录失败: {e}")
             return False
     
+    @staticmethod
+    def resolve_workspace_path(env_path, file_path):
+        """环境中的路径 -> 宿主机上的真实路径，解析 .. 和符号链接后不在工作区（/home/user）内时返回 None"""
+        workspace = os.path.realpath(os.path.join(env_path, "home", "user"))
+        full_path = os.path.realpath(os.path.join(env_path, file_path.lstrip('/')))
+        if full_path != workspace and not full_path.startswith(workspace + os.sep):
+            return None
+        return full_path
+    
+    @staticmethod
+    def stat_file(env_path, file_path):
+        """工作区内普通文件的 os.stat 结果，不存在、不是普通文件或不在工作区内时返回 None"""
+        full_path = FileManager.resolve_workspace_path(env_path, file_path)
+        if full_path is None:
+            return None
+        
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        return stat if stat_module.S_ISREG(stat.st_mode) else None
+    
+    @staticmethod
+    def file_etag(stat):
+        """文件版本标识（修改时间 + 大小），不需要读取文件内容"""
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    
     @staticmethod
     def read_file(env_path, file_path):
         """读取文件内容"""
@@ -202,7 +337,6 @@ class FileManager:
         
         try:
             if os.path.isdir(full_path):
-                import shutil
                 shutil.rmtree(full_path)
             else:
                 os.remove(full_path)
@@ -227,51 +361,36 @@ class FileManager:
 class ByUsiAuth:
     @staticmethod
     def register(username, email, password):
-        data = {
-            "action": "register",
-            "username": username,
-            "email": email,
-            "password": password
-        }
-        try:
-            response = requests.post(f"{BYUSI_BASE_URL}api.php", data=data)
-            return response.json()
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        return byusi_client.call("register", username=username, email=email, password=password)
     
     @staticmethod
     def login(identifier, password):
-        data = {
-            "action": "login",
-            "identifier": identifier,
-            "password": password
-        }
-        try:
-            response = requests.post(f"{BYUSI_BASE_URL}api.php", data=data)
-            return response.json()
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        return byusi_client.call("login", identifier=identifier, password=password)
     
     @staticmethod
     def get_user_info(token):
-        data = {
-            "action": "get_user",
-            "token": token
-        }
-        try:
-            response = requests.post(f"{BYUSI_BASE_URL}api.php", data=data)
-            return response.json()
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        # 网络错误的结果带 transient 标记，不代表 token 无效
+        return byusi_client.call("get_user", token=token)
 
 class ProotEnvironmentManager:
     def __init__(self):
-        self.environments = {}
+        self.registry = EnvironmentRegistry(Config.ENV_REGISTRY_PATH)
+        self.environments = {}  # 已加载的环境，首次访问时从注册表加载
         self.initialization_tasks = {}  # 跟踪初始化任务
+        self.artifact_cache = ArtifactCache(Config.ARTIFACT_CACHE_DIR, Config.ARTIFACT_CACHE_MAX_MB * 1024 * 1024)
+        self.check_cache = OrderedDict()  # 源码哈希 -> cargo check 诊断结果
+        self.check_cache_lock = threading.Lock()
+        self.workspace_locks = {}  # env_id -> 锁，避免多次运行同时改写同一工作区
+        self.check_locks = {}  # env_id -> 锁，同一环境同时只运行一个 cargo check
+        self.workspace_locks_guard = threading.Lock()
+        self.sandbox_pool = SandboxPool(Config.SANDBOX_POOL_SIZE, Config.SANDBOX_IDLE_TIMEOUT)
+        self.proot_available = None
+        self.usage_stats = UsageStats(Config.USAGE_HISTORY_SIZE)
     
     def create_environment(self, user_id):
+        user_id = str(user_id)  # 与注册表中读取的环境一致，user_id 统一为字符串
         env_id = str(uuid.uuid4())
-        user_env_path = os.path.join(Config.PROOT_ENV_BASE, str(user_id), env_id)
+        user_env_path = os.path.join(Config.PROOT_ENV_BASE, user_id, env_id)
         os.makedirs(user_env_path, exist_ok=True)
         
         # 创建简化的环境（不立即初始化完整的 Debian）
@@ -282,12 +401,41 @@ class ProotEnvironmentManager:
             'path': user_env_path,
             'user_id': user_id,
             'created_at': time.time(),
-            'initialized': False  # 标记为未初始化完整环境
+            'initialized': False,  # 标记为未初始化完整环境
+            'size_bytes': directory_size(user_env_path),
+            'size_updated_at': time.time()
         }
         
+        self.registry.add(environment)
         self.environments[env_id] = environment
         return env_id
     
+    def get_environment(self, env_id):
+        """按 ID 获取环境，不存在（或目录已删除）时返回 None"""
+        env = self.environments.get(env_id)
+        if env is not None and not os.path.isdir(env['path']):
+            self.delete_environment(env_id)
+            return None
+        if env is None and env_id:
+            env = self.registry.get(env_id)
+            if not env or not os.path.isdir(env['path']):
+                return None
+            env['user_id'] = str(env['user_id'])
+            # 并发加载时保留先加载的对象，后续修改都作用在同一个字典上
+            env = self.environments.setdefault(env_id, env)
+        return env
+    
+    def delete_environment(self, env_id):
+        """删除环境：结束常驻的沙箱进程，从内存和注册表中移除并删除目录"""
+        self.sandbox_pool.close_environment(env_id)
+        env = self.environments.pop(env_id, None) or self.registry.get(env_id)
+        self.registry.remove(env_id)
+        with self.workspace_locks_guard:
+            self.workspace_locks.pop(env_id, None)
+            self.check_locks.pop(env_id, None)
+        if env:
+            shutil.rmtree(env['path'], ignore_errors=True)
+    
     def _init_simple_environment(self, env_path):
         """初始化简化环境（基础文件结构）"""
         # 创建基础目录结构
@@ -326,10 +474,10 @@ edition = "2021"
     
     def initialize_debian_environment(self, env_id, progress_callback=None):
         """初始化完整的 Debian 12 环境"""
-        if env_id not in self.environments:
+        env = self.get_environment(env_id)
+        if not env:
             return {"status": "error", "message": "Environment not found"}
         
-        env = self.environments[env_id]
         env_path = env['path']
         
         def update_progress(stage, message, percent):
@@ -350,7 +498,7 @@ edition = "2021"
             def run_initialization():
                 try:
                     process = subprocess.Popen(
-                        [init_script, env_path, str(env['user_id'])],
+                        [init_script, env_path, env['user_id']],
                         stdout=subprocess.PIPE,
                         stderr=subprocess.STDOUT,
                         text=True,
@@ -368,7 +516,13 @@ edition = "2021"
                     if process.returncode == 0:
                         # 标记环境为已初始化
                         env['initialized'] = True
+                        self.registry.set_initialized(env_id, True)
+                        self.registry.update_size(env_id, directory_size(env_path))
                         user_db.set_proot_initialized(env['user_id'], True)
+                        # 预先进入沙箱，首条命令无需等待 proot 启动
+                        spawn_command = self._sandbox_command(env)
+                        if spawn_command:
+                            self.sandbox_pool.prewarm(env_id, spawn_command)
                         update_progress("complete", "Debian 12 环境初始化完成!", 100)
                     else:
                         update_progress("error", f"初始化失败，退出码: {process.returncode}", 0)
@@ -388,183 +542,531 @@ edition = "2021"
     
     def is_environment_initialized(self, env_id):
         """检查环境是否已初始化"""
-        if env_id not in self.environments:
-            return False
-        return self.environments[env_id].get('initialized', False)
+        env = self.get_environment(env_id)
+        return bool(env) and env.get('initialized', False)
     
     def execute_in_environment(self, env_id, command, cwd=None, input_data=""):
-        if env_id not in self.environments:
+        env = self.get_environment(env_id)
+        if not env:
             return {"status": "error", "message": "Environment not found"}
         
-        env = self.environments[env_id]
-        env_path = env['path']
         
-        # 如果环境已初始化，使用 proot 执行
-        if env.get('initialized', False) and self._has_proot():
-            try:
-                # 使用 proot 执行命令
-                start_script = os.path.join(env_path, "start.sh")
-                proot_cmd = [
-                    "sh", "-c", f"cd {cwd or '/home/user'} && {command}"
-                ]
-                
-                result = subprocess.run(
-                    proot_cmd,
-                    input=input_data,
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                
-                return {
-                    "status": "success",
-                    "output": result.stdout,
-                    "error": result.stderr,
-                    "exit_code": result.returncode
-                }
-                
-            except subprocess.TimeoutExpired:
-                return {"status": "timeout", "message": "Execution timeout"}
-            except Exception as e:
-                return {"status": "error", "message": str(e)}
+        # 如果环境已初始化，交给常驻的沙箱进程执行，避免每条命令重新启动 proot
+        spawn_command = self._sandbox_command(env) if env.get('initialized', False) else None
+        if spawn_command:
+            result = self.sandbox_pool.execute(
+                env_id,
+                spawn_command,
+                command,
+                cwd or '/home/user',
+                input_data,
+                timeout=Config.MAX_EXECUTION_TIME,
+                memory_mb=Config.MAX_MEMORY_MB,
+                cpu_seconds=Config.MAX_EXECUTION_TIME
+            )
         else:
-            # 使用简化环境执行
-            return self._execute_in_simple_environment(env_id, command, cwd, input_data)
+            # 没有 proot 沙箱：使用简化环境在宿主机上执行
+            result = self._execute_in_simple_environment(env_id, command, cwd, input_data)
+        
+        self.usage_stats.record(env['user_id'], 'command', result.get('usage'))
+        return result
     
     def _execute_in_simple_environment(self, env_id, command, cwd=None, input_data=""):
-        """在简化环境中执行命令"""
-        if env_id not in self.environments:
+        """在简化环境中执行命令：直接在宿主机上运行，cwd 为环境中的路径（默认 /home/user）"""
+        env = self.get_environment(env_id)
+        if not env:
             return {"status": "error", "message": "Environment not found"}
         
-        env = self.environments[env_id]
-        workspace = os.path.join(env['path'], "home", "user")
-        
+        host_cwd = os.path.join(env['path'], (cwd or '/home/user').lstrip('/'))
         try:
-            # 直接在宿主机执行命令
-            if cwd:
-                original_cwd = os.getcwd()
-                try:
-                    os.chdir(cwd)
-                except:
-                    pass  # 如果目录不存在，忽略错误
-            
-            result = subprocess.run(
-                command,
-                shell=True,
-                input=input_data,
-                capture_output=True,
-                text=True,
-                timeout=30
+            # 直接在宿主机执行命令（目录不存在时在工作区中执行）
+            result = run_process(
+                ["sh", "-c", command],
+                cwd=host_cwd if os.path.isdir(host_cwd) else os.path.join(env['path'], "home", "user"),
+                input_data=input_data,
+                timeout=Config.MAX_EXECUTION_TIME,
+                memory_mb=Config.MAX_MEMORY_MB,
+                cpu_seconds=Config.MAX_EXECUTION_TIME
             )
             
-            if cwd:
-                os.chdir(original_cwd)
+            if result['timed_out']:
+                return {"status": "timeout", "message": "Execution timeout", "usage": result['usage']}
             
             return {
                 "status": "success",
-                "output": result.stdout,
-                "error": result.stderr,
-                "exit_code": result.returncode
+                "output": result['stdout'],
+                "error": result['stderr'],
+                "exit_code": result['exit_code'],
+                "usage": result['usage']
             }
             
-        except subprocess.TimeoutExpired:
-            return {"status": "timeout", "message": "Execution timeout"}
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
     def _has_proot(self):
-        """检查系统是否安装了 proot"""
+        """检查系统是否安装了 proot（结果缓存，避免每次调用都启动进程）"""
+        if self.proot_available is None:
+            try:
+                subprocess.run(["proot", "--version"], capture_output=True, check=True)
+                self.proot_available = True
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                self.proot_available = False
+        return self.proot_available
+    
+    def _sandbox_command(self, env):
+        """沙箱 worker 的启动命令（初始化脚本生成的 proot 启动脚本）
+
+        proot 不可用或环境中没有启动脚本时返回 None，调用方改用简化环境，不会在宿主机上启动常驻 shell。
+        """
+        start_script = os.path.join(env['path'], "start.sh")
+        if not self._has_proot() or not os.path.exists(start_script):
+            return None
+        return [start_script]
+    
+    def execute_rust_code(self, env_id, code, input_data="", profile=None, on_output=None):
+        env = self.get_environment(env_id)
+        if not env:
+            return {"status": "error", "message": "Environment not found"}
+        
+        workspace = os.path.join(env['path'], "home", "user")
+        
         try:
-            subprocess.run(["proot", "--version"], capture_output=True, check=True)
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return False
+            with self._workspace_lock(env_id):
+                # 写入用户代码
+                self._write_main_source(workspace, code)
+                
+                # 编译并运行
+                result = self._compile_and_run_directly(workspace, input_data, profile, on_output)
+            
+            for kind, usage in result.get('usage', {}).items():
+                self.usage_stats.record(env['user_id'], kind, usage)
+            return result
+            
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
     
-    def execute_rust_code(self, env_id, code, input_data=""):
-        if env_id not in self.environments:
+    def check_rust_code(self, env_id, code=None):
+        """运行 cargo check 获取结构化诊断信息（不生成可执行文件）
+
+        在工作区的副本（环境中的 tmp/rust-check）中检查，不改写用户的文件；code 不为 None 时
+        用它代替 src/main.rs，否则检查工作区当前内容。结果按源码哈希缓存，未修改的代码直接返回缓存。
+        先按源码哈希查缓存，命中时即使同一环境有检查在运行也直接返回；未命中且已有检查在运行时
+        立即返回 busy，不等待。
+        """
+        env = self.get_environment(env_id)
+        if not env:
             return {"status": "error", "message": "Environment not found"}
         
-        env = self.environments[env_id]
         workspace = os.path.join(env['path'], "home", "user")
+        check_workspace = os.path.join(env['path'], "tmp", "rust-check")
         
         try:
-            # 写入用户代码
-            main_path = os.path.join(workspace, "src", "main.rs")
-            with open(main_path, "w", encoding='utf-8') as f:
-                f.write(code)
+            files = self._check_files(workspace, check_workspace, code)
+            cached = self._cached_check(files)
+            if cached:
+                return cached
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        
+        lock = self._check_lock(env_id)
+        if not lock.acquire(blocking=False):
+            return {"status": "busy", "message": "Check in progress"}
+        try:
+            # 查缓存到拿到锁之间，刚结束的检查可能已写入同一份代码的结果
+            cached = self._cached_check(files)
+            if cached:
+                return cached
+            
+            self._sync_check_workspace(check_workspace, files)
+            result = self._run_cargo_check(check_workspace)
+            self.usage_stats.record(env['user_id'], 'check', result['usage'])
+            
+            # cargo check 首次运行会生成 Cargo.lock，重新计算缓存键
+            cache_key = self.artifact_cache.compute_key(check_workspace, 'check')
+            if cache_key and result['status'] == 'success':
+                with self.check_cache_lock:
+                    self.check_cache[cache_key] = result
+                    while len(self.check_cache) > Config.CHECK_CACHE_SIZE:
+                        self.check_cache.popitem(last=False)
             
-            # 编译并运行
-            return self._compile_and_run_directly(workspace, input_data)
+            return dict(result, cached=False)
             
         except Exception as e:
             return {"status": "error", "message": str(e)}
+        finally:
+            lock.release()
     
-    def _compile_and_run_directly(self, workspace, input_data):
-        """直接在宿主机环境中编译和运行 Rust 代码"""
+    def _cached_check(self, files):
+        """按检查目录同步后应有的文件内容查缓存，命中时返回带 cached 标记的结果"""
+        cache_key = self.artifact_cache.compute_key_for_files(files, 'check')
+        if not cache_key:
+            return None
+        with self.check_cache_lock:
+            cached = self.check_cache.get(cache_key)
+            if cached:
+                self.check_cache.move_to_end(cache_key)
+                return dict(cached, cached=True)
+        return None
+    
+    def _run_cargo_check(self, workspace):
+        """运行 cargo check --message-format=json 并逐行解析诊断"""
+        _, check_env, _ = self._build_command(workspace, 'debug')
+        diagnostics = []
+        pending = ['']  # 尚未读完的半行
+        
+        def on_check_output(stream, text):
+            if stream != 'stdout':
+                return
+            lines = (pending[0] + text).split('\n')
+            pending[0] = lines.pop()
+            for line in lines:
+                diagnostic = self._parse_check_message(line)
+                if diagnostic:
+                    diagnostics.append(diagnostic)
+        
+        check_process = run_process(
+            ["cargo", "check", "--message-format=json"],
+            cwd=workspace,
+            env=check_env,
+            timeout=Config.CHECK_TIMEOUT,
+            on_output=on_check_output,
+            memory_mb=Config.MAX_BUILD_MEMORY_MB,
+            cpu_seconds=Config.CHECK_TIMEOUT
+        )
+        
+        diagnostic = self._parse_check_message(pending[0])
+        if diagnostic:
+            diagnostics.append(diagnostic)
+        
+        if check_process['timed_out']:
+            return {"status": "timeout", "message": "Check timeout", "usage": check_process['usage']}
+        
+        return {
+            "status": "success",
+            "diagnostics": diagnostics,
+            "error_count": sum(1 for d in diagnostics if d['severity'] == 'error'),
+            "warning_count": sum(1 for d in diagnostics if d['severity'] == 'warning'),
+            "exit_code": check_process['exit_code'],
+            "time": check_process['wall_time'],
+            "usage": check_process['usage']
+        }
+    
+    def _parse_check_message(self, line):
+        """将 cargo JSON 消息转换为诊断信息，非编译器诊断返回 None"""
+        if not line.startswith('{'):
+            return None
         try:
-            # 编译
-            compile_process = subprocess.run(
-                ["cargo", "build", "--release"],
-                cwd=workspace,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            message = json.loads(line)
+        except ValueError:
+            return None
+        if message.get('reason') != 'compiler-message':
+            return None
+        
+        compiler_message = message.get('message', {})
+        spans = compiler_message.get('spans') or []
+        # 汇总类消息（如 "aborting due to ..."）没有代码位置
+        if not spans:
+            return None
+        span = next((s for s in spans if s.get('is_primary')), spans[0])
+        
+        return {
+            "file": span.get('file_name'),
+            "line": span.get('line_start'),
+            "column": span.get('column_start'),
+            "end_line": span.get('line_end'),
+            "end_column": span.get('column_end'),
+            "severity": compiler_message.get('level'),
+            "message": compiler_message.get('message'),
+            "code": (compiler_message.get('code') or {}).get('code'),
+            "rendered": compiler_message.get('rendered')
+        }
+    
+    def _workspace_lock(self, env_id):
+        with self.workspace_locks_guard:
+            if env_id not in self.workspace_locks:
+                self.workspace_locks[env_id] = threading.Lock()
+            return self.workspace_locks[env_id]
+    
+    def _check_lock(self, env_id):
+        with self.workspace_locks_guard:
+            if env_id not in self.check_locks:
+                self.check_locks[env_id] = threading.Lock()
+            return self.check_locks[env_id]
+    
+    def _check_files(self, workspace, check_workspace, code=None):
+        """读取要检查的项目文件（Cargo.toml、Cargo.lock、build.rs、src/），code 不为 None 时代替 src/main.rs
+
+        工作区没有 Cargo.lock 时沿用检查目录里 cargo 生成的，与同步后的检查目录内容一致。
+        """
+        files = read_project_files(workspace)
+        if code is not None:
+            files[os.path.join("src", "main.rs")] = code.encode('utf-8')
+        if "Cargo.lock" not in files:
+            try:
+                with open(os.path.join(check_workspace, "Cargo.lock"), "rb") as f:
+                    files["Cargo.lock"] = f.read()
+            except OSError:
+                pass
+        return files
+    
+    def _sync_check_workspace(self, check_workspace, files):
+        """把 _check_files 读到的文件同步到检查用的目录
+
+        内容未变的文件不重写，保留 mtime 以便增量检查；
+        检查目录有独立的 target，不与运行时的构建争用 cargo 的目录锁。
+        """
+        # 删除工作区中已不存在的文件（工作区没有 Cargo.lock 时保留 cargo 生成的）
+        for name in ("Cargo.toml", "build.rs"):
+            if name not in files and os.path.exists(os.path.join(check_workspace, name)):
+                os.remove(os.path.join(check_workspace, name))
+        for root, dirs, names in os.walk(os.path.join(check_workspace, "src")):
+            for name in names:
+                path = os.path.join(root, name)
+                if os.path.relpath(path, check_workspace) not in files:
+                    os.remove(path)
+        
+        for relative_path, content in files.items():
+            path = os.path.join(check_workspace, relative_path)
+            try:
+                with open(path, "rb") as f:
+                    if f.read() == content:
+                        continue
+            except OSError:
+                pass
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+    
+    def _write_main_source(self, workspace, code):
+        """写入 src/main.rs（内容未变时不重写，保留 mtime 以便 cargo 直接命中缓存）"""
+        main_path = os.path.join(workspace, "src", "main.rs")
+        if self._read_text(main_path) != code:
+            with open(main_path, "w", encoding='utf-8') as f:
+                f.write(code)
+    
+    def _read_text(self, path):
+        """读取文本文件，不存在时返回 None"""
+        try:
+            with open(path, "r", encoding='utf-8') as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _build_command(self, workspace, profile):
+        """生成 cargo 构建命令、环境变量和可执行文件路径"""
+        # target 目录固定在工作区内并在多次运行间保留，保证增量编译缓存持续有效
+        target_dir = os.path.join(workspace, "target")
+        env = dict(os.environ, CARGO_TARGET_DIR=target_dir)
+        
+        command = ["cargo", "build"]
+        if profile == 'release':
+            command.append("--release")
+        else:
+            env['CARGO_INCREMENTAL'] = '1'
+        
+        executable_path = os.path.join(target_dir, profile, "user_project")
+        return command, env, executable_path
+    
+    def _classify_build(self, cargo_output, had_executable):
+        """根据 cargo 输出判断构建类型: cached / incremental / full"""
+        crates_compiled = sum(1 for line in cargo_output.splitlines() if line.strip().startswith("Compiling "))
+        if crates_compiled == 0:
+            kind = "cached"
+        elif had_executable:
+            kind = "incremental"
+        else:
+            kind = "full"
+        return {"kind": kind, "crates_compiled": crates_compiled}
+    
+    def _compile_and_run_directly(self, workspace, input_data, profile=None, on_output=None):
+        """直接在宿主机环境中编译和运行 Rust 代码
+
+        提供 on_output(stream, text) 时按块推送 cargo 输出（stream 为 'build'）和程序的
+        stdout/stderr，结果中不再包含完整输出。
+        """
+        profile = profile if profile in ('debug', 'release') else Config.BUILD_PROFILE
+        command, build_env, executable_path = self._build_command(workspace, profile)
+        had_executable = os.path.exists(executable_path)
+        usage = {}
+        
+        try:
+            # 源码与依赖未变时直接使用缓存的可执行文件，跳过 cargo
+            cache_key = self.artifact_cache.compute_key(workspace, profile)
+            cached_binary = self.artifact_cache.get(cache_key) if cache_key else None
             
-            if compile_process.returncode != 0:
-                return {
-                    "status": "compile_error",
-                    "output": compile_process.stderr,
-                    "exit_code": compile_process.returncode
-                }
+            if cached_binary:
+                executable_path = cached_binary
+                build_info = {"kind": "artifact_cache", "crates_compiled": 0, "profile": profile, "time": 0}
+            else:
+                # 编译（cargo 的进度和诊断信息都输出在 stderr）
+                build_output = []
+                
+                def on_build_output(stream, text):
+                    build_output.append(text)
+                    if on_output:
+                        on_output('build', text)
+                
+                compile_process = run_process(
+                    command,
+                    cwd=workspace,
+                    env=build_env,
+                    timeout=Config.BUILD_TIMEOUT,
+                    on_output=on_build_output,
+                    memory_mb=Config.MAX_BUILD_MEMORY_MB,
+                    cpu_seconds=Config.BUILD_TIMEOUT
+                )
+                cargo_output = ''.join(build_output)
+                usage['build'] = compile_process['usage']
+                
+                build_info = self._classify_build(cargo_output, had_executable)
+                build_info['profile'] = profile
+                build_info['time'] = compile_process['wall_time']
+                
+                if compile_process['timed_out']:
+                    return {"status": "timeout", "message": "Build timeout", "build": build_info, "usage": usage}
+                
+                if compile_process['exit_code'] != 0:
+                    return {
+                        "status": "compile_error",
+                        "output": "" if on_output else cargo_output,
+                        "exit_code": compile_process['exit_code'],
+                        "build": build_info,
+                        "usage": usage
+                    }
+                
+                # 首次构建会生成 Cargo.lock，需在构建后重新计算缓存键
+                cache_key = self.artifact_cache.compute_key(workspace, profile)
+                if cache_key:
+                    self.artifact_cache.put(cache_key, executable_path)
             
             # 运行
-            executable_path = os.path.join(workspace, "target", "release", "user_project")
-            run_process = subprocess.run(
+            run_result = run_process(
                 [executable_path],
-                input=input_data,
-                capture_output=True,
-                text=True,
-                timeout=10
+                cwd=workspace,
+                input_data=input_data,
+                timeout=Config.RUN_TIMEOUT,
+                on_output=on_output,
+                memory_mb=Config.MAX_MEMORY_MB,
+                cpu_seconds=Config.RUN_TIMEOUT
             )
+            usage['run'] = run_result['usage']
+            
+            if run_result['timed_out']:
+                return {"status": "timeout", "message": "Execution timeout", "build": build_info, "usage": usage}
             
             return {
                 "status": "success",
-                "output": run_process.stdout,
-                "error": run_process.stderr,
-                "exit_code": run_process.returncode
+                "output": run_result['stdout'],
+                "error": run_result['stderr'],
+                "exit_code": run_result['exit_code'],
+                "run_time": run_result['wall_time'],
+                "build": build_info,
+                "usage": usage
             }
             
-        except subprocess.TimeoutExpired:
-            return {"status": "timeout", "message": "Execution timeout"}
         except Exception as e:
-            return {"status": "error", "message": str(e)}
+            return {"status": "error", "message": str(e), "usage": usage}
 
 # 初始化管理器
 auth_manager = ByUsiAuth()
-user_db = UserDB(Config.USER_DB_PATH)
+# 每个 HTTP 请求都要验证 token，缓存验证结果，避免每次请求 ByUsi API
+token_cache = TokenCache(
+    auth_manager.get_user_info,
+    Config.AUTH_CACHE_TTL,
+    Config.AUTH_NEGATIVE_CACHE_TTL,
+    Config.AUTH_CACHE_MAX_ENTRIES
+)
+user_db = UserDB(Config.USER_STORE_PATH, Config.USER_DB_PATH, Config.USER_FLUSH_INTERVAL, Config.USER_FLUSH_THRESHOLD)
+# 退出时写入内存中尚未保存的最近使用时间
+atexit.register(user_db.close)
 proot_manager = ProotEnvironmentManager()
+# 退出时关闭环境注册表的数据库连接
+atexit.register(proot_manager.registry.close)
+
+def existing_environments():
+    """环境注册表之前创建的环境：用户数据中记录、目录仍然存在的环境"""
+    for user_id, env_id, initialized in user_db.list_environments():
+        path = os.path.join(Config.PROOT_ENV_BASE, user_id, env_id)
+        if os.path.isdir(path):
+            yield {
+                'id': env_id,
+                'path': path,
+                'user_id': user_id,
+                'created_at': os.stat(path).st_mtime,
+                'initialized': initialized
+            }
+
+# 只在第一次启动时执行，之后环境按需从注册表加载
+proot_manager.registry.import_once(existing_environments)
 file_manager = FileManager()
 
+def user_room(user_id):
+    return f"user:{user_id}"
+
+def push_file_tree_delta(env_path, user_id, events):
+    """把工作区变更推送到用户的房间，新增和重命名的条目附带与文件树接口相同格式的节点"""
+    rules = ignore_rules.get(os.path.join(env_path, "home", "user"))
+    for event in events:
+        if event['type'] not in ('added', 'renamed'):
+            continue
+        name = os.path.basename(event['path'])
+        if event['is_dir']:
+            node = FileManager._directory_node(name, event['path'])
+        else:
+            node = FileManager._file_node(name, event['path'])
+        if rules.is_ignored(os.path.join(env_path, event['path'].lstrip('/')), event['is_dir']):
+            node['ignored'] = True
+        event['node'] = node
+    socketio.emit('file_tree_delta', {'events': events}, to=user_room(user_id))
+
+# 客户端已加载的目录缓存在内存中，由 inotify（或轮询）增量更新，变更推送到用户的房间
+workspace_watcher = WorkspaceWatcher(
+    push_file_tree_delta,
+    Config.WORKSPACE_WATCH_BACKEND,
+    "/home/user",
+    Config.WORKSPACE_WATCH_DEBOUNCE,
+    Config.WORKSPACE_POLL_INTERVAL,
+    Config.WORKSPACE_WATCH_MAX_DIRECTORIES,
+    Config.WORKSPACE_WATCH_MAX_EVENTS
+)
+run_scheduler = RunScheduler(
+    Config.RUN_MAX_WORKERS,
+    Config.RUN_QUEUE_SIZE,
+    Config.RUN_MAX_QUEUED_PER_USER,
+    Config.MAX_EXECUTION_TIME,
+    Config.RUN_RESULT_TTL
+)
+
 # WebSocket 连接管理
 connected_terminals = {}
+workspace_subscriptions = {}  # sid -> 环境路径
 initialization_progress = {}
 
 @socketio.on('connect')
 def handle_connect():
     print(f"客户端连接: {request.sid}")
+    user_id = session.get('user_id')
+    env = proot_manager.get_environment(session['environment_id']) if 'environment_id' in session else None
+    if user_id and env:
+        # 接收工作区的文件变更
+        join_room(user_room(user_id))
+        workspace_watcher.subscribe(env['path'], user_id)
+        workspace_subscriptions[request.sid] = env['path']
     emit('connected', {'message': 'Connected to terminal'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f"客户端断开: {request.sid}")
-    if request.sid in connected_terminals:
-        terminal_id = connected_terminals[request.sid]
-        close_terminal_session(terminal_id)
-        del connected_terminals[request.sid]
+    env_path = workspace_subscriptions.pop(request.sid, None)
+    if env_path:
+        workspace_watcher.unsubscribe(env_path)
+    terminal_id = connected_terminals.pop(request.sid, None)
+    if terminal_id and terminal_registry.detach(terminal_id, request.sid):
+        # 会话继续运行，输出保存在回滚缓冲区中，等待重新连接
+        terminal_coalescer.detach(terminal_id)
 
 @socketio.on('start_terminal')
-def handle_start_terminal(data):
+def handle_start_terminal(data=None):
     user_id = session.get('user_id')
     if not user_id:
         emit('terminal_output', {'output': 'Error: Not authenticated\r\n'})
@@ -575,27 +1077,77 @@ def handle_start_terminal(data):
         emit('terminal_output', {'output': 'Error: No environment found\r\n'})
         return
     
-    env = proot_manager.environments.get(env_id)
+    env = proot_manager.get_environment(env_id)
     if not env:
         emit('terminal_output', {'output': 'Error: Environment not found\r\n'})
         return
     
     workspace = os.path.join(env['path'], "home", "user")
+    
+    # 同一连接重复启动时关闭旧会话
+    previous_terminal = connected_terminals.pop(request.sid, None)
+    if previous_terminal:
+        terminal_registry.remove(previous_terminal)
+        close_terminal(previous_terminal)
+    
     terminal_id = start_terminal_session(workspace)
     
     if terminal_id:
         connected_terminals[request.sid] = terminal_id
-        emit('terminal_started', {'terminal_id': terminal_id})
+        terminal_registry.register(terminal_id, user_id, request.sid)
+        join_room(terminal_room(terminal_id))
+        # 输出经合帧后推送到房间，从会话开头推送以包含 shell 的提示符
+        terminal_coalescer.attach(terminal_id, 0, get_terminal_offset(terminal_id))
+        emit('terminal_started', {'terminal_id': terminal_id, 'stream': True})
         # 发送欢迎信息
         welcome_msg = '终端已启动'
         if not env.get('initialized', False):
             welcome_msg += ' (基础模式 - 请初始化 Debian 环境以获得完整功能)'
-        emit('terminal_output', {'output': welcome_msg + '\r\n$ '})
+        emit('terminal_output', {'output': welcome_msg + '\r\n'})
     else:
         emit('terminal_output', {'output': 'Error: Failed to start terminal\r\n'})
 
+@socketio.on('attach_terminal')
+def handle_attach_terminal(data):
+    """重新连接已有的终端会话，并从 offset 开始重放回滚缓冲区中的输出"""
+    user_id = session.get('user_id')
+    terminal_id = data.get('terminal_id')
+    if not user_id or not terminal_id:
+        emit('terminal_attach_failed', {'terminal_id': terminal_id, 'message': 'Not authenticated'})
+        return
+    
+    end_offset = get_terminal_offset(terminal_id)
+    attached, previous_sid = (False, None)
+    if end_offset is not None:
+        attached, previous_sid = terminal_registry.attach(terminal_id, user_id, request.sid)
+    if not attached:
+        emit('terminal_attach_failed', {'terminal_id': terminal_id, 'message': 'Terminal not found'})
+        return
+    
+    try:
+        offset = max(0, int(data.get('offset', 0)))
+    except (TypeError, ValueError):
+        offset = 0
+    
+    # 终端之前绑定在其他连接上时从旧连接移除
+    if previous_sid and previous_sid != request.sid:
+        connected_terminals.pop(previous_sid, None)
+        leave_room(terminal_room(terminal_id), sid=previous_sid)
+    
+    previous_terminal = connected_terminals.get(request.sid)
+    if previous_terminal and previous_terminal != terminal_id:
+        terminal_registry.remove(previous_terminal)
+        close_terminal(previous_terminal)
+    
+    connected_terminals[request.sid] = terminal_id
+    join_room(terminal_room(terminal_id))
+    emit('terminal_attached', {'terminal_id': terminal_id, 'offset': offset, 'end_offset': end_offset})
+    # 重放只是把推送游标移到 offset，之后的输出按正常的合帧流程发送
+    terminal_coalescer.attach(terminal_id, offset, end_offset)
+
 @socketio.on('terminal_input')
 def handle_terminal_input(data):
+    """按行输入：写入整行命令，输出通过流式推送返回"""
     terminal_id = connected_terminals.get(request.sid)
     if not terminal_id:
         emit('terminal_output', {'output': 'Error: No active terminal session\r\n'})
@@ -605,18 +1157,89 @@ def handle_terminal_input(data):
     if not command:
         return
     
-    # 发送命令回显
-    emit('terminal_output', {'output': command + '\r\n'})
+    terminal_registry.touch(terminal_id)
+    if not write_terminal_input(terminal_id, command + '\n'):
+        emit('terminal_output', {'output': 'Error: Terminal input was not delivered\r\n'})
+
+@socketio.on('terminal_stream_input')
+def handle_terminal_stream_input(data):
+    """原始输入：按键、粘贴内容和控制字符（如 Ctrl+C 的 \\x03）原样写入 pty"""
+    terminal_id = connected_terminals.get(request.sid)
+    if not terminal_id:
+        emit('terminal_output', {'output': 'Error: No active terminal session\r\n'})
+        return
+    
+    input_data = data.get('data', '')
+    if not input_data:
+        return
+    terminal_registry.touch(terminal_id)
+    if not write_terminal_input(terminal_id, input_data):
+        emit('terminal_output', {'output': 'Error: Terminal input was not delivered\r\n'})
+
+@socketio.on('terminal_ack')
+def handle_terminal_ack(data):
+    """客户端确认已处理的输出偏移量，用于流量控制"""
+    terminal_id = connected_terminals.get(request.sid)
+    if not terminal_id:
+        return
+    try:
+        offset = int(data.get('offset', 0))
+    except (TypeError, ValueError):
+        return
+    terminal_coalescer.ack(terminal_id, offset)
+
+@socketio.on('terminal_resize')
+def handle_terminal_resize(data):
+    terminal_id = connected_terminals.get(request.sid)
+    if not terminal_id:
+        return
+    try:
+        rows = max(1, min(int(data.get('rows', 24)), 500))
+        cols = max(1, min(int(data.get('cols', 80)), 500))
+    except (TypeError, ValueError):
+        return
+    resize_terminal(terminal_id, rows, cols)
+
+@socketio.on('run_rust')
+def handle_run_rust(data):
+    """流式编译运行: 通过 run_output 按块推送输出，最后发送 run_finished"""
+    user_id = session.get('user_id')
+    env_id = session.get('environment_id')
+    if not user_id or not env_id:
+        emit('run_finished', {'status': 'error', 'message': 'Not authenticated'})
+        return
     
-    result = execute_terminal_command(terminal_id, command)
-    if result['status'] == 'success':
-        emit('terminal_output', {'output': result['output'] + '\r\n$ '})
-    else:
-        emit('terminal_output', {'output': f"Error: {result['message']}\r\n$ "})
+    data = data or {}
+    code = data.get('code', '')
+    input_data = data.get('input', '')
+    profile = data.get('profile')
+    sid = request.sid
+    
+    def send_output(stream, text):
+        socketio.emit('run_output', {'stream': stream, 'data': text}, to=sid)
+    
+    def run():
+        start_time = time.time()
+        result = proot_manager.execute_rust_code(env_id, code, input_data, profile, on_output=send_output)
+        result['total_time'] = round(time.time() - start_time, 3)
+        socketio.emit('run_finished', result, to=sid)
+        return result
+    
+    job = run_scheduler.submit(user_id, run)
+    if job is None:
+        emit('run_finished', {'status': 'error', 'message': 'Run queue is full, please try again later'})
+        return
+    
+    user_db.update_last_used(user_id)
+    emit('run_queued', {
+        'job_id': job['job_id'],
+        'queue_position': job.get('queue_position', 0),
+        'estimated_wait': job.get('estimated_wait', 0)
+    })
 
 # 初始化相关的 WebSocket 事件
 @socketio.on('check_initialization')
-def handle_check_initialization(data):
+def handle_check_initialization(data=None):
     """检查环境初始化状态"""
     user_id = session.get('user_id')
     if not user_id:
@@ -635,7 +1258,7 @@ def handle_check_initialization(data):
     })
 
 @socketio.on('start_initialization')
-def handle_start_initialization(data):
+def handle_start_initialization(data=None):
     """开始初始化 Debian 环境"""
     user_id = session.get('user_id')
     if not user_id:
@@ -680,9 +1303,9 @@ def before_request():
     # 检查会话有效性
     if 'user_id' in session and 'user_token' in session:
         # 验证 token 是否仍然有效
-        user_info = auth_manager.get_user_info(session['user_token'])
-        if user_info.get('status') != 'success':
-            # Token 无效，清除会话
+        user_info = token_cache.get(session['user_token'])
+        # ByUsi 暂时不可用（网络错误、熔断）时保留会话，只在 token 确实无效时清除
+        if user_info.get('status') != 'success' and not user_info.get('transient'):
             session.clear()
 
 @app.route('/')
@@ -690,7 +1313,7 @@ def index():
     # 检查是否有有效的会话
     if 'user_id' in session and 'user_token' in session:
         # 验证 token
-        user_info = auth_manager.get_user_info(session['user_token'])
+        user_info = token_cache.get(session['user_token'])
         if user_info.get('status') == 'success':
             # Token 有效，直接显示主界面
             return render_template('index.html')
@@ -706,12 +1329,19 @@ def api_files_tree():
         return jsonify({"status": "error", "message": "Not authenticated"})
     
     env_id = session['environment_id']
-    env = proot_manager.environments.get(env_id)
+    env = proot_manager.get_environment(env_id)
     if not env:
         return jsonify({"status": "error", "message": "Environment not found"})
     
     path = request.args.get('path', '/home/user')
-    tree = file_manager.get_file_tree(env['path'], path)
+    if 'depth' in request.args:
+        # 按层加载：只返回 depth 层，大目录分页
+        depth = min(request.args.get('depth', 1, type=int) or 1, Config.FILE_TREE_MAX_DEPTH)
+        offset = request.args.get('offset', 0, type=int) or 0
+        limit = min(request.args.get('limit', Config.FILE_TREE_PAGE_SIZE, type=int) or 1, Config.FILE_TREE_PAGE_SIZE)
+        tree = file_manager.list_directory(env['path'], path, depth, offset, limit)
+    else:
+        tree = file_manager.get_file_tree(env['path'], path)
     
     if tree is None:
         return jsonify({"status": "error", "message": "Path not found"})
@@ -728,7 +1358,7 @@ def api_files_read():
         return jsonify({"status": "error", "message": "Not authenticated"})
     
     env_id = session['environment_id']
-    env = proot_manager.environments.get(env_id)
+    env = proot_manager.get_environment(env_id)
     if not env:
         return jsonify({"status": "error", "message": "Environment not found"})
     
@@ -736,16 +1366,57 @@ def api_files_read():
     if not file_path:
         return jsonify({"status": "error", "message": "No file path specified"})
     
+    # 版本标识只需要 stat；先 stat 后读取，文件在两者之间被修改时下次请求会重新读取
+    stat = file_manager.stat_file(env['path'], file_path)
+    if stat is None:
+        return jsonify({"status": "error", "message": "File not found or cannot be read"})
+    etag = file_manager.file_etag(stat)
+    
+    if request.if_none_match.contains(etag):
+        # 客户端已有这个版本
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    if request.args.get('raw'):
+        # 原始内容：流式发送，支持 Range 请求
+        full_path = file_manager.resolve_workspace_path(env['path'], file_path)
+        if full_path is None:
+            return jsonify({"status": "error", "message": "File not found or cannot be read"})
+        # 工作区中的 HTML/SVG 不能在 IDE 的源下执行：文本按 text/plain 显示，其他文件只能下载
+        is_text = os.path.splitext(full_path)[1].lstrip('.').lower() in Config.ALLOWED_EXTENSIONS
+        response = send_file(
+            full_path,
+            mimetype='text/plain' if is_text else 'application/octet-stream',
+            as_attachment=not is_text,
+            conditional=True,
+            etag=etag,
+            last_modified=stat.st_mtime,
+            max_age=0
+        )
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        response.headers['Content-Security-Policy'] = 'sandbox'
+        return response
+    
+    raw_url = f"/api/files/read?{urlencode({'path': file_path, 'raw': 1})}"
+    if stat.st_size > Config.FILE_READ_INLINE_LIMIT:
+        return jsonify({"status": "error", "message": "File too large to edit", "size": stat.st_size, "raw_url": raw_url})
+    
     content = file_manager.read_file(env['path'], file_path)
     
     if content is None:
-        return jsonify({"status": "error", "message": "File not found or cannot be read"})
+        return jsonify({"status": "error", "message": "File cannot be read as text", "size": stat.st_size, "raw_url": raw_url})
     
-    return jsonify({
+    response = jsonify({
         "status": "success",
         "content": content,
-        "path": file_path
+        "path": file_path,
+        "etag": etag
     })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/api/files/write', methods=['POST'])
 def api_files_write():
@@ -754,7 +1425,7 @@ def api_files_write():
         return jsonify({"status": "error", "message": "Not authenticated"})
     
     env_id = session['environment_id']
-    env = proot_manager.environments.get(env_id)
+    env = proot_manager.get_environment(env_id)
     if not env:
         return jsonify({"status": "error", "message": "Environment not found"})
     
@@ -768,7 +1439,10 @@ def api_files_write():
     success = file_manager.write_file(env['path'], file_path, content)
     
     if success:
-        return jsonify({"status": "success", "message": "File saved"})
+        # 返回新版本的标识，客户端缓存保存的内容，下次打开时不需要重新读取
+        stat = file_manager.stat_file(env['path'], file_path)
+        etag = file_manager.file_etag(stat) if stat else None
+        return jsonify({"status": "success", "message": "File saved", "etag": etag})
     else:
         return jsonify({"status": "error", "message": "Failed to save file"})
 
@@ -779,7 +1453,7 @@ def api_files_create():
         return jsonify({"status": "error", "message": "Not authenticated"})
     
     env_id = session['environment_id']
-    env = proot_manager.environments.get(env_id)
+    env = proot_manager.get_environment(env_id)
     if not env:
         return jsonify({"status": "error", "message": "Environment not found"})
     
@@ -793,6 +1467,7 @@ def api_files_create():
     success = file_manager.create_file(env['path'], file_path, content)
     
     if success:
+        workspace_watcher.refresh(env['path'], [os.path.join(env['path'], file_path.lstrip('/'))])
         return jsonify({"status": "success", "message": "File created"})
     else:
         return jsonify({"status": "error", "message": "Failed to create file"})
@@ -804,7 +1479,7 @@ def api_files_mkdir():
         return jsonify({"status": "error", "message": "Not authenticated"})
     
     env_id = session['environment_id']
-    env = proot_manager.environments.get(env_id)
+    env = proot_manager.get_environment(env_id)
     if not env:
         return jsonify({"status": "error", "message": "Environment not found"})
     
@@ -817,6 +1492,7 @@ def api_files_mkdir():
     success = file_manager.create_directory(env['path'], dir_path)
     
     if success:
+        workspace_watcher.refresh(env['path'], [os.path.join(env['path'], dir_path.lstrip('/'))])
         return jsonify({"status": "success", "message": "Directory created"})
     else:
         return jsonify({"status": "error", "message": "Failed to create directory"})
@@ -828,7 +1504,7 @@ def api_files_delete():
         return jsonify({"status": "error", "message": "Not authenticated"})
     
     env_id = session['environment_id']
-    env = proot_manager.environments.get(env_id)
+    env = proot_manager.get_environment(env_id)
     if not env:
         return jsonify({"status": "error", "message": "Environment not found"})
     
@@ -841,6 +1517,7 @@ def api_files_delete():
     success = file_manager.delete_path(env['path'], path)
     
     if success:
+        workspace_watcher.refresh(env['path'], [os.path.join(env['path'], path.lstrip('/'))])
         return jsonify({"status": "success", "message": "Path deleted"})
     else:
         return jsonify({"status": "error", "message": "Failed to delete path"})
@@ -852,7 +1529,7 @@ def api_files_rename():
         return jsonify({"status": "error", "message": "Not authenticated"})
     
     env_id = session['environment_id']
-    env = proot_manager.environments.get(env_id)
+    env = proot_manager.get_environment(env_id)
     if not env:
         return jsonify({"status": "error", "message": "Environment not found"})
     
@@ -866,6 +1543,10 @@ def api_files_rename():
     success = file_manager.rename_path(env['path'], old_path, new_path)
     
     if success:
+        workspace_watcher.refresh(env['path'], [
+            os.path.join(env['path'], old_path.lstrip('/')),
+            os.path.join(env['path'], new_path.lstrip('/'))
+        ])
         return jsonify({"status": "success", "message": "Path renamed"})
     else:
         return jsonify({"status": "error", "message": "Failed to rename path"})
@@ -874,7 +1555,7 @@ def api_files_rename():
 def api_check_auth():
     """检查认证状态"""
     if 'user_id' in session and 'user_token' in session:
-        user_info = auth_manager.get_user_info(session['user_token'])
+        user_info = token_cache.get(session['user_token'])
         if user_info.get('status') == 'success':
             user_data = user_info.get('data', {})
             
@@ -926,7 +1607,8 @@ def api_login():
         
         # 获取或创建用户环境
         env_id = user_db.get_user_environment(user_data['id'])
-        if not env_id:
+        if not env_id or not proot_manager.get_environment(env_id):
+            # 没有环境，或环境目录已被删除
             env_id = proot_manager.create_environment(user_data['id'])
             user_db.set_user_environment(user_data['id'], env_id)
         else:
@@ -947,7 +1629,7 @@ def api_user_info():
     if 'user_token' not in session:
         return jsonify({"status": "error", "message": "Not logged in"})
     
-    result = auth_manager.get_user_info(session['user_token'])
+    result = token_cache.get(session['user_token'])
     return jsonify(result)
 
 @app.route('/api/run_rust', methods=['POST'])
@@ -957,33 +1639,89 @@ def api_run_rust():
     
     data = request.json
     env_id = session['environment_id']
-    
-    result = proot_manager.execute_rust_code(
-        env_id,
-        data.get('code', ''),
-        data.get('input', '')
+    code = data.get('code', '')
+    input_data = data.get('input', '')
+    profile = data.get('profile')
+    
+    # 提交到调度器排队执行，立即返回排队信息
+    job = run_scheduler.submit(
+        session['user_id'],
+        lambda: proot_manager.execute_rust_code(env_id, code, input_data, profile)
     )
+    if job is None:
+        return jsonify({"status": "error", "message": "Run queue is full, please try again later"})
     
     # 更新最后使用时间
     user_db.update_last_used(session['user_id'])
     
+    return jsonify(_run_job_response(job))
+
+@app.route('/api/run_rust/<job_id>', methods=['GET'])
+def api_run_rust_status(job_id):
+    """查询运行任务状态或结果"""
+    if 'user_id' not in session:
+        return jsonify({"status": "error", "message": "Not authenticated"})
+    
+    job = run_scheduler.get_job(job_id)
+    if not job or job['user_id'] != str(session['user_id']):
+        return jsonify({"status": "error", "message": "Job not found"})
+    
+    return jsonify(_run_job_response(job))
+
+def _run_job_response(job):
+    """将任务状态转换为 API 响应：完成时返回运行结果，否则返回排队信息"""
+    if job['state'] == 'done':
+        return dict(job['result'], job_id=job['job_id'])
+    
+    response = {"status": job['state'], "job_id": job['job_id']}
+    if job['state'] == 'queued':
+        response['queue_position'] = job['queue_position']
+        response['estimated_wait'] = job['estimated_wait']
+    return response
+
+@app.route('/api/check_rust', methods=['POST'])
+def api_check_rust():
+    """快速检查代码，返回结构化诊断信息"""
+    if 'environment_id' not in session or 'user_id' not in session:
+        return jsonify({"status": "error", "message": "Not authenticated"})
+    
+    data = request.json or {}
+    result = proot_manager.check_rust_code(session['environment_id'], data.get('code'))
     return jsonify(result)
 
+@app.route('/api/usage', methods=['GET'])
+def api_usage():
+    """获取当前用户最近的资源使用统计"""
+    if 'user_id' not in session:
+        return jsonify({"status": "error", "message": "Not authenticated"})
+    
+    return jsonify({
+        "status": "success",
+        "data": proot_manager.usage_stats.get_user_summary(session['user_id'])
+    })
+
 @app.route('/api/terminal/start', methods=['POST'])
 def api_terminal_start():
     if 'environment_id' not in session:
         return jsonify({"status": "error", "message": "No environment"})
     
     env_id = session['environment_id']
-    env = proot_manager.environments.get(env_id)
+    env = proot_manager.get_environment(env_id)
     if not env:
         return jsonify({"status": "error", "message": "Environment not found"})
     
     workspace = os.path.join(env['path'], "home", "user")
+    
+    # 每个登录会话只保留一个 HTTP 终端
+    previous_terminal = session.pop('terminal_id', None)
+    if previous_terminal and terminal_registry.remove(previous_terminal):
+        close_terminal(previous_terminal)
+    
     terminal_id = start_terminal_session(workspace)
     
     if terminal_id:
         session['terminal_id'] = terminal_id
+        terminal_registry.register(terminal_id, session.get('user_id'))
         return jsonify({"status": "success", "terminal_id": terminal_id})
     else:
         return jsonify({"status": "error", "message": "Failed to start terminal"})
@@ -997,9 +1735,30 @@ def api_terminal_execute():
     data = request.json
     command = data.get('command', '')
     
+    terminal_registry.touch(terminal_id)
     result = execute_terminal_command(terminal_id, command)
     return jsonify(result)
 
+@app.route('/api/execute', methods=['POST'])
+def api_execute():
+    """在用户环境中执行一条命令并返回输出（已初始化的环境由常驻的沙箱进程执行）"""
+    if 'environment_id' not in session or 'user_id' not in session:
+        return jsonify({"status": "error", "message": "Not authenticated"})
+    
+    data = request.json or {}
+    command = data.get('command', '')
+    if not command:
+        return jsonify({"status": "error", "message": "No command"})
+    
+    result = proot_manager.execute_in_environment(
+        session['environment_id'],
+        command,
+        data.get('cwd'),
+        data.get('input', '')
+    )
+    user_db.update_last_used(session['user_id'])
+    return jsonify(result)
+
 @app.route('/api/initialize_environment', methods=['POST'])
 def api_initialize_environment():
     """初始化用户环境 API"""
@@ -1017,8 +1776,17 @@ def api_initialize_environment():
 def api_logout():
     # 清理终端会话
     terminal_id = session.get('terminal_id')
-    if terminal_id:
-        close_terminal_session(terminal_id)
+    if terminal_id and terminal_registry.remove(terminal_id):
+        close_terminal(terminal_id)
+    
+    # 清理该用户其他的终端会话（包括断线保留中的）
+    if 'user_id' in session:
+        for terminal in terminal_registry.get_user_terminals(session['user_id']):
+            terminal_registry.remove(terminal['terminal_id'])
+            close_terminal(terminal['terminal_id'])
+    
+    if 'user_token' in session:
+        token_cache.invalidate(session['user_token'])
     
     # 清除会话
     session.clear()
@@ -1030,11 +1798,12 @@ def api_system_info():
     proot_available = proot_manager._has_proot()
     
     # 获取环境统计
-    env_count = len(proot_manager.environments)
-    user_count = len(user_db.data)
+    env_stats = proot_manager.registry.get_stats()
+    env_count = env_stats['environments']
+    user_count = user_db.count_users()
     
     # 统计已初始化的环境
-    initialized_count = sum(1 for env in proot_manager.environments.values() if env.get('initialized', False))
+    initialized_count = env_stats['initialized']
     
     return jsonify({
         "status": "success",
@@ -1043,7 +1812,22 @@ def api_system_info():
             "environments_count": env_count,
             "users_count": user_count,
             "initialized_environments": initialized_count,
-            "terminal_available": True
+            "loaded_environments": len(proot_manager.environments),
+            "environments_size_bytes": env_stats['size_bytes'],
+            "terminal_available": True,
+            "terminal_backend": TERMINAL_BACKEND,
+            "artifact_cache": proot_manager.artifact_cache.get_stats(),
+            "run_scheduler": run_scheduler.get_stats(),
+            "sandbox_pool": proot_manager.sandbox_pool.get_stats(),
+            "terminal_mux": terminal_mux.get_stats(),
+            "terminals": get_terminal_stats(),
+            "terminal_output": terminal_coalescer.get_stats(),
+            "terminal_registry": terminal_registry.get_stats(),
+            "auth_cache": token_cache.get_stats(),
+            "user_db": user_db.get_stats(),
+            "byusi_client": byusi_client.get_stats(),
+            "workspace_watcher": workspace_watcher.get_stats(),
+            "top_users_by_cpu": proot_manager.usage_stats.get_top_users()
         }
     })
 
@@ -1067,7 +1851,9 @@ if __name__ == '__main__':
     print(f"Proot 环境: {'可用' if proot_manager._has_proot() else '不可用'}")
     print(f"文件管理: 已启用")
     print(f"Debian 初始化: 已启用")
-    print(f"用户数据库: {Config.USER_DB_PATH}")
+    print(f"用户数据库: {Config.USER_STORE_PATH}")
     print("=" * 50)
     
-    socketio.run(app, host='0.0.0.0', port=5554, debug=Config.DEBUG)
\ No newline at end of file
+    # SIGTERM 时正常退出，执行 atexit 中的清理
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    socketio.run(app, host='0.0.0.0', port=5554, debug=Config.DEBUG, allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,97 @@
+import time
+import threading
+from collections import OrderedDict
+
+class TokenCache:
+    """ByUsi token 验证结果缓存
+
+    - 验证成功的结果缓存 ttl 秒，token 无效的结果缓存 negative_ttl 秒；
+    - 网络错误等临时失败（结果带 transient 标记）不缓存，下次请求重新验证；
+    - 同一 token 的并发验证只向 API 发送一次请求，其余请求等待并共享结果；
+    - 最多缓存 max_entries 个 token，超过后淘汰最久未使用的。
+    """
+
+    def __init__(self, fetch, ttl, negative_ttl, max_entries):
+        self.fetch = fetch  # fetch(token) -> 状态字典
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max(1, max_entries)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # token -> (结果, 过期时间)，按最近使用排序
+        self.inflight = {}  # token -> 正在进行的验证 {'done': Event, 'result': 结果}
+        self.counters = {
+            'hits': 0, 'negative_hits': 0, 'misses': 0, 'coalesced': 0,
+            'transient_errors': 0, 'invalidations': 0, 'evictions': 0
+        }
+
+    def get(self, token):
+        """返回 token 的验证结果（与 fetch 的返回值相同）"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry:
+                result, expires_at = entry
+                if expires_at > now:
+                    self.entries.move_to_end(token)
+                    self.counters['hits' if result.get('status') == 'success' else 'negative_hits'] += 1
+                    return result
+                del self.entries[token]
+
+            call = self.inflight.get(token)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None}
+                self.inflight[token] = call
+                self.counters['misses'] += 1
+            else:
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            # 同一 token 已有请求在验证，等待其结果
+            call['done'].wait()
+            return call['result']
+
+        # 无论验证如何结束（包括 fetch 抛出 Exception 以外的异常）都要移除 inflight 并唤醒等待者，
+        # 否则之后同一 token 的请求会永远等待
+        result = {"status": "error", "message": "Token validation failed", "transient": True}
+        try:
+            try:
+                result = self.fetch(token)
+            except Exception as e:
+                result = {"status": "error", "message": str(e), "transient": True}
+
+            with self.lock:
+                if result.get('transient'):
+                    self.counters['transient_errors'] += 1
+                else:
+                    ttl = self.ttl if result.get('status') == 'success' else self.negative_ttl
+                    if ttl > 0:
+                        self.entries[token] = (result, time.time() + ttl)
+                        while len(self.entries) > self.max_entries:
+                            self.entries.popitem(last=False)
+                            self.counters['evictions'] += 1
+        finally:
+            with self.lock:
+                del self.inflight[token]
+            call['result'] = result
+            call['done'].set()
+        return result
+
+    def invalidate(self, token):
+        """丢弃 token 的缓存结果（如用户退出登录）"""
+        with self.lock:
+            if self.entries.pop(token, None):
+                self.counters['invalidations'] += 1
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['negative_hits'] + self.counters['misses']
+            hit_rate = (self.counters['hits'] + self.counters['negative_hits']) / lookups if lookups else 0
+            return dict(
+                self.counters,
+                entries=len(self.entries),
+                inflight=len(self.inflight),
+                hit_rate=round(hit_rate, 3),
+                ttl=self.ttl,
+                negative_ttl=self.negative_ttl
+            )
@@ -0,0 +1,166 @@
+"""ByUsi 认证请求性能测试
+
+启动本地模拟服务（scripts/byusi_stub.py），对比 token 验证的几种方式：
+
+- unpooled: 每次 requests.post（原实现，每次新建连接、无超时）
+- pooled:   ByUsiClient（共享 keep-alive 连接池）
+- cached:   TokenCache + ByUsiClient（before_request 实际使用的路径）
+- breaker:  模拟服务全部返回 503 时，熔断前后单次调用的耗时
+
+用法:
+
+    python3 benchmarks/auth_bench.py [--requests 500] [--concurrency 8] [--latency-ms 2] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import requests
+
+from config import Config
+from auth_cache import TokenCache
+from byusi_client import ByUsiClient
+from byusi_stub import start_stub_server
+from terminal_bench import summarize
+
+def make_client(base_url, max_retries=0):
+    return ByUsiClient(
+        base_url,
+        Config.BYUSI_CONNECT_TIMEOUT,
+        Config.BYUSI_READ_TIMEOUT,
+        max_retries,
+        Config.BYUSI_RETRY_BACKOFF,
+        Config.BYUSI_POOL_SIZE,
+        Config.BYUSI_BREAKER_THRESHOLD,
+        Config.BYUSI_BREAKER_RESET
+    )
+
+def run_load(validate, total, concurrency):
+    """concurrency 个线程共调用 validate() total 次，返回延迟统计和吞吐量"""
+    samples = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = max(1, total // concurrency)
+
+    def worker():
+        local = []
+        failed = 0
+        for _ in range(per_thread):
+            start_time = time.perf_counter()
+            result = validate()
+            local.append(time.perf_counter() - start_time)
+            if result.get('status') != 'success':
+                failed += 1
+        with lock:
+            samples.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    return dict(summarize(samples), errors=errors[0], requests_per_second=round(len(samples) / elapsed, 1))
+
+def measure_mode(mode, base_url, state, token, args):
+    if mode == 'unpooled':
+        url = f"{base_url}api.php"
+
+        def validate():
+            try:
+                return requests.post(url, data={'action': 'get_user', 'token': token}).json()
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+    elif mode == 'pooled':
+        client = make_client(base_url)
+
+        def validate():
+            return client.call('get_user', token=token)
+    else:
+        client = make_client(base_url)
+        cache = TokenCache(lambda t: client.call('get_user', token=t),
+                           Config.AUTH_CACHE_TTL, Config.AUTH_NEGATIVE_CACHE_TTL, Config.AUTH_CACHE_MAX_ENTRIES)
+
+        def validate():
+            return cache.get(token)
+
+    requests_before, connections_before = state.requests, state.connections
+    result = run_load(validate, args.requests, args.concurrency)
+    result['upstream_requests'] = state.requests - requests_before
+    result['connections'] = state.connections - connections_before
+    return result
+
+def measure_breaker(args):
+    """上游持续失败时，熔断前后每次调用的耗时"""
+    server, _ = start_stub_server(latency=args.latency_ms / 1000, fail_rate=1)
+    host, port = server.server_address[:2]
+    client = make_client(f"http://{host}:{port}/")
+    before, after = [], []
+    try:
+        for _ in range(Config.BYUSI_BREAKER_THRESHOLD):
+            start_time = time.perf_counter()
+            client.call('get_user', token='x')
+            before.append(time.perf_counter() - start_time)
+        for _ in range(100):
+            start_time = time.perf_counter()
+            client.call('get_user', token='x')
+            after.append(time.perf_counter() - start_time)
+    finally:
+        server.shutdown()
+    return {'before_open': summarize(before), 'while_open': summarize(after), 'client': client.get_stats()}
+
+def main():
+    parser = argparse.ArgumentParser(description="ByUsi 认证请求性能测试")
+    parser.add_argument('--requests', type=int, default=500, help="每种方式的请求总数")
+    parser.add_argument('--concurrency', type=int, default=8, help="并发线程数")
+    parser.add_argument('--latency-ms', type=float, default=2, help="模拟服务每个请求的延迟（毫秒）")
+    parser.add_argument('--json', help="JSON 结果文件，- 表示标准输出")
+    args = parser.parse_args()
+
+    server, state = start_stub_server(latency=args.latency_ms / 1000)
+    host, port = server.server_address[:2]
+    base_url = f"http://{host}:{port}/"
+    client = make_client(base_url)
+    client.call('register', username='bench', email='bench@example.com', password='bench')
+    token = client.call('login', identifier='bench', password='bench')['data']['token']
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'latency_ms': args.latency_ms
+        },
+        'modes': {}
+    }
+    for mode in ('unpooled', 'pooled', 'cached'):
+        report['modes'][mode] = measure_mode(mode, base_url, state, token, args)
+    report['breaker'] = measure_breaker(args)
+    server.shutdown()
+
+    if args.json == '-':
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'方式':<10}{'p50(ms)':>10}{'p99(ms)':>10}{'请求/秒':>10}{'上游请求':>10}{'新连接':>8}{'错误':>6}")
+    for mode, result in report['modes'].items():
+        print(f"{mode:<10}{result['p50_ms']:>10}{result['p99_ms']:>10}{result['requests_per_second']:>10}"
+              f"{result['upstream_requests']:>10}{result['connections']:>8}{result['errors']:>6}")
+    breaker = report['breaker']
+    print(f"熔断: 断开前 p50 {breaker['before_open']['p50_ms']} ms，断开后 p50 {breaker['while_open']['p50_ms']} ms，"
+          f"拒绝 {breaker['client']['rejected']} 次")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+if __name__ == '__main__':
+    main()
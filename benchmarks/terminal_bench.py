@@ -0,0 +1,351 @@
+"""终端性能测试
+
+对每个可用的终端实现（C++ libterminal.so、pty、subprocess）测量：
+
+- latency:    按键到回显的延迟（无 pty 的实现没有回显，改为测量 echo 命令的往返时间）
+- command:    execute_terminal_command 的往返时间（HTTP API 使用的路径）
+- throughput: `head -c N /dev/zero | base64` 的输出吞吐量
+- scaling:    并发会话数从 1 增加到 MAX_TERMINAL_SESSIONS 时，每个会话的内存、
+              线程数、文件描述符数、空闲 CPU 占用和按键延迟
+
+结果以 JSON 输出，便于对比不同版本。用法:
+
+    python3 benchmarks/terminal_bench.py [--size-mb 50] [--backends cpp,pty,subprocess]
+        [--tests latency,command,throughput,scaling] [--max-sessions 100] [--json results.json]
+
+--json - 只向标准输出打印 JSON。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import tempfile
+import importlib
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from terminal_backend import BACKEND_MODULES, BACKEND_ORDER
+
+DONE_MARKER = b"__BENCH_DONE__"
+TAIL_BYTES = 256  # 每个会话保留的最近输出，用于匹配标记
+TESTS = ('latency', 'command', 'throughput', 'scaling')
+SCALING_STEPS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+class OutputWatcher:
+    """终端输出监听器：按会话统计输出字节数，并等待输出中出现指定内容"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.received = {}  # session_id -> 输出字节数
+        self.tails = {}  # session_id -> 最近的输出
+
+    def __call__(self, session_id, chunk, end_offset):
+        with self.condition:
+            self.received[session_id] = self.received.get(session_id, 0) + len(chunk)
+            tail = self.tails.setdefault(session_id, bytearray())
+            tail.extend(chunk[-TAIL_BYTES:])
+            del tail[:-TAIL_BYTES]
+            self.condition.notify_all()
+
+    def mark(self, session_id):
+        """清空最近的输出，返回当前的输出字节数"""
+        with self.condition:
+            self.tails[session_id] = bytearray()
+            return self.received.get(session_id, 0)
+
+    def wait_for(self, session_id, pattern, timeout):
+        with self.condition:
+            return self.condition.wait_for(lambda: pattern in self.tails.get(session_id, b""), timeout)
+
+    def forget(self, session_id):
+        with self.condition:
+            self.received.pop(session_id, None)
+            self.tails.pop(session_id, None)
+
+def load_backends(names):
+    backends = []
+    for name in names:
+        try:
+            backends.append((name, importlib.import_module(BACKEND_MODULES[name])))
+        except (ImportError, OSError) as e:
+            print(f"跳过 {name}: {e}", file=sys.stderr)
+    return backends
+
+def summarize(samples):
+    """延迟样本（秒）的统计，单位毫秒"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return round(ordered[int(round(p / 100 * (len(ordered) - 1)))] * 1000, 3)
+
+    return {
+        'samples': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3)
+    }
+
+def process_stats():
+    """当前进程的常驻内存、线程数（含原生线程）和打开的文件描述符数"""
+    rss_kb = 0
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+                break
+    return {
+        'rss_kb': rss_kb,
+        'threads': len(os.listdir('/proc/self/task')),
+        'fds': len(os.listdir('/proc/self/fd'))
+    }
+
+def children_rss_kb():
+    """子进程（shell）的常驻内存总和"""
+    total = 0
+    for task in os.listdir('/proc/self/task'):
+        try:
+            with open(f'/proc/self/task/{task}/children') as f:
+                pids = f.read().split()
+        except OSError:
+            continue
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            total += int(line.split()[1])
+                            break
+            except OSError:
+                pass
+    return total
+
+def start_session(module, workspace, settle=0.2):
+    session_id = module.start_terminal_session(workspace)
+    if not session_id:
+        raise RuntimeError("创建终端会话失败")
+    time.sleep(settle)  # 等待 shell 输出提示符
+    return session_id
+
+def detect_echo(module, watcher, session_id, timeout=1.0):
+    """终端是否回显输入（pty 回显，subprocess 管道不回显）"""
+    watcher.mark(session_id)
+    module.write_terminal_input(session_id, "#")
+    echoed = watcher.wait_for(session_id, b"#", timeout)
+    module.write_terminal_input(session_id, "\x15" if echoed else "\n")  # Ctrl+U 清除当前行
+    time.sleep(0.05)
+    return echoed
+
+def keystroke_samples(module, watcher, session_id, count, echoes, timeout=5.0):
+    """逐个发送按键并等待回显，返回每次的延迟（秒）"""
+    samples = []
+    for index in range(count):
+        if echoes:
+            key = chr(ord('a') + index % 26)
+            data, expected = key, key.encode()
+        else:
+            # 拆开标记，避免与命令本身混淆
+            marker = f"K{index:05d}K"
+            data, expected = f"echo {marker[:3]}''{marker[3:]}\n", marker.encode()
+        watcher.mark(session_id)
+        start_time = time.perf_counter()
+        module.write_terminal_input(session_id, data)
+        if not watcher.wait_for(session_id, expected, timeout):
+            break
+        samples.append(time.perf_counter() - start_time)
+    if echoes:
+        module.write_terminal_input(session_id, "\x15")
+    return samples
+
+def measure_latency(module, watcher, workspace, samples):
+    session_id = start_session(module, workspace)
+    try:
+        echoes = detect_echo(module, watcher, session_id)
+        result = summarize(keystroke_samples(module, watcher, session_id, samples, echoes))
+        return dict(result or {}, mode='keystroke' if echoes else 'line')
+    finally:
+        module.close_terminal_session(session_id)
+        watcher.forget(session_id)
+
+def measure_command(module, workspace, samples):
+    session_id = start_session(module, workspace)
+    try:
+        times = []
+        for index in range(samples):
+            start_time = time.perf_counter()
+            result = module.execute_terminal_command(session_id, f"echo {index}")
+            if result.get('status') != 'success':
+                break
+            times.append(time.perf_counter() - start_time)
+        return summarize(times)
+    finally:
+        module.close_terminal_session(session_id)
+
+def measure_throughput(module, watcher, workspace, size_bytes, timeout=300):
+    session_id = start_session(module, workspace)
+    try:
+        received = watcher.mark(session_id)
+        # 标记拆成两段，避免命令回显提前匹配
+        command = f"head -c {size_bytes} /dev/zero | base64; echo __BENCH_''DONE__\n"
+        start_time = time.perf_counter()
+        cpu_start = time.process_time()
+        module.write_terminal_input(session_id, command)
+        finished = watcher.wait_for(session_id, DONE_MARKER, timeout)
+        elapsed = time.perf_counter() - start_time
+        cpu_seconds = time.process_time() - cpu_start
+        output_bytes = watcher.mark(session_id) - received
+    finally:
+        module.close_terminal_session(session_id)
+        watcher.forget(session_id)
+
+    return {
+        'completed': finished,
+        'input_bytes': size_bytes,
+        'output_bytes': output_bytes,
+        'seconds': round(elapsed, 3),
+        'mb_per_second': round(output_bytes / elapsed / 1024 / 1024, 1),
+        'cpu_seconds': round(cpu_seconds, 3)  # 本进程（读取输出）消耗的 CPU 时间
+    }
+
+def scaling_steps(max_sessions):
+    return [step for step in SCALING_STEPS if step < max_sessions] + [max_sessions]
+
+def measure_scaling(module, watcher, workspace, max_sessions, idle_seconds, samples):
+    """逐步增加并发会话，每一步记录资源占用和最新会话的按键延迟
+
+    同一进程中之前的测试释放的内存会被复用，RSS 增量偏小，
+    因此另外用 tracemalloc 统计会话占用的 Python 内存。
+    """
+    results = []
+    sessions = []
+    baseline = process_stats()
+    tracemalloc.start()
+    traced_baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        for step in scaling_steps(max_sessions):
+            while len(sessions) < step:
+                sessions.append(start_session(module, workspace, settle=0))
+            time.sleep(0.5)  # 等待所有 shell 启动完成
+
+            # 所有会话空闲时本进程的 CPU 占用
+            cpu_start = time.process_time()
+            time.sleep(idle_seconds)
+            idle_cpu = (time.process_time() - cpu_start) / idle_seconds
+
+            stats = process_stats()
+            traced = tracemalloc.get_traced_memory()[0] - traced_baseline
+            shells_kb = children_rss_kb()
+            echoes = detect_echo(module, watcher, sessions[-1])
+            latency = summarize(keystroke_samples(module, watcher, sessions[-1], samples, echoes))
+            results.append({
+                'sessions': step,
+                'rss_kb': stats['rss_kb'],
+                'rss_kb_per_session': round((stats['rss_kb'] - baseline['rss_kb']) / step, 1),
+                'python_kb_per_session': round(traced / 1024 / step, 1),
+                'shell_rss_kb_per_session': round(shells_kb / step, 1),
+                'threads': stats['threads'],
+                'threads_per_session': round((stats['threads'] - baseline['threads']) / step, 2),
+                'fds': stats['fds'],
+                'idle_cpu_percent': round(idle_cpu * 100, 2),
+                'latency': latency
+            })
+    finally:
+        tracemalloc.stop()
+        for session_id in sessions:
+            module.close_terminal_session(session_id)
+            watcher.forget(session_id)
+    return {'baseline': baseline, 'steps': results}
+
+def run_backend(module, tests, args, workspace):
+    watcher = OutputWatcher()
+    module.set_terminal_output_listener(watcher)
+    results = {}
+    try:
+        if 'latency' in tests:
+            results['latency'] = measure_latency(module, watcher, workspace, args.samples)
+        if 'command' in tests:
+            results['command'] = measure_command(module, workspace, args.command_samples)
+        if 'throughput' in tests:
+            results['throughput'] = measure_throughput(module, watcher, workspace,
+                                                       args.size_mb * 1024 * 1024)
+        if 'scaling' in tests:
+            results['scaling'] = measure_scaling(module, watcher, workspace, args.max_sessions,
+                                                 args.idle_seconds, args.scaling_samples)
+    finally:
+        module.set_terminal_output_listener(None)
+    return results
+
+def print_report(name, results):
+    print(f"== {name}")
+    latency = results.get('latency')
+    if latency:
+        print(f"  按键延迟({latency['mode']}): p50 {latency.get('p50_ms')} ms, "
+              f"p99 {latency.get('p99_ms')} ms, max {latency.get('max_ms')} ms")
+    command = results.get('command')
+    if command:
+        print(f"  命令往返: p50 {command['p50_ms']} ms, p99 {command['p99_ms']} ms")
+    throughput = results.get('throughput')
+    if throughput:
+        status = '' if throughput['completed'] else ' (超时)'
+        print(f"  吞吐量: {throughput['output_bytes'] / 1024 / 1024:.1f} MB / {throughput['seconds']} s = "
+              f"{throughput['mb_per_second']} MB/s, CPU {throughput['cpu_seconds']} s{status}")
+    scaling = results.get('scaling')
+    if scaling:
+        print(f"  {'会话':>6}{'RSS(KB)':>10}{'KB/会话':>10}{'Py KB':>8}{'shell KB':>10}{'线程':>6}{'fd':>6}{'空闲CPU%':>10}{'p50(ms)':>10}")
+        for step in scaling['steps']:
+            p50 = step['latency']['p50_ms'] if step['latency'] else '-'
+            print(f"  {step['sessions']:>6}{step['rss_kb']:>10}{step['rss_kb_per_session']:>10}"
+                  f"{step['python_kb_per_session']:>8}{step['shell_rss_kb_per_session']:>10}{step['threads']:>6}{step['fds']:>6}{step['idle_cpu_percent']:>10}{p50:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="终端性能测试")
+    parser.add_argument('--backends', default=','.join(BACKEND_ORDER), help="逗号分隔的实现名称")
+    parser.add_argument('--tests', default=','.join(TESTS), help="逗号分隔的测试项")
+    parser.add_argument('--size-mb', type=int, default=50, help="吞吐量测试中 base64 之前的数据量（MB）")
+    parser.add_argument('--samples', type=int, default=200, help="按键延迟样本数")
+    parser.add_argument('--command-samples', type=int, default=20, help="命令往返样本数")
+    parser.add_argument('--max-sessions', type=int, default=Config.MAX_TERMINAL_SESSIONS, help="最大并发会话数")
+    parser.add_argument('--scaling-samples', type=int, default=20, help="每一步的按键延迟样本数")
+    parser.add_argument('--idle-seconds', type=float, default=1.0, help="每一步测量空闲 CPU 的时长")
+    parser.add_argument('--json', help="JSON 结果文件，- 表示标准输出")
+    args = parser.parse_args()
+
+    tests = [test for test in args.tests.split(',') if test in TESTS]
+    workspace = tempfile.mkdtemp(prefix='terminal_bench_')
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'tests': tests,
+            'size_mb': args.size_mb,
+            'max_sessions': args.max_sessions
+        },
+        'backends': {}
+    }
+
+    for name, module in load_backends(args.backends.split(',')):
+        results = run_backend(module, tests, args, workspace)
+        report['backends'][name] = results
+        if args.json != '-':
+            print_report(name, results)
+
+    if args.json == '-':
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -54,6 +54,21 @@ if [ $? -ne 0 ]; then
     exit 1
 fi
 
+echo "编译 C++ 终端库..."
+CXX_BIN="${CXX:-}"
+if [ -z "$CXX_BIN" ]; then
+    if command -v g++ &> /dev/null; then
+        CXX_BIN=g++
+    elif command -v clang++ &> /dev/null; then
+        CXX_BIN=clang++
+    fi
+fi
+if [ -n "$CXX_BIN" ] && $CXX_BIN -O2 -std=c++17 -shared -fPIC -o libterminal.so terminal_manager.cpp -lutil -pthread; then
+    echo "✓ libterminal.so 已编译"
+else
+    echo "⚠ libterminal.so 编译失败，终端将回退到 Python 实现"
+fi
+
 echo "构建完成!"
 echo "启动服务: python3 app.py"
 echo "高级功能:"
@@ -0,0 +1,173 @@
+import os
+import re
+import shutil
+import hashlib
+import subprocess
+import threading
+import uuid
+from collections import OrderedDict
+
+def read_project_files(workspace):
+    """读取 Cargo 项目中影响构建结果的文件（Cargo.toml、Cargo.lock、build.rs、src/），返回相对路径 -> 内容"""
+    files = {}
+    for name in ("Cargo.toml", "Cargo.lock", "build.rs"):
+        try:
+            with open(os.path.join(workspace, name), 'rb') as f:
+                files[name] = f.read()
+        except OSError:
+            pass
+    src_dir = os.path.join(workspace, "src")
+    for root, _, names in os.walk(src_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                with open(path, 'rb') as f:
+                    files[os.path.relpath(path, workspace)] = f.read()
+            except OSError:
+                pass
+    return files
+
+class ArtifactCache:
+    """按源码内容寻址的编译产物缓存（磁盘上按大小做 LRU 淘汰）"""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.toolchain_version = None
+        self.entries = OrderedDict()  # key -> 文件大小，按最近使用排序
+        self.total_bytes = 0
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._load_index()
+
+    def _load_index(self):
+        """启动时扫描缓存目录，按 mtime 恢复 LRU 顺序"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if '.tmp-' in name:
+                    # 上次进程异常退出留下的临时文件
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _get_toolchain_version(self):
+        if self.toolchain_version is None:
+            try:
+                result = subprocess.run(["rustc", "-vV"], capture_output=True, text=True, timeout=10)
+                self.toolchain_version = result.stdout
+            except Exception:
+                self.toolchain_version = ""
+        return self.toolchain_version
+
+    def compute_key(self, workspace, profile):
+        """计算缓存键：源码、Cargo.toml/Cargo.lock、工具链版本和构建配置的哈希
+
+        项目引用本地 path 依赖时无法仅凭工作区内容判断是否变化，返回 None 表示不缓存。
+        """
+        return self.compute_key_for_files(read_project_files(workspace), profile)
+
+    def compute_key_for_files(self, files, profile):
+        """按已读入内存的项目文件（相对路径 -> 内容，见 read_project_files）计算缓存键"""
+        cargo_toml = files.get("Cargo.toml")
+        if cargo_toml is None:
+            return None
+        if re.search(rb'\bpath\s*=', cargo_toml):
+            return None
+
+        hasher = hashlib.sha256()
+        hasher.update(self._get_toolchain_version().encode('utf-8'))
+        hasher.update(b"\0" + profile.encode('utf-8') + b"\0")
+        hasher.update(cargo_toml)
+
+        for relative_path in sorted(files):
+            if relative_path == "Cargo.toml":
+                continue
+            hasher.update(b"\0" + relative_path.encode('utf-8') + b"\0")
+            hasher.update(hashlib.sha256(files[relative_path]).digest())
+
+        return hasher.hexdigest()
+
+    def get(self, key):
+        """查找缓存的可执行文件，命中时返回路径"""
+        with self.lock:
+            if key in self.entries:
+                path = self._entry_path(key)
+                try:
+                    os.utime(path)  # 更新 mtime，重启后仍能保持 LRU 顺序
+                except OSError:
+                    self.total_bytes -= self.entries.pop(key)
+                else:
+                    self.entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return path
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, key, binary_path):
+        """将新编译的可执行文件存入缓存"""
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        try:
+            shutil.copy2(binary_path, tmp_path)
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                os.remove(tmp_path)
+                return False
+            os.utime(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入编译缓存失败: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)
+            self.entries[key] = size
+            self.total_bytes += size
+            self.counters['stores'] += 1
+            self._evict()
+        return True
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到总大小不超过上限（需持有锁）"""
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.counters['evictions'] += 1
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return dict(
+                self.counters,
+                entries=len(self.entries),
+                size_bytes=self.total_bytes,
+                max_bytes=self.max_bytes,
+                hit_rate=round(self.counters['hits'] / lookups, 3) if lookups else 0.0
+            )
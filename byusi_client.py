@@ -0,0 +1,151 @@
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# 重复发送不会产生副作用的操作，连接错误、读取超时和服务端错误时都可以重试
+# （login 每次都会签发新的 token，请求可能已经生效，不能在读取超时后重试）
+IDEMPOTENT_ACTIONS = {'get_user'}
+
+class CircuitBreaker:
+    """熔断器：连续失败 failure_threshold 次后断开 reset_timeout 秒，期间直接失败；
+    到期后放行一个试探请求（半开），成功则恢复，失败则重新断开。"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+
+    def allow(self):
+        """是否放行请求：放行试探请求时返回 'probe'，调用方结束后必须调用 end_probe()"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.time() - self.opened_at < self.reset_timeout:
+                return False
+            self.probing = True
+            return 'probe'
+
+    def end_probe(self):
+        """试探请求结束：没有记录成功或失败（如抛出未处理的异常）时保持半开，允许下一个试探请求"""
+        with self.lock:
+            self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.time()
+                self.trips += 1
+            self.probing = False
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            if self.probing or time.time() - self.opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+class ByUsiClient:
+    """ByUsi 用户 API 客户端
+
+    所有请求共用一个 requests.Session，复用 keep-alive 连接（连接池大小 pool_size），
+    每个请求都有连接/读取超时。连接失败时重试（请求未发出），读取超时和 5xx 只对
+    幂等操作重试，重试间隔按指数退避并加随机抖动。连续失败后熔断，直接返回错误。
+
+    网络错误的返回值带 transient 标记，调用方据此区分“token 无效”和“服务暂不可用”。
+    """
+
+    def __init__(self, base_url, connect_timeout, read_timeout, max_retries, retry_backoff,
+                 pool_size, breaker_threshold, breaker_reset):
+        self.url = f"{base_url.rstrip('/')}/api.php"
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+
+    def _count(self, field):
+        with self.lock:
+            self.counters[field] += 1
+
+    def call(self, action, **params):
+        """调用 api.php 的 action，返回 API 的 JSON 结果或错误状态字典"""
+        admitted = self.breaker.allow()
+        if not admitted:
+            self._count('rejected')
+            return {"status": "error", "message": "认证服务暂时不可用", "transient": True}
+        try:
+            return self._call(action, params)
+        finally:
+            if admitted == 'probe':
+                self.breaker.end_probe()
+
+    def _call(self, action, params):
+        data = dict(params, action=action)
+        attempt = 0
+        while True:
+            self._count('requests')
+            try:
+                response = self.session.post(self.url, data=data, timeout=self.timeout)
+                if response.status_code >= 500:
+                    raise requests.HTTPError(f"服务端错误: {response.status_code}", response=response)
+                result = response.json()
+                self.breaker.record_success()
+                return result
+            except (requests.RequestException, ValueError) as e:
+                if attempt < self.max_retries and self._should_retry(action, e):
+                    attempt += 1
+                    self._count('retries')
+                    # 指数退避 + 全抖动，避免大量请求同时重试
+                    time.sleep(random.uniform(0, self.retry_backoff * (2 ** (attempt - 1))))
+                    continue
+                self._count('failures')
+                self.breaker.record_failure()
+                return {"status": "error", "message": str(e), "transient": True}
+
+    def _should_retry(self, action, error):
+        if action in IDEMPOTENT_ACTIONS:
+            return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.HTTPError))
+        # 其他操作（如 register）只在建立连接阶段失败、请求确定没有发出时重试；
+        # ConnectionError 也包括请求发出后连接被重置（如复用的 keep-alive 连接），此时不能重试
+        return self._is_connect_error(error)
+
+    def _is_connect_error(self, error):
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        if not isinstance(error, requests.ConnectionError) or not error.args:
+            return False
+        reason = getattr(error.args[0], 'reason', error.args[0])  # urllib3 的 MaxRetryError
+        return isinstance(reason, NewConnectionError)
+
+    def get_stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return dict(
+            counters,
+            breaker_state=self.breaker.state,
+            breaker_trips=self.breaker.trips,
+            connect_timeout=self.timeout[0],
+            read_timeout=self.timeout[1]
+        )
@@ -4,13 +4,27 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 class Config:
-    BYUSI_BASE_URL = "https://api.www.cdifit.cn/user/"
+    BYUSI_BASE_URL = os.environ.get('BYUSI_BASE_URL', "https://api.www.cdifit.cn/user/")  # 本地测试可指向 scripts/byusi_stub.py
+    BYUSI_CONNECT_TIMEOUT = 3  # ByUsi API 连接超时（秒）
+    BYUSI_READ_TIMEOUT = 10  # ByUsi API 读取超时（秒）
+    BYUSI_MAX_RETRIES = 2  # 连接失败（及幂等操作超时、5xx）的重试次数
+    BYUSI_RETRY_BACKOFF = 0.2  # 首次重试的最大等待时间（秒），之后逐次翻倍
+    BYUSI_POOL_SIZE = 10  # keep-alive 连接池大小
+    BYUSI_BREAKER_THRESHOLD = 5  # 连续失败次数达到后熔断
+    BYUSI_BREAKER_RESET = 30  # 熔断持续时间（秒），之后放行一个试探请求
+    AUTH_CACHE_TTL = 60  # token 验证成功的结果缓存时间（秒）
+    AUTH_NEGATIVE_CACHE_TTL = 10  # token 无效的结果缓存时间（秒），网络错误不缓存
+    AUTH_CACHE_MAX_ENTRIES = 10000  # 最多缓存的 token 数
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     DEBUG = os.environ.get('DEBUG', 'True').lower() == 'true'
     # 使用相对路径
     RUST_WORKSPACE_BASE = os.path.join(BASE_DIR, "workspace")
     PROOT_ENV_BASE = os.path.join(BASE_DIR, "proot_environments")
-    USER_DB_PATH = os.path.join(BASE_DIR, "user_db.json")
+    USER_STORE_PATH = os.path.join(BASE_DIR, "user_db.sqlite3")  # 用户数据（SQLite，WAL 模式）
+    USER_DB_PATH = os.path.join(BASE_DIR, "user_db.json")  # 旧版 JSON 用户数据，首次启动时导入 SQLite
+    ENV_REGISTRY_PATH = os.path.join(BASE_DIR, "environments.sqlite3")  # 环境注册表（SQLite，WAL 模式）
+    USER_FLUSH_INTERVAL = 30  # 最近使用时间在内存中积累后批量写入的间隔（秒）
+    USER_FLUSH_THRESHOLD = 1000  # 待写入的用户数达到后立即写入
     
     # 会话配置
     SESSION_COOKIE_NAME = 'rust_ide_session'
@@ -20,14 +34,49 @@ class Config:
     
     # 执行配置
     MAX_EXECUTION_TIME = 30
-    MAX_MEMORY_MB = 512
+    BUILD_TIMEOUT = 120  # cargo 构建超时（秒）
+    RUN_TIMEOUT = 10  # 程序运行超时（秒）
+    BUILD_PROFILE = 'debug'  # 交互运行默认使用 debug 增量编译，release 需显式指定
+    ARTIFACT_CACHE_DIR = os.path.join(BASE_DIR, "build_cache", "artifacts")
+    ARTIFACT_CACHE_MAX_MB = 1024  # 编译产物缓存磁盘上限
+    CHECK_TIMEOUT = 30  # cargo check 超时（秒）
+    CHECK_CACHE_SIZE = 256  # 按源码哈希缓存的检查结果条数
+    MAX_MEMORY_MB = 512  # 用户程序和终端命令的地址空间上限
+    MAX_BUILD_MEMORY_MB = 2048  # rustc 需要较大的虚拟地址空间
+    USAGE_HISTORY_SIZE = 100  # 每个用户保留的资源使用记录条数
+    RUN_MAX_WORKERS = os.cpu_count() or 1  # 同时编译/运行的任务数
+    RUN_QUEUE_SIZE = 50  # 等待队列上限
+    RUN_MAX_QUEUED_PER_USER = 3
+    RUN_RESULT_TTL = 300  # 运行结果保留时间（秒）
+    SANDBOX_POOL_SIZE = 2  # 每个环境常驻的沙箱进程上限
+    SANDBOX_IDLE_TIMEOUT = 300  # 沙箱进程空闲回收时间（秒）
+    TERMINAL_BACKEND = os.environ.get('TERMINAL_BACKEND', 'auto')  # auto / cpp / pty / subprocess
+    TERMINAL_SCROLLBACK_BYTES = 256 * 1024  # 每个终端会话的回滚缓冲区（字节），写满后覆盖最旧的输出
+    TERMINAL_FRAME_RATE = 30  # 每个终端每秒最多推送的输出帧数
+    TERMINAL_FRAME_BYTES = 32 * 1024  # 每帧最多包含的输出字节数
+    TERMINAL_ACK_WINDOW = 128 * 1024  # 已推送但客户端未确认的字节上限，超过后暂停推送
+    TERMINAL_BACKLOG_LIMIT = 192 * 1024  # 未确认输出超过后暂停读取 pty（应小于回滚缓冲区）
+    TERMINAL_PAUSE_TIMEOUT = 10  # 暂停读取的最长时间（秒），超时后丢弃积压输出
+    TERMINAL_INPUT_TIMEOUT = 2  # pty 输入缓冲区写满时等待程序读取的最长时间（秒），超时后丢弃剩余输入
+    TERMINAL_REATTACH_GRACE = 300  # 连接断开后终端会话保留的时间（秒），期间可重新连接
     MAX_TERMINAL_SESSIONS = 100
     TERMINAL_TIMEOUT = 3600
+    IGNORE_DEFAULT_PATTERNS = ['target/', '.git/']  # 内置忽略规则（gitignore 语法），与各目录的 .gitignore / .ignore 合并
+    FILE_TREE_PAGE_SIZE = 200  # 按层加载文件树时每个目录每次返回的最多条目数
+    FILE_TREE_MAX_DEPTH = 5  # 按层加载文件树时一次最多返回的层数
+    WORKSPACE_WATCH_BACKEND = 'auto'  # 文件变更检测：auto（优先 inotify）/ inotify / polling
+    WORKSPACE_WATCH_DEBOUNCE = 0.1  # 合并文件变更后再推送的时间窗口（秒）
+    WORKSPACE_POLL_INTERVAL = 2  # 没有 inotify 时轮询已加载目录的间隔（秒）
+    WORKSPACE_WATCH_MAX_DIRECTORIES = 2000  # 每个环境最多缓存并监听的目录数，超过后直接读取磁盘
+    WORKSPACE_WATCH_MAX_EVENTS = 500  # 单次推送的最多变更数，超过后通知客户端重新加载文件树
     ALLOWED_EXTENSIONS = {'rs', 'toml', 'txt', 'md', 'json', 'py', 'js', 'html', 'css', 'sh'}
     MAX_FILE_SIZE = 10 * 1024 * 1024
+    FILE_READ_INLINE_LIMIT = 1024 * 1024  # /api/files/read 以 JSON 返回内容的最大文件大小，更大的文件用 raw=1 流式读取
     
     # WebSocket 配置
-    SOCKETIO_ASYNC_MODE = 'eventlet'
+    # 运行输出、终端输出和文件变更由后台线程（调度器、多路复用器、合帧器、文件监听）推送，
+    # 必须使用 threading 模式：eventlet 未 monkey_patch 时，原生线程中的 emit 不会被发送
+    SOCKETIO_ASYNC_MODE = 'threading'
     
     # 环境配置
     USE_PROOT = True
\ No newline at end of file
@@ -1,10 +1,16 @@
 import ctypes
 import os
+import time
+import uuid
+import select
+from config import Config
+from terminal_mux import terminal_mux
+from python_terminal import PythonTerminalManager
 
 # 获取当前文件所在目录
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# 加载 C++ 库
+# 加载 C++ 库（不存在时抛出 OSError，由 terminal_backend 回退到其他实现）
 def load_cpp_library():
     lib_path = os.path.join(BASE_DIR, 'libterminal.so')
     return ctypes.CDLL(lib_path)
@@ -15,31 +21,134 @@ cpp_lib = load_cpp_library()
 cpp_lib.start_terminal_session.restype = ctypes.c_char_p
 cpp_lib.start_terminal_session.argtypes = [ctypes.c_char_p]
 
-cpp_lib.execute_terminal_command.restype = ctypes.c_int
-cpp_lib.execute_terminal_command.argtypes = [
-    ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_size_t
-]
-
 cpp_lib.close_terminal_session.restype = ctypes.c_int
 cpp_lib.close_terminal_session.argtypes = [ctypes.c_char_p]
 
+cpp_lib.terminal_read_output.restype = ctypes.c_long
+cpp_lib.terminal_read_output.argtypes = [ctypes.c_char_p, ctypes.c_void_p, ctypes.c_size_t]
+
+cpp_lib.terminal_write_input.restype = ctypes.c_long
+cpp_lib.terminal_write_input.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_size_t]
+
+cpp_lib.terminal_get_fd.restype = ctypes.c_int
+cpp_lib.terminal_get_fd.argtypes = [ctypes.c_char_p]
+
+cpp_lib.terminal_resize.restype = ctypes.c_int
+cpp_lib.terminal_resize.argtypes = [ctypes.c_char_p, ctypes.c_ushort, ctypes.c_ushort]
+
+class CppTerminalManager(PythonTerminalManager):
+    """基于 libterminal.so 的终端实现
+
+    pty 的创建、读写和关闭由 C++ 完成；输出 fd 仍由共享的多路复用器监听，
+    可读时调用 terminal_read_output 直接读入多路复用器的缓冲区，读取过程中
+    没有按次分配，也没有输出大小上限。回滚缓冲区、命令执行等逻辑与 pty 实现相同。
+    """
+
+    def __init__(self):
+        super().__init__()
+        # 多路复用器的读缓冲区固定不变，只需取一次地址
+        read_buffer = terminal_mux.read_buffer
+        self.read_buffer_address = ctypes.addressof((ctypes.c_char * len(read_buffer)).from_buffer(read_buffer))
+        self.read_buffer_size = len(read_buffer)
+    
+    def create_session(self, workspace):
+        try:
+            native_id = cpp_lib.start_terminal_session(workspace.encode('utf-8'))
+            if not native_id:
+                return None
+            master_fd = cpp_lib.terminal_get_fd(native_id)
+            
+            session_id = str(uuid.uuid4())
+            self.sessions[session_id] = self._new_session(workspace, native_id=native_id, master_fd=master_fd)
+            
+            self._register_output(session_id, self._native_reader(native_id))
+            return session_id
+            
+        except Exception as e:
+            print(f"创建终端会话失败: {e}")
+            return None
+    
+    def _native_reader(self, native_id):
+        def read_into(buffer):
+            length = cpp_lib.terminal_read_output(native_id, self.read_buffer_address, self.read_buffer_size)
+            if length == 0:
+                raise BlockingIOError()
+            return max(0, length)  # -1 表示 shell 已退出，按 EOF 处理
+        return read_into
+    
+    def write_input(self, session_id, data):
+        session = self.sessions.get(session_id)
+        if not session or not session['active']:
+            return False
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        deadline = time.monotonic() + Config.TERMINAL_INPUT_TIMEOUT
+        while data:
+            written = cpp_lib.terminal_write_input(session['native_id'], data, len(data))
+            if written < 0:
+                return False
+            if written == 0:
+                # pty 输入缓冲区已满，等待程序读取，超时后丢弃剩余输入
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"终端输入超时，丢弃 {len(data)} 字节")
+                    return False
+                select.select([], [session['master_fd']], [], remaining)
+            data = data[written:]
+        return True
+    
+    def resize(self, session_id, rows, cols):
+        session = self.sessions.get(session_id)
+        if not session:
+            return False
+        return cpp_lib.terminal_resize(session['native_id'], rows, cols) == 0
+    
+    def close_session(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if not session:
+            return False
+        session['active'] = False
+        # 先停止监听，再由 C++ 关闭 fd，避免 fd 被复用后误读
+        terminal_mux.unregister(session['master_fd'])
+        cpp_lib.close_terminal_session(session['native_id'])
+        return True
+
+# 全局实例
+terminal_manager = CppTerminalManager()
+
+# 兼容性包装函数
 def start_terminal_session(workspace):
-    result = cpp_lib.start_terminal_session(workspace.encode('utf-8'))
-    return result.decode('utf-8') if result else None
+    return terminal_manager.create_session(workspace)
 
 def execute_terminal_command(session_id, command):
-    output_buffer = ctypes.create_string_buffer(4096)
-    result = cpp_lib.execute_terminal_command(
-        session_id.encode('utf-8'),
-        command.encode('utf-8'),
-        output_buffer,
-        ctypes.sizeof(output_buffer)
-    )
-    
-    if result == 0:
-        return {"status": "success", "output": output_buffer.value.decode('utf-8')}
-    else:
-        return {"status": "error", "message": "Command execution failed"}
+    return terminal_manager.execute_command(session_id, command)
 
 def close_terminal_session(session_id):
-    return cpp_lib.close_terminal_session(session_id.encode('utf-8')) == 0
\ No newline at end of file
+    return terminal_manager.close_session(session_id)
+
+def write_terminal_input(session_id, data):
+    return terminal_manager.write_input(session_id, data)
+
+def resize_terminal(session_id, rows, cols):
+    return terminal_manager.resize(session_id, rows, cols)
+
+def read_terminal_output(session_id):
+    return terminal_manager.read_available_output(session_id)
+
+def read_terminal_scrollback(session_id, offset=0, max_bytes=None):
+    return terminal_manager.read_scrollback(session_id, offset, max_bytes)
+
+def get_terminal_offset(session_id):
+    return terminal_manager.get_output_offset(session_id)
+
+def pause_terminal_output(session_id):
+    return terminal_manager.pause_output(session_id)
+
+def resume_terminal_output(session_id):
+    return terminal_manager.resume_output(session_id)
+
+def get_terminal_stats():
+    return terminal_manager.get_stats()
+
+def set_terminal_output_listener(listener):
+    terminal_manager.set_output_listener(listener)
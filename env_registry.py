@@ -0,0 +1,156 @@
+import os
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS environments (
+    env_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    created_at REAL,
+    initialized INTEGER NOT NULL DEFAULT 0,
+    initialized_at REAL,
+    size_bytes INTEGER,
+    size_updated_at REAL
+);
+"""
+
+COLUMNS = ('env_id', 'user_id', 'path', 'created_at', 'initialized', 'initialized_at', 'size_bytes', 'size_updated_at')
+
+# 导入注册表之前创建的环境后写入 PRAGMA user_version
+SCHEMA_VERSION = 1
+
+def directory_size(path):
+    """目录下所有文件占用的字节数（不跟随符号链接）"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+    return total
+
+class EnvironmentRegistry:
+    """环境注册表（SQLite，WAL 模式）
+
+    记录每个环境的路径、所属用户、是否已初始化、磁盘占用和时间戳。
+    启动时不加载任何环境，由调用方按环境 ID 查询，重启耗时与环境数量无关。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(SCHEMA)
+
+    def import_once(self, load_environments):
+        """首次使用注册表时导入已有的环境，load_environments() 返回环境字典的可迭代对象
+
+        只在数据库版本低于 SCHEMA_VERSION 时调用 load_environments，之后的启动不再扫描。
+        """
+        with self.lock:
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return 0
+        try:
+            rows = [self._row(environment) for environment in load_environments()]
+        except Exception as e:
+            print(f"导入已有环境失败: {e}")
+            return 0
+
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO environments ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                    rows
+                )
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        if rows:
+            print(f"已导入 {len(rows)} 个已有环境")
+        return len(rows)
+
+    def _row(self, environment):
+        return (
+            environment['id'],
+            str(environment['user_id']),
+            environment['path'],
+            environment.get('created_at'),
+            1 if environment.get('initialized') else 0,
+            environment.get('initialized_at'),
+            environment.get('size_bytes'),
+            environment.get('size_updated_at')
+        )
+
+    def _execute(self, sql, params=()):
+        try:
+            with self.lock:
+                return self.conn.execute(sql, params).rowcount > 0
+        except sqlite3.Error as e:
+            print(f"保存环境注册表失败: {e}")
+            return False
+
+    def add(self, environment):
+        return self._execute(
+            f"INSERT OR REPLACE INTO environments ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(COLUMNS))})",
+            self._row(environment)
+        )
+
+    def get(self, env_id):
+        """按 ID 读取环境，返回与 ProotEnvironmentManager.environments 中相同格式的字典"""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM environments WHERE env_id = ?", (env_id,)
+            ).fetchone()
+        if not row:
+            return None
+        environment = dict(zip(COLUMNS, row))
+        environment['id'] = environment.pop('env_id')
+        environment['user_id'] = str(environment['user_id'])
+        environment['initialized'] = bool(environment['initialized'])
+        return environment
+
+    def remove(self, env_id):
+        return self._execute("DELETE FROM environments WHERE env_id = ?", (env_id,))
+
+    def set_initialized(self, env_id, initialized=True):
+        return self._execute(
+            "UPDATE environments SET initialized = ?, initialized_at = ? WHERE env_id = ?",
+            (1 if initialized else 0, time.time() if initialized else None, env_id)
+        )
+
+    def update_size(self, env_id, size_bytes):
+        return self._execute(
+            "UPDATE environments SET size_bytes = ?, size_updated_at = ? WHERE env_id = ?",
+            (size_bytes, time.time(), env_id)
+        )
+
+    def get_stats(self):
+        with self.lock:
+            total, initialized, size_bytes = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(initialized), 0), COALESCE(SUM(size_bytes), 0) FROM environments"
+            ).fetchone()
+        return {'environments': total, 'initialized': initialized, 'size_bytes': size_bytes}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
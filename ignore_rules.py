@@ -0,0 +1,215 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# 每个目录中读取的忽略文件
+IGNORE_FILES = ('.gitignore', '.ignore')
+
+def compile_pattern(line):
+    """把 .gitignore 的一行转换为 (正则, 是否取反, 是否只匹配目录, 是否锚定)，空行和注释返回 None
+
+    支持 gitignore 的常用语法：! 取反、# 注释（\\# \\! 转义）、末尾 / 只匹配目录、
+    含 / 的模式相对于忽略文件所在目录、*、?、[...] 和 **。
+    """
+    line = line.rstrip('\n').rstrip('\r')
+    if not line.endswith('\\ '):
+        line = line.rstrip()
+    if not line or line.startswith('#'):
+        return None
+
+    negate = False
+    if line.startswith('!'):
+        negate = True
+        line = line[1:]
+    elif line.startswith('\\#') or line.startswith('\\!'):
+        line = line[1:]
+
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    anchored = '/' in line
+    line = line.lstrip('/')
+
+    regex = []
+    index = 0
+    while index < len(line):
+        char = line[index]
+        if line.startswith('**/', index):
+            regex.append('(?:.*/)?')
+            index += 3
+            continue
+        if line.startswith('**', index) and index + 2 == len(line):
+            regex.append('.*')
+            index += 2
+            continue
+        if char == '*':
+            regex.append('[^/]*')
+        elif char == '?':
+            regex.append('[^/]')
+        elif char == '[':
+            end = line.find(']', index + 1)
+            if end == -1:
+                regex.append(re.escape(char))
+            else:
+                group = line[index + 1:end]
+                if group.startswith('!'):
+                    group = '^' + group[1:]
+                regex.append(f'[{group}]')
+                index = end
+        elif char == '\\' and index + 1 < len(line):
+            index += 1
+            regex.append(re.escape(line[index]))
+        else:
+            regex.append(re.escape(char))
+        index += 1
+
+    try:
+        return re.compile(''.join(regex) + r'\Z', re.DOTALL), negate, dir_only, anchored
+    except re.error:
+        return None
+
+def compile_patterns(lines):
+    return [rule for rule in (compile_pattern(line) for line in lines) if rule]
+
+class IgnoreMatcher:
+    """一个目录中条目的匹配器：包含从根目录到该目录的所有规则
+
+    遍历目录树时用 child(name) 从上层匹配器得到子目录的匹配器，每个目录的忽略文件只检查一次。
+    """
+
+    def __init__(self, owner, directory, rules, ignored=False):
+        self.owner = owner  # 所属的 IgnoreRules，用于读取子目录的规则
+        self.directory = directory
+        self.rules = rules  # [(基准目录, 规则列表)]，从上层到下层
+        self.ignored_directory = ignored  # 目录本身已被忽略，其中的条目都视为忽略
+
+    def ignored(self, name, is_dir):
+        if self.ignored_directory:
+            return True
+        path = os.path.join(self.directory, name)
+        result = False
+        # 后面的规则优先，下层目录的忽略文件优先于上层
+        for base, rules in self.rules:
+            relative = os.path.relpath(path, base) if base else name
+            for regex, negate, dir_only, anchored in rules:
+                if dir_only and not is_dir:
+                    continue
+                if regex.match(relative if anchored else name):
+                    result = not negate
+        return result
+
+    def child(self, name):
+        """子目录 name 中条目的匹配器"""
+        directory = os.path.join(self.directory, name)
+        if self.ignored(name, True):
+            # 上层目录被忽略时，下层的条目也都被忽略（与 git 一致，无法再取反），不再读取其中的忽略文件
+            return IgnoreMatcher(self.owner, directory, self.rules, True)
+        rules = self.owner._directory_rules(directory) if self.owner.contains(directory) else None
+        if not rules:
+            return IgnoreMatcher(self.owner, directory, self.rules)
+        return IgnoreMatcher(self.owner, directory, self.rules + [(directory, rules)])
+
+class IgnoreRules:
+    """工作区的忽略规则：内置默认规则 + 各目录中的 .gitignore / .ignore
+
+    每个目录的规则编译后缓存，缓存以忽略文件的 mtime 和大小为版本，文件修改后自动重新编译。
+    """
+
+    def __init__(self, root, default_patterns=(), max_directories=4096):
+        self.root = os.path.abspath(root)
+        self.defaults = compile_patterns(default_patterns)
+        self.max_directories = max_directories
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # 目录 -> (版本, 规则列表)
+        self.counters = {'hits': 0, 'compiles': 0}
+
+    def _signature(self, directory):
+        signature = []
+        for name in IGNORE_FILES:
+            try:
+                stat = os.stat(os.path.join(directory, name))
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _directory_rules(self, directory):
+        """目录自身忽略文件中的规则（带缓存）"""
+        signature = self._signature(directory)
+        with self.lock:
+            cached = self.cache.get(directory)
+            if cached and cached[0] == signature:
+                self.cache.move_to_end(directory)
+                self.counters['hits'] += 1
+                return cached[1]
+
+        rules = []
+        if any(signature):
+            for name in IGNORE_FILES:
+                try:
+                    with open(os.path.join(directory, name), 'r', encoding='utf-8', errors='replace') as f:
+                        rules.extend(compile_patterns(f))
+                except OSError:
+                    pass
+
+        with self.lock:
+            self.cache[directory] = (signature, rules)
+            self.cache.move_to_end(directory)
+            while len(self.cache) > self.max_directories:
+                self.cache.popitem(last=False)
+            self.counters['compiles'] += 1
+        return rules
+
+    def contains(self, directory):
+        return directory == self.root or directory.startswith(self.root + os.sep)
+
+    def matcher(self, directory):
+        """返回 directory 中条目的匹配器；directory 不在根目录下时只使用默认规则
+
+        从根目录逐层构造，遍历子目录时应改用 matcher.child(name)。
+        """
+        directory = os.path.abspath(directory)
+        chain = [(None, self.defaults)]
+        if not self.contains(directory):
+            return IgnoreMatcher(self, directory, chain)
+
+        rules = self._directory_rules(self.root)
+        if rules:
+            chain.append((self.root, rules))
+        matcher = IgnoreMatcher(self, self.root, chain)
+        relative = os.path.relpath(directory, self.root)
+        if relative != '.':
+            for part in relative.split(os.sep):
+                matcher = matcher.child(part)
+        return matcher
+
+    def is_ignored(self, path, is_dir):
+        path = os.path.abspath(path)
+        return self.matcher(os.path.dirname(path)).ignored(os.path.basename(path), is_dir)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.counters, directories=len(self.cache))
+
+class IgnoreRulesCache:
+    """按工作区根目录缓存 IgnoreRules"""
+
+    def __init__(self, default_patterns, max_roots=256):
+        self.default_patterns = tuple(default_patterns)
+        self.max_roots = max_roots
+        self.lock = threading.Lock()
+        self.roots = OrderedDict()
+
+    def get(self, root):
+        root = os.path.abspath(root)
+        with self.lock:
+            rules = self.roots.get(root)
+            if rules is None:
+                rules = IgnoreRules(root, self.default_patterns)
+                self.roots[root] = rules
+                while len(self.roots) > self.max_roots:
+                    self.roots.popitem(last=False)
+            self.roots.move_to_end(root)
+            return rules
@@ -0,0 +1,198 @@
+import time
+import threading
+
+from ring_buffer import utf8_continuation_length
+
+COUNTER_FIELDS = ('bytes_in', 'bytes_emitted', 'frames_emitted', 'bytes_dropped', 'frames_dropped', 'pauses')
+
+class OutputCoalescer:
+    """终端输出合帧与背压
+
+    pty 输出先写入会话的回滚缓冲区，这里只记录偏移量，由一个推送线程按帧推送：
+    每个终端每秒最多 frame_rate 帧、每帧最多 frame_bytes 字节，空闲后的第一帧立即发送。
+    客户端用 ack(offset) 确认已处理的输出：
+    - 已发送未确认超过 ack_window 时暂停发送；
+    - 未确认（含未发送）超过 backlog_limit 时暂停读取 pty，程序写满 pty 后阻塞；
+    - 暂停超过 pause_timeout 仍未确认时恢复读取，此后积压超过 backlog_limit 的部分
+      被丢弃，只推送最新的一帧并附带省略提示。
+    """
+
+    def __init__(self, read_output, pause_output, resume_output, emit_frame,
+                 frame_rate, frame_bytes, ack_window, backlog_limit, pause_timeout):
+        self.read_output = read_output  # read_output(terminal_id, offset, max_bytes) -> (data, next_offset, missed)
+        self.pause_output = pause_output
+        self.resume_output = resume_output
+        self.emit_frame = emit_frame  # emit_frame(terminal_id, data, end_offset)，data 为原始字节
+        self.frame_interval = 1.0 / max(1, frame_rate)
+        self.frame_bytes = frame_bytes
+        self.ack_window = ack_window
+        self.backlog_limit = backlog_limit
+        self.pause_timeout = pause_timeout
+        self.condition = threading.Condition()
+        self.subscriptions = {}  # terminal_id -> 推送状态
+        self.closed_counters = dict.fromkeys(COUNTER_FIELDS, 0)  # 已取消订阅的终端的累计值
+
+        thread = threading.Thread(target=self._flush_loop, name="terminal-flusher", daemon=True)
+        thread.start()
+
+    def attach(self, terminal_id, offset, end_offset):
+        """开始从 offset 推送终端输出，end_offset 为当前缓冲区末尾"""
+        with self.condition:
+            previous = self.subscriptions.pop(terminal_id, None)
+            if previous:
+                self._close(terminal_id, previous)
+            self.subscriptions[terminal_id] = {
+                'sent_offset': offset,
+                'acked_offset': offset,
+                'end_offset': max(offset, end_offset or 0),
+                'last_emit': 0,
+                'paused_at': None,
+                'lagging': False,
+                'counters': dict.fromkeys(COUNTER_FIELDS, 0)
+            }
+            self.condition.notify()
+
+    def detach(self, terminal_id):
+        with self.condition:
+            subscription = self.subscriptions.pop(terminal_id, None)
+            if subscription:
+                self._close(terminal_id, subscription)
+
+    def _close(self, terminal_id, subscription):
+        if subscription['paused_at']:
+            self.resume_output(terminal_id)
+        for field in COUNTER_FIELDS:
+            self.closed_counters[field] += subscription['counters'][field]
+
+    def notify(self, terminal_id, chunk, end_offset):
+        """终端输出监听器：在多路复用器线程中调用"""
+        with self.condition:
+            subscription = self.subscriptions.get(terminal_id)
+            if not subscription:
+                return
+            subscription['counters']['bytes_in'] += len(chunk)
+            subscription['end_offset'] = end_offset
+            if (not subscription['paused_at'] and not subscription['lagging']
+                    and end_offset - subscription['acked_offset'] >= self.backlog_limit):
+                if self.pause_output(terminal_id):
+                    subscription['paused_at'] = time.time()
+                    subscription['counters']['pauses'] += 1
+            self.condition.notify()
+
+    def ack(self, terminal_id, offset):
+        """客户端确认已处理到 offset"""
+        with self.condition:
+            subscription = self.subscriptions.get(terminal_id)
+            if not subscription:
+                return
+            subscription['acked_offset'] = max(subscription['acked_offset'], min(offset, subscription['sent_offset']))
+            subscription['lagging'] = False
+            if (subscription['paused_at']
+                    and subscription['end_offset'] - subscription['acked_offset'] < self.backlog_limit):
+                self.resume_output(terminal_id)
+                subscription['paused_at'] = None
+            self.condition.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self.condition:
+                frames, wake_at = self._collect_frames(time.time())
+                if not frames:
+                    timeout = None if wake_at is None else max(0.001, wake_at - time.time())
+                    self.condition.wait(timeout)
+                    continue
+
+            for terminal_id, data, end_offset in frames:
+                try:
+                    self.emit_frame(terminal_id, data, end_offset)
+                except Exception as e:
+                    print(f"终端输出推送错误: {e}")
+
+    def _collect_frames(self, now):
+        """生成当前可以发送的帧，并返回下次需要检查的时间（需持有锁）"""
+        frames = []
+        wake_times = []
+        for terminal_id, subscription in self.subscriptions.items():
+            if subscription['paused_at']:
+                if now - subscription['paused_at'] >= self.pause_timeout:
+                    # 客户端长时间不确认，不再阻塞程序，改为丢弃积压输出
+                    self.resume_output(terminal_id)
+                    subscription['paused_at'] = None
+                    subscription['lagging'] = True
+                else:
+                    wake_times.append(subscription['paused_at'] + self.pause_timeout)
+
+            if subscription['end_offset'] <= subscription['sent_offset']:
+                continue
+            if (not subscription['lagging']
+                    and subscription['sent_offset'] - subscription['acked_offset'] >= self.ack_window):
+                continue  # 等待客户端确认
+            due = subscription['last_emit'] + self.frame_interval
+            if now < due:
+                wake_times.append(due)
+                continue
+
+            frame = self._build_frame(terminal_id, subscription)
+            if frame is None:
+                continue
+            subscription['last_emit'] = now
+            frames.append(frame)
+            if subscription['end_offset'] > subscription['sent_offset']:
+                wake_times.append(now + self.frame_interval)
+
+        return frames, min(wake_times) if wake_times else None
+
+    def _build_frame(self, terminal_id, subscription):
+        counters = subscription['counters']
+        start = subscription['sent_offset']
+        if subscription['lagging'] and subscription['end_offset'] - start > self.backlog_limit:
+            start = subscription['end_offset'] - self.frame_bytes
+
+        result = self.read_output(terminal_id, start, self.frame_bytes)
+        if result is None:
+            subscription['end_offset'] = subscription['sent_offset']  # 会话已关闭
+            return None
+        data, next_offset, missed = result
+
+        prefix = b""
+        dropped = start - subscription['sent_offset'] + missed
+        if dropped > 0:
+            skip = utf8_continuation_length(data)
+            data = data[skip:]
+            dropped += skip
+            counters['bytes_dropped'] += dropped
+            counters['frames_dropped'] += 1
+            prefix = f"\r\n[已省略 {dropped} 字节输出]\r\n".encode('utf-8')
+
+        subscription['sent_offset'] = next_offset
+        subscription['end_offset'] = max(subscription['end_offset'], next_offset)
+        counters['bytes_emitted'] += len(data)
+        counters['frames_emitted'] += 1
+        # 按原始字节推送，多字节字符可能跨帧，由客户端流式解码
+        return terminal_id, prefix + data if prefix else data, next_offset
+
+    def get_stats(self, terminal_id=None):
+        with self.condition:
+            if terminal_id is not None:
+                subscription = self.subscriptions.get(terminal_id)
+                if not subscription:
+                    return None
+                return dict(
+                    subscription['counters'],
+                    sent_offset=subscription['sent_offset'],
+                    acked_offset=subscription['acked_offset'],
+                    end_offset=subscription['end_offset'],
+                    paused=subscription['paused_at'] is not None,
+                    lagging=subscription['lagging']
+                )
+
+            totals = dict(self.closed_counters)
+            for subscription in self.subscriptions.values():
+                for field in COUNTER_FIELDS:
+                    totals[field] += subscription['counters'][field]
+            totals.update(
+                subscriptions=len(self.subscriptions),
+                paused=sum(1 for s in self.subscriptions.values() if s['paused_at']),
+                lagging=sum(1 for s in self.subscriptions.values() if s['lagging'])
+            )
+            return totals
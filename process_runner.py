@@ -0,0 +1,179 @@
+import os
+import time
+import codecs
+import signal
+import selectors
+import subprocess
+
+READ_CHUNK_SIZE = 8192
+RSS_SAMPLE_INTERVAL = 0.1  # 采样子进程峰值内存的间隔（秒）
+
+def with_limits(args, memory_mb=None, cpu_seconds=None):
+    """用 sh 的 ulimit 设置限制后 exec 目标程序（与 SandboxPool 相同）
+
+    不使用 preexec_fn：本进程有多个线程，fork 后在子进程中执行 Python 代码并不安全。
+    """
+    limits = ""
+    if memory_mb is not None:
+        limits += f"ulimit -v {int(memory_mb) * 1024}; "
+    if cpu_seconds is not None:
+        # 软限制触发 SIGXCPU，硬限制多留一秒再 SIGKILL
+        limits += f"ulimit -S -t {int(cpu_seconds)}; ulimit -H -t {int(cpu_seconds) + 1}; "
+    if not limits:
+        return list(args)
+    return ["sh", "-c", limits + 'exec "$@"', "sh"] + list(args)
+
+def read_peak_rss_kb(pid):
+    """进程自身（exec 之后）的峰值常驻内存 VmHWM，进程已退出时返回 None"""
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def run_process(args, cwd=None, env=None, input_data="", timeout=None, on_output=None,
+                memory_mb=None, cpu_seconds=None):
+    """运行子进程，边读边分发 stdout/stderr
+
+    on_output(stream, text) 在每读到一块输出时调用（stream 为 'stdout' 或 'stderr'）。
+    提供 on_output 时不再在内存中累积输出，返回结果中的 stdout/stderr 为空字符串。
+    memory_mb / cpu_seconds 为子进程的地址空间和 CPU 时间限制；结果中的 usage 为
+    子进程（含已回收的子孙进程）的 CPU 时间。max_rss_kb 是运行期间每 RSS_SAMPLE_INTERVAL
+    秒采样的子进程 VmHWM，只包含子进程本身（不含其子孙进程），退出前最后一次采样之后的
+    增长不计入；进程过早退出没有采样时为 None。
+    """
+    start_time = time.time()
+    process = subprocess.Popen(
+        with_limits(args, memory_mb, cpu_seconds),
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True  # 便于超时时结束整个进程组（cargo 会派生 rustc）
+    )
+
+    streams = {process.stdout.fileno(): 'stdout', process.stderr.fileno(): 'stderr'}
+    decoders = {name: codecs.getincrementaldecoder('utf-8')(errors='replace') for name in streams.values()}
+    captured = {name: [] for name in streams.values()}
+
+    def dispatch(name, text):
+        if not text:
+            return
+        if on_output:
+            on_output(name, text)
+        else:
+            captured[name].append(text)
+
+    selector = selectors.DefaultSelector()
+    for fd in streams:
+        selector.register(fd, selectors.EVENT_READ)
+
+    pending_input = input_data.encode('utf-8') if input_data else b""
+    stdin_fd = process.stdin.fileno()
+    if pending_input:
+        os.set_blocking(stdin_fd, False)
+        selector.register(stdin_fd, selectors.EVENT_WRITE)
+    else:
+        process.stdin.close()
+
+    deadline = start_time + timeout if timeout else None
+    timed_out = False
+    reaped = None  # wait4 的 (status, rusage)
+    output_bytes = 0
+    peak_rss_kb = read_peak_rss_kb(process.pid)
+
+    def sample_rss():
+        nonlocal peak_rss_kb
+        rss_kb = read_peak_rss_kb(process.pid)
+        if rss_kb is not None and (peak_rss_kb is None or rss_kb > peak_rss_kb):
+            peak_rss_kb = rss_kb
+
+    try:
+        while selector.get_map():
+            remaining = RSS_SAMPLE_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                remaining = min(remaining, RSS_SAMPLE_INTERVAL)
+
+            events = selector.select(remaining)
+            sample_rss()
+
+            for key, _ in events:
+                fd = key.fd
+                if fd == stdin_fd:
+                    try:
+                        written = os.write(fd, pending_input[:READ_CHUNK_SIZE])
+                        pending_input = pending_input[written:]
+                    except BlockingIOError:
+                        continue
+                    except BrokenPipeError:
+                        pending_input = b""
+                    if not pending_input:
+                        selector.unregister(fd)
+                        process.stdin.close()
+                    continue
+
+                chunk = os.read(fd, READ_CHUNK_SIZE)
+                name = streams[fd]
+                if chunk:
+                    output_bytes += len(chunk)
+                    dispatch(name, decoders[name].decode(chunk))
+                else:
+                    selector.unregister(fd)
+                    dispatch(name, decoders[name].decode(b"", final=True))
+
+        # 输出结束后进程可能仍在运行（关闭或重定向了 stdout/stderr），轮询回收直到截止时间
+        delay = 0.001
+        while not timed_out:
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                reaped = (status, rusage)
+                break
+            if deadline is not None and time.time() >= deadline:
+                timed_out = True
+                break
+            sample_rss()
+            time.sleep(delay if deadline is None else max(0, min(delay, deadline - time.time())))
+            delay = min(delay * 2, RSS_SAMPLE_INTERVAL)
+    finally:
+        selector.close()
+        if reaped is None:
+            # 超时或读取过程中出错时结束整个进程组，之后的 wait4 不会阻塞
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        for pipe in (process.stdin, process.stdout, process.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        if reaped is None:
+            # 使用 wait4 回收子进程，同时取得其资源使用情况
+            _, status, rusage = os.wait4(process.pid, 0)
+            reaped = (status, rusage)
+        status, rusage = reaped
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+    wall_time = round(time.time() - start_time, 3)
+    return {
+        "exit_code": process.returncode,
+        "stdout": ''.join(captured['stdout']),
+        "stderr": ''.join(captured['stderr']),
+        "timed_out": timed_out,
+        "wall_time": wall_time,
+        "usage": {
+            "user_cpu": round(rusage.ru_utime, 3),
+            "sys_cpu": round(rusage.ru_stime, 3),
+            "max_rss_kb": peak_rss_kb,
+            "wall_time": wall_time,
+            "output_bytes": output_bytes
+        }
+    }
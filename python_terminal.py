@@ -1,14 +1,19 @@
 import os
-import subprocess
-import threading
+import codecs
+import struct
 import select
+import termios
 import fcntl
+import time
 import uuid
-import sys
+from config import Config
+from ring_buffer import RingBuffer, utf8_continuation_length
+from terminal_mux import terminal_mux
 
 class PythonTerminalManager:
     def __init__(self):
         self.sessions = {}
+        self.output_listener = None
     
     def create_session(self, workspace):
         try:
@@ -27,6 +32,8 @@ class PythonTerminalManager:
                 # 子进程
                 os.close(master)
                 os.setsid()
+                # 设为控制终端，Ctrl+C 等才会由终端驱动转换为发给前台进程组的信号
+                fcntl.ioctl(slave, termios.TIOCSCTTY, 0)
                 os.dup2(slave, 0)
                 os.dup2(slave, 1)
                 os.dup2(slave, 2)
@@ -49,15 +56,10 @@ class PythonTerminalManager:
                 os.close(slave)
                 
                 session_id = str(uuid.uuid4())
-                self.sessions[session_id] = {
-                    'master_fd': master,
-                    'child_pid': pid,
-                    'workspace': workspace,
-                    'buffer': ''
-                }
+                self.sessions[session_id] = self._new_session(workspace, master_fd=master, child_pid=pid)
                 
-                # 启动输出读取线程
-                self._start_output_reader(session_id)
+                # 由多路复用器读取输出
+                self._register_output(session_id)
                 
                 return session_id
                 
@@ -65,33 +67,39 @@ class PythonTerminalManager:
             print(f"创建终端会话失败: {e}")
             return None
     
-    def _start_output_reader(self, session_id):
-        """启动输出读取线程（用于 WebSocket）"""
-        def read_output():
-            session = self.sessions.get(session_id)
-            if not session:
-                return
-            
-            master_fd = session['master_fd']
-            buffer = session.get('buffer', '')
-            
-            while session_id in self.sessions and self.sessions[session_id].get('active', True):
-                try:
-                    rlist, _, _ = select.select([master_fd], [], [], 0.1)
-                    if master_fd in rlist:
-                        chunk = os.read(master_fd, 1024)
-                        if chunk:
-                            buffer += chunk.decode('utf-8', errors='ignore')
-                            # 这里可以添加 WebSocket 推送逻辑
-                            session['buffer'] = buffer
-                except (BlockingIOError, OSError):
-                    pass
-                except Exception as e:
-                    print(f"终端读取错误: {e}")
-                    break
-        
-        thread = threading.Thread(target=read_output, daemon=True)
-        thread.start()
+    def _new_session(self, workspace, **fields):
+        """会话的公共状态：回滚缓冲区保存原始字节，只在需要文本时按游标增量解码"""
+        return dict(
+            fields,
+            workspace=workspace,
+            scrollback=RingBuffer(Config.TERMINAL_SCROLLBACK_BYTES),
+            read_offset=0,  # execute_command / read_available_output 使用的游标
+            # 增量解码器保留跨读取边界的不完整多字节字符
+            read_decoder=codecs.getincrementaldecoder('utf-8')(errors='replace'),
+            active=True
+        )
+    
+    def set_output_listener(self, listener):
+        """设置输出监听器 listener(session_id, chunk, end_offset)
+
+        每读到一块输出并写入回滚缓冲区后调用，end_offset 为写入后的末尾偏移量。
+        chunk 是多路复用器读缓冲区的 memoryview，只在调用期间有效。
+        """
+        self.output_listener = listener
+
+    def _register_output(self, session_id, read_into=None):
+        """将会话的 master fd 注册到共享的多路复用器（不再为每个会话启动线程）"""
+        session = self.sessions[session_id]
+
+        def on_data(chunk):
+            end_offset = session['scrollback'].write(chunk)
+            if self.output_listener:
+                self.output_listener(session_id, chunk, end_offset)
+
+        def on_close():
+            session['active'] = False
+
+        terminal_mux.register(session['master_fd'], on_data, on_close, read_into)
     
     def execute_command(self, session_id, command):
         if session_id not in self.sessions:
@@ -101,56 +109,126 @@ class PythonTerminalManager:
         
         try:
             # 发送命令
-            full_command = command + '\n'
-            os.write(session['master_fd'], full_command.encode())
+            if not self.write_input(session_id, command + '\n'):
+                return {"status": "error", "message": "Terminal session closed"}
             
             # 读取输出
-            output = self._read_output(session['master_fd'])
+            output = self._read_output(session)
             
             return {"status": "success", "output": output}
             
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def _read_output(self, master_fd, timeout=1):
-        output = ""
-        
-        # 使用 select 等待数据
-        rlist, _, _ = select.select([master_fd], [], [], timeout)
-        
-        if master_fd in rlist:
-            try:
-                while True:
-                    chunk = os.read(master_fd, 1024)
-                    if not chunk:
-                        break
-                    output += chunk.decode('utf-8', errors='ignore')
-            except BlockingIOError:
-                # 没有更多数据可读
-                pass
-            except OSError:
-                # 可能终端已关闭
-                pass
-        
-        return output
+    def write_input(self, session_id, data):
+        """将原始输入写入 pty（按键、粘贴内容、Ctrl+C 等控制字符原样转发）
+
+        程序不读取输入、pty 输入缓冲区一直是满的时，最多等待 Config.TERMINAL_INPUT_TIMEOUT 秒，
+        之后丢弃剩余输入并返回 False，不阻塞调用方。
+        """
+        session = self.sessions.get(session_id)
+        if not session or not session['active']:
+            return False
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        master_fd = session['master_fd']
+        deadline = time.monotonic() + Config.TERMINAL_INPUT_TIMEOUT
+        try:
+            while data:
+                try:
+                    written = os.write(master_fd, data)
+                    data = data[written:]
+                except BlockingIOError:
+                    # pty 输入缓冲区已满，等待程序读取
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        print(f"终端输入超时，丢弃 {len(data)} 字节")
+                        return False
+                    select.select([], [master_fd], [], remaining)
+            return True
+        except OSError as e:
+            print(f"终端写入错误: {e}")
+            return False
+    
+    def resize(self, session_id, rows, cols):
+        """设置 pty 窗口大小，top 等全屏程序依赖它排版"""
+        session = self.sessions.get(session_id)
+        if not session:
+            return False
+        try:
+            fcntl.ioctl(session['master_fd'], termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+            return True
+        except OSError:
+            return False
+    
+    def _read_output(self, session, timeout=1, quiet_period=0.05):
+        """等待多路复用器写入回滚缓冲区：最多等待 timeout 秒出现输出，
+        之后输出停止 quiet_period 秒即返回"""
+        scrollback = session['scrollback']
+        if scrollback.wait(session['read_offset'], timeout):
+            offset = scrollback.end_offset
+            while session['active'] and scrollback.wait(offset, quiet_period):
+                offset = scrollback.end_offset
+        return self._consume(session)
+    
+    def _consume(self, session):
+        """从会话游标读取到末尾并前移游标"""
+        data, session['read_offset'], missed = session['scrollback'].read(session['read_offset'])
+        if missed:
+            session['read_decoder'].reset()
+            data = data[utf8_continuation_length(data):]
+        return session['read_decoder'].decode(data)
     
     def read_available_output(self, session_id):
         """读取可用的输出（非阻塞）"""
         if session_id not in self.sessions:
             return ""
         
-        session = self.sessions[session_id]
-        buffer = session.get('buffer', '')
-        session['buffer'] = ''  # 清空缓冲区
-        return buffer
+        return self._consume(self.sessions[session_id])
+    
+    def read_scrollback(self, session_id, offset=0, max_bytes=None):
+        """按绝对偏移量读取回滚缓冲区（不影响其他读取方的游标）
+
+        返回 (data, next_offset, missed)，会话不存在时返回 None。
+        """
+        session = self.sessions.get(session_id)
+        if not session:
+            return None
+        return session['scrollback'].read(offset, max_bytes)
+    
+    def get_output_offset(self, session_id):
+        """回滚缓冲区当前的末尾偏移量"""
+        session = self.sessions.get(session_id)
+        return session['scrollback'].end_offset if session else None
+    
+    def pause_output(self, session_id):
+        """暂停读取会话输出，程序写满 pty/管道后会阻塞（背压）"""
+        session = self.sessions.get(session_id)
+        return bool(session) and terminal_mux.pause(session['master_fd'])
+    
+    def resume_output(self, session_id):
+        session = self.sessions.get(session_id)
+        return bool(session) and terminal_mux.resume(session['master_fd'])
+    
+    def get_stats(self):
+        sessions = list(self.sessions.values())
+        stats = [session['scrollback'].get_stats() for session in sessions]
+        return {
+            'sessions': len(sessions),
+            'active': sum(1 for session in sessions if session['active']),
+            'scrollback_bytes': sum(item['size'] for item in stats),
+            'overflow_bytes': sum(item['overflow_bytes'] for item in stats)
+        }
     
     def close_session(self, session_id):
         if session_id in self.sessions:
             session = self.sessions[session_id]
             session['active'] = False
+            terminal_mux.unregister(session['master_fd'])
             try:
                 os.close(session['master_fd'])
                 os.kill(session['child_pid'], 9)
+                os.waitpid(session['child_pid'], 0)
             except:
                 pass
             del self.sessions[session_id]
@@ -170,5 +248,29 @@ def execute_terminal_command(session_id, command):
 def close_terminal_session(session_id):
     return terminal_manager.close_session(session_id)
 
+def write_terminal_input(session_id, data):
+    return terminal_manager.write_input(session_id, data)
+
+def resize_terminal(session_id, rows, cols):
+    return terminal_manager.resize(session_id, rows, cols)
+
 def read_terminal_output(session_id):
-    return terminal_manager.read_available_output(session_id)
\ No newline at end of file
+    return terminal_manager.read_available_output(session_id)
+
+def read_terminal_scrollback(session_id, offset=0, max_bytes=None):
+    return terminal_manager.read_scrollback(session_id, offset, max_bytes)
+
+def get_terminal_offset(session_id):
+    return terminal_manager.get_output_offset(session_id)
+
+def pause_terminal_output(session_id):
+    return terminal_manager.pause_output(session_id)
+
+def resume_terminal_output(session_id):
+    return terminal_manager.resume_output(session_id)
+
+def get_terminal_stats():
+    return terminal_manager.get_stats()
+
+def set_terminal_output_listener(listener):
+    terminal_manager.set_output_listener(listener)
\ No newline at end of file
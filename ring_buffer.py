@@ -0,0 +1,94 @@
+import threading
+
+def utf8_continuation_length(data):
+    """data 开头的 UTF-8 后续字节数（最多 3 个）
+
+    游标被覆盖后从保留范围的起点读取时，起点可能落在多字节字符中间，
+    跳过这些字节可以避免解码出替换字符。
+    """
+    skip = 0
+    while skip < min(3, len(data)) and 0x80 <= data[skip] <= 0xBF:
+        skip += 1
+    return skip
+
+class RingBuffer:
+    """固定容量的字节环形缓冲区
+
+    写入位置用绝对偏移量表示（自创建以来写入的总字节数），缓冲区只保留最后 capacity 字节。
+    读取方各自保存偏移量（游标），多个读取方互不影响；游标落后于保留范围时
+    返回实际丢失的字节数。写满后覆盖最旧的数据，内存占用恒定。
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.data = bytearray(self.capacity)
+        self.end_offset = 0
+        self.condition = threading.Condition()
+        self.overruns = 0  # 读取时游标已被覆盖的次数
+
+    @property
+    def start_offset(self):
+        """仍保留在缓冲区中的最早字节的偏移量"""
+        return max(0, self.end_offset - self.capacity)
+
+    def write(self, chunk):
+        if not chunk:
+            return self.end_offset
+        with self.condition:
+            length = len(chunk)
+            if length >= self.capacity:
+                # 只有最后 capacity 字节会保留下来
+                position = (self.end_offset + length - self.capacity) % self.capacity
+                tail = memoryview(chunk)[length - self.capacity:]
+                first = self.capacity - position
+                self.data[position:] = tail[:first]
+                self.data[:position] = tail[first:]
+            else:
+                position = self.end_offset % self.capacity
+                first = min(length, self.capacity - position)
+                self.data[position:position + first] = chunk[:first]
+                if first < length:
+                    self.data[:length - first] = chunk[first:]
+            self.end_offset += length
+            self.condition.notify_all()
+            return self.end_offset
+
+    def read(self, offset, max_bytes=None):
+        """从绝对偏移量 offset 开始读取
+
+        返回 (data, next_offset, missed)，missed 为 offset 之后已被覆盖、无法再读到的字节数。
+        """
+        with self.condition:
+            start = self.start_offset
+            missed = 0
+            if offset < start:
+                missed = start - offset
+                offset = start
+                self.overruns += 1
+            offset = min(offset, self.end_offset)
+
+            length = self.end_offset - offset
+            if max_bytes is not None:
+                length = min(length, max_bytes)
+            position = offset % self.capacity
+            first = min(length, self.capacity - position)
+            data = bytes(self.data[position:position + first])
+            if first < length:
+                data += bytes(self.data[:length - first])
+            return data, offset + length, missed
+
+    def wait(self, offset, timeout):
+        """等待 offset 之后出现新数据，返回是否有新数据"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.end_offset > offset, timeout)
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'capacity': self.capacity,
+                'size': self.end_offset - self.start_offset,
+                'start_offset': self.start_offset,
+                'end_offset': self.end_offset,
+                'overflow_bytes': self.start_offset,
+                'overruns': self.overruns
+            }
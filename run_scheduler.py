@@ -0,0 +1,151 @@
+import math
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+
+class RunScheduler:
+    """编译/运行任务调度器：限制并发数，使用有界队列，并在用户之间轮转"""
+
+    def __init__(self, max_workers, max_queue, max_queued_per_user, default_duration, result_ttl=300):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.result_ttl = result_ttl
+        self.condition = threading.Condition()
+        self.queues = OrderedDict()  # user_id -> deque(job)，顺序即轮转顺序
+        self.running_users = set()  # 同一用户同时只运行一个任务，避免互相覆盖工作区
+        self.jobs = {}
+        self.queued_count = 0
+        self.avg_duration = float(default_duration)
+        self.counters = {'submitted': 0, 'completed': 0, 'rejected': 0}
+
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"run-worker-{i}", daemon=True)
+            thread.start()
+
+    def submit(self, user_id, func):
+        """提交任务，队列已满时返回 None"""
+        user_key = str(user_id)
+        with self.condition:
+            self._purge_finished()
+            user_queue = self.queues.get(user_key)
+            if self.queued_count >= self.max_queue or (user_queue and len(user_queue) >= self.max_queued_per_user):
+                self.counters['rejected'] += 1
+                return None
+
+            job = {
+                'id': str(uuid.uuid4()),
+                'user_id': user_key,
+                'func': func,
+                'state': 'queued',
+                'result': None,
+                'submitted_at': time.time(),
+                'started_at': None,
+                'finished_at': None
+            }
+            self.jobs[job['id']] = job
+            self.queues.setdefault(user_key, deque()).append(job)
+            self.queued_count += 1
+            self.counters['submitted'] += 1
+            self.condition.notify()
+            return self._snapshot(job)
+
+    def get_job(self, job_id):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def _snapshot(self, job):
+        """生成任务状态（需持有锁）"""
+        info = {
+            'job_id': job['id'],
+            'user_id': job['user_id'],
+            'state': job['state'],
+            'result': job['result']
+        }
+        if job['state'] == 'queued':
+            position = self._queue_position(job)
+            # 空闲 worker 可以立即接手前面的任务，其余按批次估算
+            free_workers = self.max_workers - len(self.running_users)
+            batches = math.ceil(max(0, position - free_workers) / self.max_workers)
+            info['queue_position'] = position
+            info['estimated_wait'] = round(batches * self.avg_duration, 1)
+        return info
+
+    def _queue_position(self, job):
+        """按轮转顺序模拟出队，计算任务前方（含自身）的任务数"""
+        position = 0
+        depth = 0
+        while True:
+            found_any = False
+            for user_queue in self.queues.values():
+                if depth < len(user_queue):
+                    found_any = True
+                    position += 1
+                    if user_queue[depth] is job:
+                        return position
+            if not found_any:
+                return position
+            depth += 1
+
+    def _next_job(self):
+        """按轮转顺序取出下一个可运行的任务（需持有锁）"""
+        for user_key, user_queue in self.queues.items():
+            if user_key in self.running_users:
+                continue
+            job = user_queue.popleft()
+            if user_queue:
+                self.queues.move_to_end(user_key)
+            else:
+                del self.queues[user_key]
+            self.queued_count -= 1
+            return job
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self.condition:
+                job = self._next_job()
+                while job is None:
+                    self.condition.wait()
+                    job = self._next_job()
+                job['state'] = 'running'
+                job['started_at'] = time.time()
+                self.running_users.add(job['user_id'])
+
+            try:
+                result = job['func']()
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+
+            with self.condition:
+                job['result'] = result
+                job['state'] = 'done'
+                job['func'] = None
+                job['finished_at'] = time.time()
+                self.running_users.discard(job['user_id'])
+                self.counters['completed'] += 1
+                # 指数滑动平均估算单个任务耗时
+                duration = job['finished_at'] - job['started_at']
+                self.avg_duration = self.avg_duration * 0.8 + duration * 0.2
+                self.condition.notify_all()
+
+    def _purge_finished(self):
+        """清理超过保留时间的已完成任务（需持有锁）"""
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job['state'] == 'done' and now - job['finished_at'] > self.result_ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def get_stats(self):
+        with self.condition:
+            return dict(
+                self.counters,
+                workers=self.max_workers,
+                running=len(self.running_users),
+                queued=self.queued_count,
+                max_queue=self.max_queue,
+                avg_duration=round(self.avg_duration, 3)
+            )
@@ -0,0 +1,315 @@
+import os
+import re
+import time
+import uuid
+import shlex
+import signal
+import selectors
+import subprocess
+import threading
+
+READ_CHUNK_SIZE = 8192
+
+class SandboxWorker:
+    """常驻的沙箱 shell 进程，通过 stdin 接收命令，用哨兵行分隔每条命令的输出"""
+
+    def __init__(self, env_id, spawn_command):
+        self.env_id = env_id
+        self.process = subprocess.Popen(
+            spawn_command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+        self.last_used = time.time()
+        self.uses = 0
+        self.children_cpu = (0.0, 0.0)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def handshake(self, timeout):
+        """等待 shell 就绪，并丢弃登录脚本等产生的输出"""
+        token = uuid.uuid4().hex
+        result = self._communicate(f"true\n{self._trailer(token)}", token, timeout)
+        if result is None:
+            return False
+        self.children_cpu = result[3]
+        return True
+
+    def run(self, command, cwd, input_data, timeout, memory_mb=None, cpu_seconds=None):
+        """在常驻 shell 的子 shell 中执行命令
+
+        返回 (stdout, stderr, exit_code, usage)，超时或 shell 异常退出时返回 None。
+        """
+        token = uuid.uuid4().hex
+        if input_data:
+            stdin_part = f"<<'__INPUT_{token}'\n{input_data}\n__INPUT_{token}"
+        else:
+            stdin_part = "</dev/null"
+        limits = ""
+        if memory_mb is not None:
+            limits += f"ulimit -v {int(memory_mb) * 1024}; "
+        if cpu_seconds is not None:
+            limits += f"ulimit -t {int(cpu_seconds)}; "
+        # 命令在子 shell 中执行，cd/exit/ulimit 等不会影响常驻 shell；命令整体转义后交给 eval，
+        # 未闭合的引号只是该命令的语法错误，其中的 ) 也无法提前结束子 shell
+        script = (f"( {limits}cd {shlex.quote(cwd)} && eval {shlex.quote(command)} ) {stdin_part}\n"
+                  f"{self._trailer(token)}")
+
+        start_time = time.time()
+        result = self._communicate(script, token, timeout)
+        if result is None:
+            return None
+
+        stdout, stderr, exit_code, children_cpu = result
+        # times 输出的是常驻 shell 所有已结束子进程的累计 CPU 时间，取差值
+        usage = {
+            "user_cpu": round(max(0.0, children_cpu[0] - self.children_cpu[0]), 3),
+            "sys_cpu": round(max(0.0, children_cpu[1] - self.children_cpu[1]), 3),
+            "max_rss_kb": None,  # 命令不是本进程的直接子进程，无法取得峰值内存
+            "wall_time": round(time.time() - start_time, 3),
+            "output_bytes": len(stdout.encode('utf-8')) + len(stderr.encode('utf-8'))
+        }
+        self.children_cpu = children_cpu
+        return stdout, stderr, exit_code, usage
+
+    def _trailer(self, token):
+        """命令结束后输出的哨兵
+
+        stdout: "\n<token> <退出码>\n<times 输出两行><token>\n"，stderr: "\n<token>\n"。
+        times 必须由常驻 shell 自身执行（放进管道或命令替换会在子进程中执行，结果为 0）。
+        """
+        return (
+            f"__rc=$?; printf '\\n%s %d\\n' '{token}' \"$__rc\"; times; printf '%s\\n' '{token}'; "
+            f"printf '\\n%s\\n' '{token}' >&2\n"
+        )
+
+    def _communicate(self, script, token, timeout):
+        try:
+            self.process.stdin.write(script.encode('utf-8'))
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return None
+
+        token_bytes = token.encode('ascii')
+        stdout_fd = self.process.stdout.fileno()
+        stderr_fd = self.process.stderr.fileno()
+        buffers = {stdout_fd: bytearray(), stderr_fd: bytearray()}
+        required_tokens = {stdout_fd: 2, stderr_fd: 1}
+        deadline = time.time() + timeout
+
+        with selectors.DefaultSelector() as selector:
+            for fd in buffers:
+                selector.register(fd, selectors.EVENT_READ)
+            while selector.get_map():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                for key, _ in selector.select(remaining):
+                    chunk = os.read(key.fd, READ_CHUNK_SIZE)
+                    if not chunk:
+                        return None  # shell 已退出
+                    buffer = buffers[key.fd]
+                    buffer.extend(chunk)
+                    if buffer.endswith(token_bytes + b"\n") and buffer.count(token_bytes) >= required_tokens[key.fd]:
+                        selector.unregister(key.fd)
+
+        stdout_buffer = buffers[stdout_fd]
+        stderr_buffer = buffers[stderr_fd]
+        # 哨兵行首的换行由协议添加，不属于命令输出
+        stdout_index = stdout_buffer.find(b"\n" + token_bytes)
+        stderr_index = stderr_buffer.find(b"\n" + token_bytes)
+        trailer = stdout_buffer[stdout_index + 1:].decode('ascii', errors='replace').splitlines()
+
+        try:
+            exit_code = int(trailer[0].split()[1])
+        except (IndexError, ValueError):
+            exit_code = -1
+
+        # times 第二行为子进程的累计用户态/内核态时间，如 "0m0.010s 0m0.005s"
+        children_cpu = (0.0, 0.0)
+        if len(trailer) >= 3:
+            values = [int(m) * 60 + float(sec) for m, sec in re.findall(r'(\d+)m([\d.]+)s', trailer[2])]
+            if len(values) >= 2:
+                children_cpu = (values[0], values[1])
+
+        return (
+            stdout_buffer[:stdout_index].decode('utf-8', errors='replace'),
+            stderr_buffer[:stderr_index].decode('utf-8', errors='replace'),
+            exit_code,
+            children_cpu
+        )
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        for pipe in (self.process.stdin, self.process.stdout, self.process.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        self.process.wait()
+
+
+class SandboxPool:
+    """按环境维护预先进入沙箱的 shell 进程池"""
+
+    def __init__(self, max_per_env, idle_timeout, spawn_timeout=30):
+        self.max_per_env = max(1, max_per_env)
+        self.idle_timeout = idle_timeout
+        self.spawn_timeout = spawn_timeout
+        self.condition = threading.Condition()
+        self.idle = {}  # env_id -> [SandboxWorker]
+        self.live_counts = {}  # env_id -> 存活的 worker 数（含正在执行的）
+        self.closed = set()  # 已关闭的环境，执行中的 worker 归还时直接结束
+        self.counters = {'spawned': 0, 'reused': 0, 'reaped': 0, 'discarded': 0}
+
+        thread = threading.Thread(target=self._reap_loop, name="sandbox-reaper", daemon=True)
+        thread.start()
+
+    def prewarm(self, env_id, spawn_command, count=1):
+        """预先启动 worker，首条命令不再承担沙箱启动开销"""
+        for _ in range(count):
+            with self.condition:
+                if self.live_counts.get(env_id, 0) >= self.max_per_env:
+                    return
+                self.live_counts[env_id] = self.live_counts.get(env_id, 0) + 1
+            worker = self._spawn(env_id, spawn_command)
+            if worker:
+                self._release(worker)
+
+    def execute(self, env_id, spawn_command, command, cwd, input_data="", timeout=30,
+                memory_mb=None, cpu_seconds=None):
+        start_time = time.time()
+        worker = self._acquire(env_id, spawn_command, timeout)
+        if worker is None:
+            return {"status": "error", "message": "Sandbox unavailable"}
+
+        remaining = max(0.1, timeout - (time.time() - start_time))
+        result = worker.run(command, cwd, input_data, remaining, memory_mb, cpu_seconds)
+        if result is None:
+            # 超时或 shell 异常退出，状态不可信，直接丢弃
+            self._discard(worker)
+            return {"status": "timeout", "message": "Execution timeout"}
+
+        worker.uses += 1
+        self._release(worker)
+        stdout, stderr, exit_code, usage = result
+        return {
+            "status": "success",
+            "output": stdout,
+            "error": stderr,
+            "exit_code": exit_code,
+            "usage": usage
+        }
+
+    def _acquire(self, env_id, spawn_command, timeout):
+        deadline = time.time() + timeout
+        with self.condition:
+            self.closed.discard(env_id)
+            while True:
+                idle_workers = self.idle.get(env_id)
+                while idle_workers:
+                    worker = idle_workers.pop()
+                    if worker.is_alive():
+                        self.counters['reused'] += 1
+                        return worker
+                    self._forget(worker)
+                if self.live_counts.get(env_id, 0) < self.max_per_env:
+                    self.live_counts[env_id] = self.live_counts.get(env_id, 0) + 1
+                    break
+                # 已达到该环境的上限，等待其他命令归还 worker
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+        return self._spawn(env_id, spawn_command)
+
+    def _spawn(self, env_id, spawn_command):
+        """启动新 worker（调用前已占用名额，失败时归还）"""
+        try:
+            worker = SandboxWorker(env_id, spawn_command)
+            if worker.handshake(self.spawn_timeout):
+                with self.condition:
+                    self.counters['spawned'] += 1
+                return worker
+            worker.kill()
+        except Exception as e:
+            print(f"启动沙箱进程失败: {e}")
+
+        with self.condition:
+            self.live_counts[env_id] -= 1
+            self.condition.notify()
+        return None
+
+    def _release(self, worker):
+        worker.last_used = time.time()
+        with self.condition:
+            if worker.env_id not in self.closed:
+                self.idle.setdefault(worker.env_id, []).append(worker)
+                self.condition.notify()
+                return
+        self._discard(worker)
+
+    def _discard(self, worker):
+        worker.kill()
+        with self.condition:
+            self.counters['discarded'] += 1
+            self._forget(worker)
+
+    def _forget(self, worker):
+        """移除 worker 的名额计数（需持有锁）"""
+        self.live_counts[worker.env_id] -= 1
+        if self.live_counts[worker.env_id] <= 0:
+            del self.live_counts[worker.env_id]
+        self.condition.notify()
+
+    def close_environment(self, env_id):
+        """结束环境的所有 worker（环境被删除时调用），正在执行命令的 worker 在命令结束后结束"""
+        with self.condition:
+            if env_id in self.live_counts:
+                self.closed.add(env_id)
+            workers = self.idle.pop(env_id, [])
+            for worker in workers:
+                self._forget(worker)
+        for worker in workers:
+            worker.kill()
+
+    def _reap_loop(self):
+        """定期结束空闲超时的 worker"""
+        interval = max(1, self.idle_timeout / 2)
+        while True:
+            time.sleep(interval)
+            expired = []
+            now = time.time()
+            with self.condition:
+                for env_id, workers in list(self.idle.items()):
+                    keep = []
+                    for worker in workers:
+                        if now - worker.last_used > self.idle_timeout or not worker.is_alive():
+                            expired.append(worker)
+                            self._forget(worker)
+                        else:
+                            keep.append(worker)
+                    if keep:
+                        self.idle[env_id] = keep
+                    else:
+                        del self.idle[env_id]
+                self.counters['reaped'] += len(expired)
+            for worker in expired:
+                worker.kill()
+
+    def get_stats(self):
+        with self.condition:
+            return dict(
+                self.counters,
+                live=sum(self.live_counts.values()),
+                idle=sum(len(workers) for workers in self.idle.values()),
+                environments=len(self.live_counts),
+                max_per_env=self.max_per_env
+            )
@@ -0,0 +1,144 @@
+"""ByUsi 用户 API 本地模拟服务
+
+实现 api.php 的 register / login / get_user 三个操作（用户数据只保存在内存中），
+用于离线开发、测试和性能测试。用法:
+
+    python3 scripts/byusi_stub.py [--port 8765] [--latency-ms 0] [--fail-rate 0]
+    BYUSI_BASE_URL=http://127.0.0.1:8765/ python3 app.py
+
+--latency-ms 模拟上游延迟，--fail-rate 按比例返回 503，用于验证重试和熔断。
+"""
+import sys
+import json
+import time
+import random
+import secrets
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class StubState:
+    """模拟服务的用户数据"""
+
+    def __init__(self, latency=0, fail_rate=0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.users = {}  # username -> 用户
+        self.tokens = {}  # token -> username
+        self.requests = 0
+        self.connections = 0
+
+    def handle(self, params):
+        action = params.get('action')
+        with self.lock:
+            if action == 'register':
+                return self._register(params)
+            if action == 'login':
+                return self._login(params)
+            if action == 'get_user':
+                username = self.tokens.get(params.get('token'))
+                if not username:
+                    return {"status": "error", "message": "Invalid token"}
+                return {"status": "success", "data": self._public(self.users[username])}
+        return {"status": "error", "message": "Unknown action"}
+
+    def _register(self, params):
+        username = params.get('username')
+        if not username or not params.get('password'):
+            return {"status": "error", "message": "Missing username or password"}
+        if username in self.users:
+            return {"status": "error", "message": "User already exists"}
+        self.users[username] = {
+            'id': len(self.users) + 1,
+            'username': username,
+            'email': params.get('email', ''),
+            'password': params['password']
+        }
+        return {"status": "success", "message": "Registration successful"}
+
+    def _login(self, params):
+        identifier = params.get('identifier')
+        user = self.users.get(identifier) or next(
+            (u for u in self.users.values() if u['email'] and u['email'] == identifier), None)
+        if not user or user['password'] != params.get('password'):
+            return {"status": "error", "message": "Invalid credentials"}
+        token = secrets.token_hex(16)
+        self.tokens[token] = user['username']
+        return {"status": "success", "data": dict(self._public(user), token=token)}
+
+    def _public(self, user):
+        return {'id': user['id'], 'username': user['username'], 'email': user['email']}
+
+def make_handler(state):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+        disable_nagle_algorithm = True  # 响应头和响应体分开写入，避免 keep-alive 连接上的延迟确认等待
+
+        def setup(self):
+            super().setup()
+            with state.lock:
+                state.connections += 1
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode('utf-8')
+            params = {key: values[0] for key, values in parse_qs(body).items()}
+            with state.lock:
+                state.requests += 1
+            if state.latency:
+                time.sleep(state.latency)
+
+            if not self.path.endswith('api.php'):
+                status, result = 404, {"status": "error", "message": "Not found"}
+            elif random.random() < state.fail_rate:
+                status, result = 503, {"status": "error", "message": "Service unavailable"}
+            else:
+                status, result = 200, state.handle(params)
+
+            payload = json.dumps(result).encode('utf-8')
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # 客户端已超时断开
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+def start_stub_server(host='127.0.0.1', port=0, latency=0, fail_rate=0):
+    """在后台线程启动模拟服务，返回 (server, state)；server.server_address 为实际地址"""
+    state = StubState(latency, fail_rate)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="byusi-stub", daemon=True)
+    thread.start()
+    return server, state
+
+def main():
+    parser = argparse.ArgumentParser(description="ByUsi 用户 API 本地模拟服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0, help="每个请求的模拟延迟（毫秒）")
+    parser.add_argument('--fail-rate', type=float, default=0, help="返回 503 的比例（0-1）")
+    args = parser.parse_args()
+
+    server, state = start_stub_server(args.host, args.port, args.latency_ms / 1000, args.fail_rate)
+    host, port = server.server_address[:2]
+    print(f"ByUsi 模拟服务: http://{host}:{port}/api.php")
+    print(f"BYUSI_BASE_URL=http://{host}:{port}/")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"请求数: {state.requests}，连接数: {state.connections}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,17 @@
 import os
+import codecs
 import subprocess
 import threading
 import uuid
 import time
+from config import Config
+from ring_buffer import RingBuffer, utf8_continuation_length
+from terminal_mux import terminal_mux
 
 class SimpleTerminalManager:
     def __init__(self):
         self.sessions = {}
+        self.output_listener = None
     
     def create_session(self, workspace):
         try:
@@ -20,21 +25,27 @@ class SimpleTerminalManager:
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
+                bufsize=0
             )
+            os.set_blocking(process.stdout.fileno(), False)
             
             self.sessions[session_id] = {
                 'process': process,
                 'workspace': workspace,
-                'buffer': '',
+                'scrollback': RingBuffer(Config.TERMINAL_SCROLLBACK_BYTES),
+                'read_offset': 0,  # execute_command 使用的游标
+                'latest_offset': 0,  # get_latest_output 使用的游标
                 'active': True,
-                'last_output': ''
+                'lock': threading.Lock(),
+                # 每个游标一个增量解码器，保留跨读取边界的不完整多字节字符
+                'decoders': {
+                    'read_offset': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+                    'latest_offset': codecs.getincrementaldecoder('utf-8')(errors='replace')
+                }
             }
             
-            # 启动输出读取线程
-            self._start_output_reader(session_id)
+            # 由多路复用器读取输出
+            self._register_output(session_id)
             
             return session_id
             
@@ -42,27 +53,27 @@ class SimpleTerminalManager:
             print(f"创建终端会话失败: {e}")
             return None
     
-    def _start_output_reader(self, session_id):
-        """启动输出读取线程"""
-        def read_output():
-            session = self.sessions.get(session_id)
-            if not session:
-                return
-            
-            process = session['process']
-            
-            while session['active'] and process.poll() is None:
-                try:
-                    # 非阻塞读取输出
-                    output = process.stdout.readline()
-                    if output:
-                        session['buffer'] += output
-                        session['last_output'] = output
-                except:
-                    break
-        
-        thread = threading.Thread(target=read_output, daemon=True)
-        thread.start()
+    def set_output_listener(self, listener):
+        """设置输出监听器 listener(session_id, chunk, end_offset)
+
+        每读到一块输出并写入回滚缓冲区后调用，end_offset 为写入后的末尾偏移量。
+        chunk 是多路复用器读缓冲区的 memoryview，只在调用期间有效。
+        """
+        self.output_listener = listener
+
+    def _register_output(self, session_id):
+        """将会话的 stdout 注册到共享的多路复用器（不再为每个会话启动线程）"""
+        session = self.sessions[session_id]
+
+        def on_data(chunk):
+            end_offset = session['scrollback'].write(chunk)
+            if self.output_listener:
+                self.output_listener(session_id, chunk, end_offset)
+
+        def on_close():
+            session['active'] = False
+
+        terminal_mux.register(session['process'].stdout.fileno(), on_data, on_close)
     
     def execute_command(self, session_id, command):
         if session_id not in self.sessions:
@@ -74,38 +85,104 @@ class SimpleTerminalManager:
             process = session['process']
             
             # 发送命令
-            process.stdin.write(command + '\n')
-            process.stdin.flush()
+            self._write_all(process, (command + '\n').encode('utf-8'))
             
             # 等待一段时间获取输出
             time.sleep(0.5)
             
-            # 读取缓冲的输出
-            output = session.get('buffer', '')
-            session['buffer'] = ''  # 清空缓冲区
+            # 读取游标之后的输出
+            output = self._consume(session, 'read_offset')
             
             return {"status": "success", "output": output}
             
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
+    def write_input(self, session_id, data):
+        """将原始输入写入 shell 的 stdin（没有 pty，控制字符不会转换为信号）"""
+        session = self.sessions.get(session_id)
+        if not session or not session['active']:
+            return False
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        try:
+            self._write_all(session['process'], data)
+            return True
+        except (BrokenPipeError, OSError) as e:
+            print(f"终端写入错误: {e}")
+            return False
+    
+    def _write_all(self, process, data):
+        """stdin 没有缓冲（bufsize=0），一次 write 可能只写入一部分，循环直到全部写入"""
+        data = memoryview(data)
+        while data:
+            written = process.stdin.write(data)
+            data = data[written:]
+    
+    def resize(self, session_id, rows, cols):
+        """管道模式没有窗口大小"""
+        return False
+    
     def get_latest_output(self, session_id):
         """获取最新的输出（用于WebSocket实时推送）"""
         if session_id not in self.sessions:
             return ""
         
-        session = self.sessions[session_id]
-        output = session.get('last_output', '')
-        session['last_output'] = ''  # 清空最新输出
-        
-        return output
+        return self._consume(self.sessions[session_id], 'latest_offset')
+    
+    def _consume(self, session, cursor):
+        """从会话的指定游标读取到末尾并前移游标"""
+        with session['lock']:
+            data, session[cursor], missed = session['scrollback'].read(session[cursor])
+            decoder = session['decoders'][cursor]
+            if missed:
+                decoder.reset()
+                data = data[utf8_continuation_length(data):]
+            return decoder.decode(data)
+    
+    def read_scrollback(self, session_id, offset=0, max_bytes=None):
+        """按绝对偏移量读取回滚缓冲区（不影响其他读取方的游标）
+
+        返回 (data, next_offset, missed)，会话不存在时返回 None。
+        """
+        session = self.sessions.get(session_id)
+        if not session:
+            return None
+        return session['scrollback'].read(offset, max_bytes)
+    
+    def get_output_offset(self, session_id):
+        """回滚缓冲区当前的末尾偏移量"""
+        session = self.sessions.get(session_id)
+        return session['scrollback'].end_offset if session else None
+    
+    def pause_output(self, session_id):
+        """暂停读取会话输出，程序写满 pty/管道后会阻塞（背压）"""
+        session = self.sessions.get(session_id)
+        return bool(session) and terminal_mux.pause(session['process'].stdout.fileno())
+    
+    def resume_output(self, session_id):
+        session = self.sessions.get(session_id)
+        return bool(session) and terminal_mux.resume(session['process'].stdout.fileno())
+    
+    def get_stats(self):
+        sessions = list(self.sessions.values())
+        stats = [session['scrollback'].get_stats() for session in sessions]
+        return {
+            'sessions': len(sessions),
+            'active': sum(1 for session in sessions if session['active']),
+            'scrollback_bytes': sum(item['size'] for item in stats),
+            'overflow_bytes': sum(item['overflow_bytes'] for item in stats)
+        }
     
     def close_session(self, session_id):
         if session_id in self.sessions:
             session = self.sessions[session_id]
             session['active'] = False
+            terminal_mux.unregister(session['process'].stdout.fileno())
             try:
                 session['process'].terminate()
+                session['process'].stdin.close()
+                session['process'].stdout.close()
             except:
                 pass
             del self.sessions[session_id]
@@ -125,5 +202,29 @@ def execute_terminal_command(session_id, command):
 def close_terminal_session(session_id):
     return terminal_manager.close_session(session_id)
 
+def write_terminal_input(session_id, data):
+    return terminal_manager.write_input(session_id, data)
+
+def resize_terminal(session_id, rows, cols):
+    return terminal_manager.resize(session_id, rows, cols)
+
 def get_terminal_output(session_id):
-    return terminal_manager.get_latest_output(session_id)
\ No newline at end of file
+    return terminal_manager.get_latest_output(session_id)
+
+def read_terminal_scrollback(session_id, offset=0, max_bytes=None):
+    return terminal_manager.read_scrollback(session_id, offset, max_bytes)
+
+def get_terminal_offset(session_id):
+    return terminal_manager.get_output_offset(session_id)
+
+def pause_terminal_output(session_id):
+    return terminal_manager.pause_output(session_id)
+
+def resume_terminal_output(session_id):
+    return terminal_manager.resume_output(session_id)
+
+def get_terminal_stats():
+    return terminal_manager.get_stats()
+
+def set_terminal_output_listener(listener):
+    terminal_manager.set_output_listener(listener)
\ No newline at end of file
@@ -7,6 +7,9 @@ let currentFile = null;
 let fileTreeData = null;
 let openTabs = [];
 let activeTab = null;
+// 已读取的文件内容：path -> { etag, content }，再次打开时服务器返回 304 则直接使用
+const fileCache = new Map();
+const FILE_CACHE_MAX_ENTRIES = 100;
 
 // 初始化
 document.addEventListener('DOMContentLoaded', function() {
@@ -60,19 +63,90 @@ function initSocketIO() {
     socket.on('connected', function(data) {
         console.log('WebSocket connected:', data);
         updateConnectionStatus('connected');
+        
+        // 重新连接之前的终端会话，从已收到的偏移量开始重放输出
+        if (currentTerminalId) {
+            terminalAttaching = true;
+            socket.emit('attach_terminal', { terminal_id: currentTerminalId, offset: terminalOffset });
+        }
+        
+        // 连接后服务器才开始监听已加载的目录，重新加载文件树（也补上断线期间的变更）
+        if (isAuthenticated) {
+            loadFileTree();
+        }
+    });
+    
+    // 工作区文件变更（包括终端中的操作）
+    socket.on('file_tree_delta', function(data) {
+        applyFileTreeDelta(data.events);
     });
     
     socket.on('terminal_output', function(data) {
-        const terminalContent = document.getElementById('terminal-content');
-        if (terminalContent) {
-            terminalContent.innerHTML += data.output;
-            terminalContent.scrollTop = terminalContent.scrollHeight;
+        if (data.data !== undefined) {
+            // 二进制帧：多字节字符可能跨帧，流式解码保留不完整的部分
+            writeTerminalOutput(terminalDecoder.decode(new Uint8Array(data.data), { stream: true }));
+        } else {
+            writeTerminalOutput(data.output);
+        }
+        // 确认已处理的输出，服务端据此进行流量控制
+        if (data.offset !== undefined) {
+            terminalOffset = data.offset;
+            socket.emit('terminal_ack', { offset: data.offset });
         }
     });
     
+    // 流式运行事件
+    socket.on('run_queued', function(data) {
+        if (data.queue_position > 1) {
+            showMessage(`排队中: 第 ${data.queue_position} 位，预计等待 ${data.estimated_wait}s`, 'info');
+        }
+    });
+    
+    socket.on('run_output', function(data) {
+        appendTerminalText(data.data);
+    });
+    
+    socket.on('run_finished', function(data) {
+        appendTerminalText('\n' + formatRunSummary(data) + '\n$ ');
+    });
+    
     socket.on('terminal_started', function(data) {
         currentTerminalId = data.terminal_id;
+        terminalOffset = 0;
+        terminalDecoder = new TextDecoder('utf-8');
+        resetTerminalScreen();
+        sessionStorage.setItem('terminalId', currentTerminalId);
         console.log('Terminal started:', currentTerminalId);
+        flushPendingTerminalInput();
+    });
+    
+    socket.on('terminal_attached', function(data) {
+        terminalAttaching = false;
+        // 重放从新的偏移量开始，丢弃旧解码器中残留的字节
+        terminalDecoder = new TextDecoder('utf-8');
+        resetTerminalScreen();
+        console.log('Terminal reattached:', data.terminal_id);
+        flushPendingTerminalInput();
+    });
+    
+    socket.on('terminal_closed', function(data) {
+        // 会话因空闲超时或数量上限被服务端关闭
+        if (data.terminal_id === currentTerminalId) {
+            currentTerminalId = null;
+            sessionStorage.removeItem('terminalId');
+            resetTerminalScreen();
+            writeTerminalOutput('\r\n[终端会话已关闭]\r\n');
+        }
+    });
+    
+    socket.on('terminal_attach_failed', function(data) {
+        // 会话已过期，下次输入时启动新终端
+        terminalAttaching = false;
+        currentTerminalId = null;
+        sessionStorage.removeItem('terminalId');
+        if (pendingTerminalInput.length > 0) {
+            socket.emit('start_terminal');
+        }
     });
     
     // 环境初始化状态事件
@@ -119,8 +193,10 @@ function setupEventListeners() {
     document.getElementById('save-btn').addEventListener('click', saveFile);
     
     // 终端相关
-    document.getElementById('terminal-input').addEventListener('keypress', handleTerminalInput);
+    document.getElementById('terminal-input').addEventListener('keydown', handleTerminalInput);
     document.getElementById('terminal-send').addEventListener('click', sendTerminalCommand);
+    document.getElementById('terminal-content').addEventListener('keydown', handleTerminalKey);
+    window.addEventListener('resize', sendTerminalSize);
     
     // 文件树相关
     document.getElementById('file-tree').addEventListener('click', handleFileTreeClick);
@@ -268,6 +344,7 @@ function logout() {
     isAuthenticated = false;
     currentUser = null;
     currentTerminalId = null;
+    sessionStorage.removeItem('terminalId');
     currentFile = null;
     openTabs = [];
     activeTab = null;
@@ -294,24 +371,36 @@ function updateUserInfo(userData) {
     document.getElementById('authButtons').style.display = 'none';
 }
 
-// 文件树操作
+// 文件树操作：按层加载，展开目录时再请求其内容
+async function fetchDirectory(path, offset = 0) {
+    const params = new URLSearchParams({ path: path, depth: 1, offset: offset });
+    const response = await fetch(`/api/files/tree?${params}`);
+    const result = await response.json();
+    if (result.status !== 'success') {
+        throw new Error(result.message);
+    }
+    return result.tree;
+}
+
 async function loadFileTree() {
     if (!isAuthenticated) return;
     
     try {
-        const response = await fetch('/api/files/tree?path=/home/user');
-        const result = await response.json();
-        
-        if (result.status === 'success') {
-            fileTreeData = result.tree;
-            renderFileTree(fileTreeData);
-        } else {
-            console.error('加载文件树失败:', result.message);
-            showMessage('加载文件树失败: ' + result.message, 'error');
-        }
+        fileTreeData = await fetchDirectory('/home/user');
+        renderFileTree(fileTreeData);
+    } catch (error) {
+        console.error('加载文件树失败:', error);
+        showMessage('加载文件树失败: ' + error.message, 'error');
+    }
+}
+
+async function loadDirectory(path, container, level, offset = 0) {
+    try {
+        const tree = await fetchDirectory(path, offset);
+        renderFileTree(tree, container, level);
     } catch (error) {
-        console.error('加载文件树错误:', error);
-        showMessage('加载文件树错误: ' + error.message, 'error');
+        console.error('加载目录失败:', error);
+        showMessage('加载目录失败: ' + error.message, 'error');
     }
 }
 
@@ -323,41 +412,148 @@ function renderFileTree(tree, container = null, level = 0) {
     }
     
     if (!tree || !tree.children) return;
+    fileTree.dataset.loaded = 'true';
     
     tree.children.forEach(item => {
-        const itemElement = document.createElement('div');
-        itemElement.className = 'file-tree-item';
-        itemElement.dataset.path = item.path;
-        itemElement.dataset.type = item.type;
-        itemElement.dataset.name = item.name;
-        
-        const isExpanded = localStorage.getItem(`expanded_${item.path}`) === 'true';
-        
-        const icon = item.type === 'directory' ? 
-            (isExpanded ? '📂' : '📁') : 
-            getFileIcon(item.extension);
-        
-        itemElement.innerHTML = `
-            <div class="file-item-content" style="padding-left: ${level * 16 + 8}px">
-                <span class="file-icon">${icon}</span>
-                <span class="file-name">${item.name}</span>
-            </div>
-            ${item.type === 'directory' && item.children && item.children.length > 0 ? 
-                `<div class="file-tree-children ${isExpanded ? 'expanded' : ''}"></div>` : ''}
-        `;
-        
-        fileTree.appendChild(itemElement);
-        
-        // 如果是目录且有子项，递归渲染
-        if (item.type === 'directory' && item.children && item.children.length > 0) {
-            const childrenContainer = itemElement.querySelector('.file-tree-children');
-            if (isExpanded) {
-                renderFileTree(item, childrenContainer, level + 1);
-            }
+        fileTree.appendChild(createFileTreeItem(item, level));
+    });
+    
+    // 大目录分页：点击加载后续条目
+    if (tree.has_more) {
+        const moreElement = document.createElement('div');
+        moreElement.className = 'file-tree-more';
+        moreElement.style.paddingLeft = `${level * 16 + 8}px`;
+        moreElement.textContent = `加载更多（剩余 ${tree.total - tree.offset - tree.children.length} 项）`;
+        moreElement.addEventListener('click', (event) => {
+            event.stopPropagation();
+            moreElement.remove();
+            loadDirectory(tree.path, fileTree, level, tree.offset + tree.children.length);
+        });
+        fileTree.appendChild(moreElement);
+    }
+}
+
+function createFileTreeItem(item, level) {
+    const itemElement = document.createElement('div');
+    itemElement.className = item.ignored ? 'file-tree-item ignored' : 'file-tree-item';
+    itemElement.dataset.path = item.path;
+    itemElement.dataset.type = item.type;
+    itemElement.dataset.name = item.name;
+    itemElement.dataset.level = level;
+    
+    const isExpanded = localStorage.getItem(`expanded_${item.path}`) === 'true';
+    
+    const icon = item.type === 'directory' ? 
+        (isExpanded ? '📂' : '📁') : 
+        getFileIcon(item.extension);
+    
+    itemElement.innerHTML = `
+        <div class="file-item-content" style="padding-left: ${level * 16 + 8}px">
+            <span class="file-icon">${icon}</span>
+            <span class="file-name">${item.name}</span>
+        </div>
+        ${item.type === 'directory' ? 
+            `<div class="file-tree-children ${isExpanded ? 'expanded' : ''}"></div>` : ''}
+    `;
+    
+    // 展开状态的目录：已随父目录返回的直接渲染，否则单独请求
+    if (item.type === 'directory' && isExpanded) {
+        const childrenContainer = itemElement.querySelector('.file-tree-children');
+        if (item.children) {
+            renderFileTree(item, childrenContainer, level + 1);
+        } else {
+            loadDirectory(item.path, childrenContainer, level + 1);
+        }
+    }
+    
+    return itemElement;
+}
+
+// 文件变更推送：只修改受影响的节点，不重新请求文件树
+function findFileTreeItem(path) {
+    return document.querySelector(`#file-tree .file-tree-item[data-path="${CSS.escape(path)}"]`);
+}
+
+// 目录在文件树中的子节点容器，未渲染时返回 null
+function findFileTreeContainer(path) {
+    if (fileTreeData && path === fileTreeData.path) {
+        return { container: document.getElementById('file-tree'), level: 0 };
+    }
+    const item = findFileTreeItem(path);
+    if (!item) return null;
+    const container = item.querySelector(':scope > .file-tree-children');
+    return container ? { container: container, level: Number(item.dataset.level) + 1 } : null;
+}
+
+function compareFileTreeItems(a, b) {
+    if ((a.type === 'directory') !== (b.type === 'directory')) {
+        return a.type === 'directory' ? -1 : 1;
+    }
+    const nameA = a.name.toLowerCase();
+    const nameB = b.name.toLowerCase();
+    return nameA < nameB ? -1 : (nameA > nameB ? 1 : 0);
+}
+
+function insertFileTreeItem(node) {
+    const parentPath = node.path.split('/').slice(0, -1).join('/');
+    const parent = findFileTreeContainer(parentPath);
+    // 父目录还没有加载时不需要处理，展开时会请求最新内容
+    if (!parent || parent.container.dataset.loaded !== 'true') return;
+    
+    const existing = findFileTreeItem(node.path);
+    if (existing) existing.remove();
+    
+    const siblings = Array.from(parent.container.children)
+        .filter(element => element.classList.contains('file-tree-item'));
+    const next = siblings.find(element => compareFileTreeItems(node, {
+        type: element.dataset.type,
+        name: element.dataset.name
+    }) < 0);
+    const more = parent.container.querySelector(':scope > .file-tree-more');
+    if (!next && more) return;  // 排在未加载的分页中
+    parent.container.insertBefore(createFileTreeItem(node, parent.level), next || null);
+}
+
+function reloadFileTreeDirectory(path) {
+    if (!fileTreeData || path === fileTreeData.path) {
+        loadFileTree();
+        return;
+    }
+    const parent = findFileTreeContainer(path);
+    if (!parent || parent.container.dataset.loaded !== 'true') return;
+    parent.container.innerHTML = '';
+    delete parent.container.dataset.loaded;
+    if (parent.container.classList.contains('expanded')) {
+        loadDirectory(path, parent.container, parent.level);
+    }
+}
+
+function applyFileTreeDelta(events) {
+    if (!isAuthenticated || !fileTreeData) return;
+    
+    events.forEach(event => {
+        if (event.type === 'removed' || event.type === 'renamed') {
+            fileCache.delete(event.type === 'renamed' ? event.old_path : event.path);
+            const item = findFileTreeItem(event.type === 'renamed' ? event.old_path : event.path);
+            if (item) item.remove();
+        }
+        if (event.type === 'added' || event.type === 'renamed') {
+            insertFileTreeItem(event.node);
+        }
+        if (event.type === 'invalidated') {
+            // 忽略规则变化或变更过多
+            reloadFileTreeDirectory(event.path);
         }
     });
 }
 
+// 文件操作之后：已连接时文件树由服务器推送的变更更新，未连接时重新加载
+function syncFileTree() {
+    if (!socket || !socket.connected) {
+        loadFileTree();
+    }
+}
+
 function getFileIcon(extension) {
     const iconMap = {
         '.rs': '🦀',
@@ -407,11 +603,9 @@ function toggleDirectory(item, path) {
         children.classList.add('expanded');
         localStorage.setItem(`expanded_${path}`, 'true');
         
-        // 如果子项还没有渲染，现在渲染
-        if (children.children.length === 0) {
-            // 这里需要从 fileTreeData 中找到对应的目录数据
-            // 简化实现：重新加载整个文件树
-            loadFileTree();
+        // 如果子项还没有加载，现在请求
+        if (children.dataset.loaded !== 'true') {
+            loadDirectory(path, children, Number(item.dataset.level) + 1);
         }
     }
     
@@ -422,18 +616,54 @@ function toggleDirectory(item, path) {
     }
 }
 
+function cacheFileContent(filePath, etag, content) {
+    fileCache.delete(filePath);
+    if (!etag) return;
+    fileCache.set(filePath, { etag: etag, content: content });
+    // 超过上限时淘汰最早缓存的文件
+    if (fileCache.size > FILE_CACHE_MAX_ENTRIES) {
+        fileCache.delete(fileCache.keys().next().value);
+    }
+}
+
 async function openFile(filePath, fileName) {
     try {
-        const response = await fetch(`/api/files/read?path=${encodeURIComponent(filePath)}`);
-        const result = await response.json();
+        // 带上已缓存版本的 ETag，文件未修改时服务器只需 stat，返回 304
+        const cached = fileCache.get(filePath);
+        const response = await fetch(`/api/files/read?path=${encodeURIComponent(filePath)}`, {
+            headers: cached ? { 'If-None-Match': `"${cached.etag}"` } : {},
+            cache: 'no-store'
+        });
         
-        if (result.status === 'success') {
-            // 添加到标签页
-            addTab(filePath, fileName, result.content);
-            showMessage(`已打开文件: ${fileName}`, 'success');
+        let content;
+        if (response.status === 304 && cached) {
+            content = cached.content;
         } else {
-            showMessage('打开文件失败: ' + result.message, 'error');
+            const result = await response.json();
+            if (result.status !== 'success') {
+                fileCache.delete(filePath);
+                if (result.raw_url) {
+                    // 过大或非文本文件：在新窗口中流式打开
+                    showMessage(`无法在编辑器中打开 ${fileName}（${result.size} 字节），已在新窗口中打开`, 'info');
+                    window.open(result.raw_url, '_blank');
+                } else {
+                    showMessage('打开文件失败: ' + result.message, 'error');
+                }
+                return;
+            }
+            content = result.content;
+            cacheFileContent(filePath, result.etag, content);
+        }
+        
+        // 已打开且没有未保存修改的标签页使用最新内容
+        const existingTab = openTabs.find(tab => tab.path === filePath);
+        if (existingTab && !existingTab.modified) {
+            existingTab.content = content;
         }
+        
+        // 添加到标签页
+        addTab(filePath, fileName, content);
+        showMessage(`已打开文件: ${fileName}`, 'success');
     } catch (error) {
         showMessage('打开文件错误: ' + error.message, 'error');
     }
@@ -504,6 +734,8 @@ function switchToTab(tabId) {
         document.getElementById('editor').value = tab.content;
         currentFile = tab.path;
         updateEditorTitle(tab.name);
+        renderDiagnostics([]);
+        scheduleCodeCheck();
     }
 }
 
@@ -573,9 +805,81 @@ document.getElementById('editor').addEventListener('input', function() {
             tab.content = this.value;
             markTabModified(activeTab, true);
         }
+        scheduleCodeCheck();
     }
 });
 
+// 编辑时检查（cargo check），停止输入一段时间后触发
+let checkTimer = null;
+
+const CHECKED_FILE = '/home/user/src/main.rs';
+
+function scheduleCodeCheck(delay = 800) {
+    clearTimeout(checkTimer);
+    // 检查的是工作区 Cargo 项目，只在编辑它的 src/main.rs 时自动检查
+    if (!isAuthenticated || currentFile !== CHECKED_FILE) return;
+    checkTimer = setTimeout(checkCode, delay);
+}
+
+async function checkCode() {
+    const code = document.getElementById('editor').value;
+    const tab = openTabs.find(t => t.id === activeTab);
+    
+    try {
+        // 有未保存的修改时检查编辑器内容（服务器在副本中检查，不写入文件），否则检查磁盘上的内容
+        const response = await fetch('/api/check_rust', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(tab && tab.modified ? { code } : {})
+        });
+        
+        const result = await response.json();
+        
+        if (result.status === 'busy') {
+            // 上一次检查还在运行，稍后重试
+            scheduleCodeCheck(2000);
+            return;
+        }
+        
+        // 检查期间内容已变化则丢弃结果
+        if (result.status === 'success' && document.getElementById('editor').value === code) {
+            renderDiagnostics(result.diagnostics);
+        }
+    } catch (error) {
+        console.log('代码检查失败:', error);
+    }
+}
+
+function renderDiagnostics(diagnostics) {
+    const container = document.getElementById('diagnostics');
+    container.innerHTML = '';
+    
+    diagnostics.forEach(diagnostic => {
+        const item = document.createElement('div');
+        item.className = `diagnostic-item ${diagnostic.severity}`;
+        item.textContent = `${diagnostic.file}:${diagnostic.line}:${diagnostic.column} ${diagnostic.severity}: ${diagnostic.message}`;
+        item.title = diagnostic.rendered || '';
+        item.addEventListener('click', () => goToPosition(diagnostic.line, diagnostic.column));
+        container.appendChild(item);
+    });
+}
+
+// 将光标移动到指定行列
+function goToPosition(line, column) {
+    const editor = document.getElementById('editor');
+    const lines = editor.value.split('\n');
+    let offset = 0;
+    for (let i = 0; i < Math.min(line - 1, lines.length); i++) {
+        offset += lines[i].length + 1;
+    }
+    offset += Math.max(0, column - 1);
+    
+    editor.focus();
+    editor.setSelectionRange(offset, offset);
+}
+
 // 右键菜单功能
 let contextMenuTarget = null;
 
@@ -699,7 +1003,7 @@ async function createNewFile() {
         if (result.status === 'success') {
             showMessage('文件创建成功', 'success');
             hideModals();
-            loadFileTree(); // 刷新文件树
+            syncFileTree();
         } else {
             showMessage('文件创建失败: ' + result.message, 'error');
         }
@@ -735,7 +1039,7 @@ async function createNewFolder() {
         if (result.status === 'success') {
             showMessage('文件夹创建成功', 'success');
             hideModals();
-            loadFileTree(); // 刷新文件树
+            syncFileTree();
         } else {
             showMessage('文件夹创建失败: ' + result.message, 'error');
         }
@@ -772,7 +1076,7 @@ async function renameItem() {
         if (result.status === 'success') {
             showMessage('重命名成功', 'success');
             hideModals();
-            loadFileTree(); // 刷新文件树
+            syncFileTree();
             
             // 如果重命名的是当前打开的文件，更新标签页
             const tab = openTabs.find(t => t.path === oldPath);
@@ -815,7 +1119,7 @@ async function deleteItem() {
         
         if (result.status === 'success') {
             showMessage('删除成功', 'success');
-            loadFileTree(); // 刷新文件树
+            syncFileTree();
             
             // 如果删除的是当前打开的文件，关闭标签页
             const tabIndex = openTabs.findIndex(t => t.path === path);
@@ -853,16 +1157,35 @@ async function runCode() {
         await saveFile();
     }
     
+    const profile = document.getElementById('release-mode').checked ? 'release' : 'debug';
+    
+    // WebSocket 可用时流式显示编译和运行输出
+    if (socket && socket.connected) {
+        appendTerminalText('\n运行结果:\n');
+        socket.emit('run_rust', { code, profile });
+        return;
+    }
+    
     try {
         const response = await fetch('/api/run_rust', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ code })
+            body: JSON.stringify({ code, profile })
         });
         
-        const result = await response.json();
+        let result = await response.json();
+        
+        // 任务在服务端排队执行，轮询直到得到结果
+        while (result.status === 'queued' || result.status === 'running') {
+            if (result.status === 'queued') {
+                showMessage(`排队中: 第 ${result.queue_position} 位，预计等待 ${result.estimated_wait}s`, 'info');
+            }
+            await new Promise(resolve => setTimeout(resolve, 500));
+            const pollResponse = await fetch(`/api/run_rust/${result.job_id}`);
+            result = await pollResponse.json();
+        }
         
         let output = '';
         if (result.status === 'success') {
@@ -878,6 +1201,10 @@ async function runCode() {
             output = '错误: ' + result.message;
         }
         
+        if (result.build) {
+            output += `\n[构建: ${result.build.profile} / ${result.build.kind}, ${result.build.time}s]`;
+        }
+        
         // 显示输出在终端区域
         const terminalContent = document.getElementById('terminal-content');
         if (terminalContent) {
@@ -889,6 +1216,41 @@ async function runCode() {
     }
 }
 
+// 流式运行结束后的摘要信息
+function formatRunSummary(result) {
+    let summary;
+    if (result.status === 'success') {
+        summary = `程序退出，退出码: ${result.exit_code}`;
+    } else if (result.status === 'compile_error') {
+        summary = '编译失败';
+    } else if (result.status === 'timeout') {
+        summary = '执行超时';
+    } else {
+        summary = '错误: ' + result.message;
+    }
+    
+    if (result.build) {
+        summary += ` [构建: ${result.build.profile} / ${result.build.kind}, ${result.build.time}s]`;
+    }
+    if (result.total_time !== undefined) {
+        summary += ` [总耗时: ${result.total_time}s]`;
+    }
+    if (result.usage && result.usage.run) {
+        const run = result.usage.run;
+        summary += ` [CPU: ${(run.user_cpu + run.sys_cpu).toFixed(3)}s, 内存峰值: ${(run.max_rss_kb / 1024).toFixed(1)}MB]`;
+    }
+    return summary;
+}
+
+// 以纯文本追加到终端区域（避免输出中的 < > 被当作 HTML）
+function appendTerminalText(text) {
+    const terminalContent = document.getElementById('terminal-content');
+    if (terminalContent) {
+        terminalContent.appendChild(document.createTextNode(text));
+        terminalContent.scrollTop = terminalContent.scrollHeight;
+    }
+}
+
 async function saveFile() {
     if (!currentFile) {
         showMessage('没有打开的文件', 'error');
@@ -913,6 +1275,7 @@ async function saveFile() {
         
         if (result.status === 'success') {
             showMessage('文件保存成功', 'success');
+            cacheFileContent(currentFile, result.etag, code);
             
             // 标记标签页为未修改
             if (activeTab) {
@@ -926,43 +1289,177 @@ async function saveFile() {
     }
 }
 
-// WebSocket 终端功能
-function sendTerminalCommand() {
+// WebSocket 终端功能（流式模式：原始输入直接写入 pty，输出实时推送）
+let pendingTerminalInput = [];
+let terminalAttaching = false;
+let terminalDecoder = new TextDecoder('utf-8');
+// 已收到的终端输出偏移量，断线重连时从这里继续；页面刷新后从保留的回滚输出开头重放
+let terminalOffset = 0;
+currentTerminalId = sessionStorage.getItem('terminalId');
+
+// 终端按键到控制序列的映射
+const TERMINAL_KEY_SEQUENCES = {
+    'Enter': '\r',
+    'Backspace': '\x7f',
+    'Tab': '\t',
+    'Escape': '\x1b',
+    'ArrowUp': '\x1b[A',
+    'ArrowDown': '\x1b[B',
+    'ArrowRight': '\x1b[C',
+    'ArrowLeft': '\x1b[D',
+    'Home': '\x1b[H',
+    'End': '\x1b[F',
+    'Delete': '\x1b[3~'
+};
+
+function sendTerminalData(data) {
     if (!isAuthenticated) {
         showMessage('请先登录以使用终端', 'error');
         return;
     }
     
-    const input = document.getElementById('terminal-input');
-    const command = input.value.trim();
-    
-    if (!command) return;
-    
     if (!socket || !socket.connected) {
         showMessage('终端连接未建立', 'error');
         return;
     }
     
-    // 如果没有启动终端，先启动
+    // 正在重新连接时先缓存输入
+    if (terminalAttaching) {
+        pendingTerminalInput.push(data);
+        return;
+    }
+    
+    // 如果没有启动终端，先启动，输入在 terminal_started 后发送
     if (!currentTerminalId) {
-        socket.emit('start_terminal');
-        // 等待终端启动
-        setTimeout(() => {
-            socket.emit('terminal_input', { input: command });
-        }, 500);
-    } else {
-        socket.emit('terminal_input', { input: command });
+        if (pendingTerminalInput.length === 0) {
+            socket.emit('start_terminal');
+        }
+        pendingTerminalInput.push(data);
+        return;
     }
     
+    socket.emit('terminal_stream_input', { data: data });
+}
+
+function flushPendingTerminalInput() {
+    sendTerminalSize();
+    pendingTerminalInput.forEach(input => socket.emit('terminal_stream_input', { data: input }));
+    pendingTerminalInput = [];
+}
+
+function sendTerminalCommand() {
+    const input = document.getElementById('terminal-input');
+    const command = input.value;
+    
+    if (!command.trim()) return;
+    
+    sendTerminalData(command + '\n');
     input.value = '';
 }
 
 function handleTerminalInput(event) {
     if (event.key === 'Enter') {
         sendTerminalCommand();
+    } else if (event.ctrlKey && event.key === 'c' && event.target.selectionStart === event.target.selectionEnd) {
+        // 没有选中文本时 Ctrl+C 中断前台程序
+        event.preventDefault();
+        sendTerminalData('\x03');
     }
 }
 
+// 终端区域获得焦点后逐键发送（用于 less、Ctrl 组合键等交互输入；全屏程序的输出不显示，见 writeTerminalOutput）
+function handleTerminalKey(event) {
+    let data = null;
+    if (event.ctrlKey && !event.altKey && event.key.length === 1) {
+        const code = event.key.toUpperCase().charCodeAt(0);
+        if (code >= 64 && code <= 95) {
+            data = String.fromCharCode(code - 64);
+        }
+    } else if (TERMINAL_KEY_SEQUENCES[event.key]) {
+        data = TERMINAL_KEY_SEQUENCES[event.key];
+    } else if (event.key.length === 1 && !event.metaKey) {
+        data = event.key;
+    }
+    
+    if (data !== null) {
+        event.preventDefault();
+        sendTerminalData(data);
+    }
+}
+
+function sendTerminalSize() {
+    const terminalContent = document.getElementById('terminal-content');
+    if (!terminalContent || !socket || !currentTerminalId) return;
+    
+    // 按等宽字体估算行列数（13px 字体约 7.8px 宽、18px 高）
+    const cols = Math.max(20, Math.floor((terminalContent.clientWidth - 32) / 7.8));
+    const rows = Math.max(5, Math.floor((terminalContent.clientHeight - 32) / 18));
+    socket.emit('terminal_resize', { rows: rows, cols: cols });
+}
+
+// 全屏程序（top、htop、vim 等）切换到备用屏幕后依赖光标定位重绘，纯文本终端无法正确显示：
+// 备用屏幕期间不显示其输出，只提示退出方法；按键仍逐键发送，以便退出程序
+const TERMINAL_ALT_SCREEN = /\x1b\[\?(?:1049|1047|47)([hl])/;
+let terminalAltScreen = false;
+// 跨帧的不完整控制序列，与下一帧拼接后再处理
+let terminalEscapeTail = '';
+
+function resetTerminalScreen() {
+    terminalAltScreen = false;
+    terminalEscapeTail = '';
+}
+
+// 写入终端输出：过滤全屏程序的输出，其余交给 renderTerminalText
+function writeTerminalOutput(text) {
+    text = terminalEscapeTail + text;
+    const tail = text.match(/\x1b(\[[0-9;?]*)?$/);
+    terminalEscapeTail = tail ? tail[0] : '';
+    if (tail) {
+        text = text.slice(0, tail.index);
+    }
+    
+    // split 的结果中奇数位置是 h（进入备用屏幕）或 l（离开）
+    const parts = text.split(new RegExp(TERMINAL_ALT_SCREEN, 'g'));
+    parts.forEach((part, index) => {
+        if (index % 2 === 1) {
+            if (part === 'h' && !terminalAltScreen) {
+                renderTerminalText('\n[此终端不支持全屏程序（如 top、htop、vim）的显示，请按 q 或 Ctrl+C 退出]\n');
+            }
+            terminalAltScreen = part === 'h';
+        } else if (part && !terminalAltScreen) {
+            renderTerminalText(part);
+        }
+    });
+}
+
+// 显示终端文本：去掉 ANSI 控制序列，处理回车和退格
+function renderTerminalText(text) {
+    const terminalContent = document.getElementById('terminal-content');
+    if (!terminalContent) return;
+    
+    text = text
+        .replace(/\x1b\][^\x07\x1b]*(\x07|\x1b\\)/g, '')
+        .replace(/\x1b\[[0-9;?]*[ -\/]*[@-~]/g, '')
+        .replace(/\x1b[()][0-9A-Za-z]|\x1b[=>78]/g, '')
+        .replace(/\r+\n/g, '\n')
+        .replace(/\r/g, '');
+    
+    const parts = text.split('\b');
+    parts.forEach((part, index) => {
+        if (index > 0) {
+            // 退格：删除最后一个字符
+            const last = terminalContent.lastChild;
+            if (last && last.nodeType === Node.TEXT_NODE && last.data.length > 0) {
+                last.data = last.data.slice(0, -1);
+            }
+        }
+        if (part) {
+            terminalContent.appendChild(document.createTextNode(part));
+        }
+    });
+    terminalContent.scrollTop = terminalContent.scrollHeight;
+}
+
 // 环境初始化功能
 function checkEnvironmentInitialization() {
     if (!isAuthenticated) return;
@@ -1111,7 +1608,8 @@ Proot 可用: ${info.proot_available ? '是' : '否'}
 环境数量: ${info.environments_count}
 用户数量: ${info.users_count}
 已初始化环境: ${info.initialized_environments}
-终端可用: ${info.terminal_available ? '是' : '否'}`;
+终端可用: ${info.terminal_available ? '是' : '否'}
+编译缓存: 命中 ${info.artifact_cache.hits} / 未命中 ${info.artifact_cache.misses}`;
             
             showMessage(infoText, 'info');
         }
@@ -0,0 +1,54 @@
+import importlib
+
+# 终端实现：C++ libterminal.so、Python pty、subprocess 管道（无 pty）
+BACKEND_MODULES = {
+    'cpp': 'cpp_bindings',
+    'pty': 'python_terminal',
+    'subprocess': 'simple_terminal'
+}
+
+# auto 时按此顺序尝试
+BACKEND_ORDER = ('cpp', 'pty', 'subprocess')
+
+# 每个实现模块都必须提供的包装函数
+BACKEND_FUNCTIONS = (
+    'start_terminal_session',
+    'execute_terminal_command',
+    'close_terminal_session',
+    'write_terminal_input',
+    'resize_terminal',
+    'read_terminal_scrollback',
+    'get_terminal_offset',
+    'pause_terminal_output',
+    'resume_terminal_output',
+    'get_terminal_stats',
+    'set_terminal_output_listener'
+)
+
+def load_terminal_backend(preferred='auto'):
+    """加载终端实现，返回 (名称, 模块)
+
+    preferred 为 auto 或 BACKEND_MODULES 中的名称；指定的实现不可用时
+    （如 libterminal.so 未编译）按 BACKEND_ORDER 依次回退。
+    """
+    if preferred in BACKEND_MODULES:
+        candidates = (preferred,) + tuple(name for name in BACKEND_ORDER if name != preferred)
+    else:
+        if preferred != 'auto':
+            print(f"未知的终端实现: {preferred}，自动选择")
+        candidates = BACKEND_ORDER
+
+    for name in candidates:
+        try:
+            module = importlib.import_module(BACKEND_MODULES[name])
+        except (ImportError, OSError) as e:
+            print(f"终端实现 {name} 不可用: {e}")
+            continue
+
+        missing = [function for function in BACKEND_FUNCTIONS if not hasattr(module, function)]
+        if missing:
+            print(f"终端实现 {name} 缺少函数: {', '.join(missing)}")
+            continue
+        return name, module
+
+    raise ImportError("没有可用的终端实现")
@@ -7,6 +7,8 @@
 #include <signal.h>
 #include <sys/wait.h>
 #include <sys/select.h>
+#include <sys/ioctl.h>
+#include <errno.h>
 #include <cstring>
 #include <sstream>
 #include <iostream>
@@ -19,10 +21,19 @@ TerminalManager& TerminalManager::getInstance() {
 TerminalManager::~TerminalManager() {
     std::lock_guard<std::mutex> lock(mutex_);
     for (auto& [id, session] : sessions_) {
-        if (session && session->active) {
-            closeSession(id);
+        if (session) {
+            terminateSession(*session);
         }
     }
+    sessions_.clear();
+}
+
+TerminalSession* TerminalManager::findActiveSession(const std::string& session_id) {
+    auto it = sessions_.find(session_id);
+    if (it == sessions_.end() || !it->second->active) {
+        return nullptr;
+    }
+    return it->second.get();
 }
 
 std::string TerminalManager::createSession(const std::string& workspace) {
@@ -110,39 +121,11 @@ bool TerminalManager::spawnShell(TerminalSession& session, const std::string& wo
         close(session.slave_fd);
         session.child_pid = pid;
         
-        // 启动输出读取线程
-        startOutputReader(session);
-        
+        // 输出不在这里读取：调用方监听 master fd，可读时调用 readOutput
         return true;
     }
 }
 
-void TerminalManager::startOutputReader(TerminalSession& session) {
-    session.read_thread = std::thread([&session]() {
-        char buffer[1024];
-        fd_set read_fds;
-        
-        while (session.active) {
-            FD_ZERO(&read_fds);
-            FD_SET(session.master_fd, &read_fds);
-            
-            struct timeval timeout = {0, 100000}; // 100ms
-            
-            int result = select(session.master_fd + 1, &read_fds, nullptr, nullptr, &timeout);
-            
-            if (result > 0 && FD_ISSET(session.master_fd, &read_fds)) {
-                ssize_t bytes_read = read(session.master_fd, buffer, sizeof(buffer) - 1);
-                if (bytes_read > 0) {
-                    buffer[bytes_read] = '\0';
-                    // 这里可以添加输出处理逻辑
-                } else if (bytes_read == 0) {
-                    break; // EOF
-                }
-            }
-        }
-    });
-}
-
 bool TerminalManager::executeCommand(const std::string& session_id, const std::string& command, std::string& output) {
     std::lock_guard<std::mutex> lock(mutex_);
     
@@ -177,65 +160,88 @@ bool TerminalManager::executeCommand(const std::string& session_id, const std::s
     return true;
 }
 
-std::string TerminalManager::readOutput(const std::string& session_id, size_t max_bytes) {
+ssize_t TerminalManager::readOutput(const std::string& session_id, char* buffer, size_t size) {
     std::lock_guard<std::mutex> lock(mutex_);
     
-    auto it = sessions_.find(session_id);
-    if (it == sessions_.end() || !it->second->active) {
-        return "";
+    TerminalSession* session = findActiveSession(session_id);
+    if (!session) {
+        return -1;
     }
     
-    TerminalSession& session = *it->second;
-    std::string output;
-    char buffer[1024];
+    // master fd 为非阻塞模式，直接读入调用方的缓冲区，不做额外分配和拷贝
+    ssize_t bytes_read = read(session->master_fd, buffer, size);
+    if (bytes_read > 0) {
+        return bytes_read;
+    }
+    if (bytes_read < 0 && (errno == EAGAIN || errno == EWOULDBLOCK || errno == EINTR)) {
+        return 0;
+    }
     
-    fd_set read_fds;
-    FD_ZERO(&read_fds);
-    FD_SET(session.master_fd, &read_fds);
+    // EOF 或 EIO：shell 已退出
+    session->active = false;
+    return -1;
+}
+
+ssize_t TerminalManager::writeInput(const std::string& session_id, const char* data, size_t size) {
+    std::lock_guard<std::mutex> lock(mutex_);
     
-    struct timeval timeout = {0, 0}; // 非阻塞
+    TerminalSession* session = findActiveSession(session_id);
+    if (!session) {
+        return -1;
+    }
     
-    while (select(session.master_fd + 1, &read_fds, nullptr, nullptr, &timeout) > 0) {
-        ssize_t bytes_read = read(session.master_fd, buffer, sizeof(buffer) - 1);
-        if (bytes_read > 0) {
-            buffer[bytes_read] = '\0';
-            output.append(buffer);
-            if (output.length() >= max_bytes) {
-                break;
-            }
-        } else {
-            break;
-        }
+    ssize_t written = write(session->master_fd, data, size);
+    if (written < 0) {
+        return (errno == EAGAIN || errno == EWOULDBLOCK || errno == EINTR) ? 0 : -1;
     }
+    return written;
+}
+
+int TerminalManager::getOutputFd(const std::string& session_id) {
+    std::lock_guard<std::mutex> lock(mutex_);
     
-    return output;
+    TerminalSession* session = findActiveSession(session_id);
+    return session ? session->master_fd : -1;
 }
 
-bool TerminalManager::closeSession(const std::string& session_id) {
+bool TerminalManager::resize(const std::string& session_id, unsigned short rows, unsigned short cols) {
     std::lock_guard<std::mutex> lock(mutex_);
     
-    auto it = sessions_.find(session_id);
-    if (it == sessions_.end()) {
+    TerminalSession* session = findActiveSession(session_id);
+    if (!session) {
         return false;
     }
     
-    TerminalSession& session = *it->second;
+    struct winsize size = {rows, cols, 0, 0};
+    return ioctl(session->master_fd, TIOCSWINSZ, &size) == 0;
+}
+
+void TerminalManager::terminateSession(TerminalSession& session) {
     session.active = false;
     
-    // 杀死子进程
+    // 杀死子进程（交互式 sh 会忽略 SIGTERM）
     if (session.child_pid > 0) {
-        kill(session.child_pid, SIGTERM);
+        kill(session.child_pid, SIGKILL);
         waitpid(session.child_pid, nullptr, 0);
+        session.child_pid = 0;
     }
     
     // 关闭文件描述符
-    close(session.master_fd);
+    if (session.master_fd >= 0) {
+        close(session.master_fd);
+        session.master_fd = -1;
+    }
+}
+
+bool TerminalManager::closeSession(const std::string& session_id) {
+    std::lock_guard<std::mutex> lock(mutex_);
     
-    // 等待读取线程结束
-    if (session.read_thread.joinable()) {
-        session.read_thread.join();
+    auto it = sessions_.find(session_id);
+    if (it == sessions_.end()) {
+        return false;
     }
     
+    terminateSession(*it->second);
     sessions_.erase(it);
     return true;
 }
@@ -264,4 +270,20 @@ extern "C" {
     int close_terminal_session(const char* session_id) {
         return TerminalManager::getInstance().closeSession(session_id) ? 0 : -1;
     }
+    
+    long terminal_read_output(const char* session_id, char* buffer, size_t size) {
+        return TerminalManager::getInstance().readOutput(session_id, buffer, size);
+    }
+    
+    long terminal_write_input(const char* session_id, const char* data, size_t size) {
+        return TerminalManager::getInstance().writeInput(session_id, data, size);
+    }
+    
+    int terminal_get_fd(const char* session_id) {
+        return TerminalManager::getInstance().getOutputFd(session_id);
+    }
+    
+    int terminal_resize(const char* session_id, unsigned short rows, unsigned short cols) {
+        return TerminalManager::getInstance().resize(session_id, rows, cols) ? 0 : -1;
+    }
 }
\ No newline at end of file
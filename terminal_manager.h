@@ -5,8 +5,8 @@
 #include <unordered_map>
 #include <memory>
 #include <mutex>
-#include <thread>
 #include <atomic>
+#include <sys/types.h>
 
 struct TerminalSession {
     int master_fd;
@@ -14,34 +14,44 @@ struct TerminalSession {
     pid_t child_pid;
     std::string workspace;
     std::atomic<bool> active;
-    std::thread read_thread;
 };
 
 class TerminalManager {
 public:
     static TerminalManager& getInstance();
-    
+
     std::string createSession(const std::string& workspace);
     bool executeCommand(const std::string& session_id, const std::string& command, std::string& output);
     bool closeSession(const std::string& session_id);
-    std::string readOutput(const std::string& session_id, size_t max_bytes = 4096);
-    
+    // 非阻塞读取到调用方提供的缓冲区：返回读取的字节数，暂无数据返回 0，会话已结束返回 -1
+    ssize_t readOutput(const std::string& session_id, char* buffer, size_t size);
+    // 原始输入写入 pty，返回写入的字节数，失败返回 -1
+    ssize_t writeInput(const std::string& session_id, const char* data, size_t size);
+    // 输出 fd，供调用方的事件循环（epoll）监听
+    int getOutputFd(const std::string& session_id);
+    bool resize(const std::string& session_id, unsigned short rows, unsigned short cols);
+
 private:
     TerminalManager() = default;
     ~TerminalManager();
-    
+
     std::unordered_map<std::string, std::unique_ptr<TerminalSession>> sessions_;
     std::mutex mutex_;
-    
+
     bool createPty(TerminalSession& session);
     bool spawnShell(TerminalSession& session, const std::string& workspace);
-    void startOutputReader(TerminalSession& session);
+    void terminateSession(TerminalSession& session);
+    TerminalSession* findActiveSession(const std::string& session_id);
 };
 
 extern "C" {
     const char* start_terminal_session(const char* workspace);
     int execute_terminal_command(const char* session_id, const char* command, char* output, size_t output_size);
     int close_terminal_session(const char* session_id);
+    long terminal_read_output(const char* session_id, char* buffer, size_t size);
+    long terminal_write_input(const char* session_id, const char* data, size_t size);
+    int terminal_get_fd(const char* session_id);
+    int terminal_resize(const char* session_id, unsigned short rows, unsigned short cols);
 }
 
-#endif
\ No newline at end of file
+#endif
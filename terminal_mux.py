@@ -0,0 +1,127 @@
+import os
+import selectors
+import threading
+
+READ_CHUNK_SIZE = 65536
+
+class TerminalMultiplexer:
+    """单线程 I/O 多路复用器
+
+    用一个线程和 selectors（Linux 上为 epoll）监听所有终端会话的输出 fd，
+    有数据时回调 on_data(data)，fd 关闭（EOF/EIO）时回调 on_close()。
+    会话数增加时线程数不变，空闲时线程阻塞在 epoll 上不占用 CPU。
+
+    所有读取共用一个缓冲区，on_data 收到的是指向该缓冲区的 memoryview，
+    只在回调期间有效，需要保留时由回调自行拷贝（如写入回滚缓冲区）。
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.paused = {}  # fd -> 回调，暂停期间不读取（pty 写满后会阻塞写入方，形成背压）
+        self.read_buffer = bytearray(READ_CHUNK_SIZE)
+        self.read_view = memoryview(self.read_buffer)
+        # 注册/注销后唤醒事件循环，使其立即使用新的 fd 集合
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        os.set_blocking(self.wakeup_write, False)
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ, None)
+
+    def register(self, fd, on_data, on_close=None, read_into=None):
+        """监听 fd
+
+        read_into(buffer) 可替代默认的 os.readv：返回读取的字节数，0 表示 EOF，
+        暂无数据时抛出 BlockingIOError（用于 C++ 终端库等自行读取 fd 的后端）。
+        """
+        with self.lock:
+            self.selector.register(fd, selectors.EVENT_READ, (on_data, on_close, read_into))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name="terminal-mux", daemon=True)
+                self.thread.start()
+        self._wakeup()
+
+    def unregister(self, fd):
+        with self.lock:
+            if self.paused.pop(fd, None) is not None:
+                return True
+            try:
+                self.selector.unregister(fd)
+            except (KeyError, ValueError):
+                return False
+        self._wakeup()
+        return True
+
+    def pause(self, fd):
+        """暂停读取 fd"""
+        with self.lock:
+            try:
+                key = self.selector.unregister(fd)
+            except (KeyError, ValueError):
+                return False
+            self.paused[fd] = key.data
+        self._wakeup()
+        return True
+
+    def resume(self, fd):
+        """恢复读取 fd"""
+        with self.lock:
+            callbacks = self.paused.pop(fd, None)
+            if callbacks is None:
+                return False
+            self.selector.register(fd, selectors.EVENT_READ, callbacks)
+        self._wakeup()
+        return True
+
+    def _wakeup(self):
+        try:
+            os.write(self.wakeup_write, b"\0")
+        except BlockingIOError:
+            pass  # 管道已满说明已有未处理的唤醒
+
+    def _loop(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fd == self.wakeup_read:
+                    try:
+                        while os.read(self.wakeup_read, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                on_data, on_close, read_into = key.data
+                try:
+                    if read_into:
+                        length = read_into(self.read_buffer)
+                    else:
+                        length = os.readv(key.fd, [self.read_buffer])
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    length = 0  # pty 的子进程退出后读取 master 会得到 EIO
+
+                if length > 0:
+                    try:
+                        on_data(self.read_view[:length])
+                    except Exception as e:
+                        print(f"终端输出处理错误: {e}")
+                    continue
+
+                # fd 已关闭：注销并通知会话
+                if self.unregister(key.fd) and on_close:
+                    try:
+                        on_close()
+                    except Exception as e:
+                        print(f"终端关闭处理错误: {e}")
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'watched_fds': len(self.selector.get_map()) - 1,
+                'paused_fds': len(self.paused),
+                'threads': 1 if self.thread else 0
+            }
+
+# 全局实例，所有终端会话共享一个事件循环线程
+terminal_mux = TerminalMultiplexer()
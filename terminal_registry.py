@@ -0,0 +1,146 @@
+import time
+import threading
+from collections import OrderedDict
+
+IDLE_REPORT_SECONDS = 60  # 统计中超过该时间没有输入输出的会话计为空闲
+
+class TerminalRegistry:
+    """按用户登记终端会话，负责会话的保留、回收和数量上限
+
+    - Socket.IO 连接断开时只解除会话与连接的绑定，会话继续运行；同一用户在
+      grace_period 秒内可以用终端 ID 重新连接，超时未重新连接的会话被关闭。
+    - 超过 idle_timeout 秒没有输入输出的会话被关闭。
+    - 会话数达到 max_sessions 时关闭最久没有活动的会话（LRU）。
+    """
+
+    def __init__(self, close_session, grace_period, idle_timeout, max_sessions):
+        self.close_session = close_session
+        self.grace_period = grace_period
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max(1, max_sessions)
+        self.lock = threading.Lock()
+        # terminal_id -> {'user_id', 'sid', 'created_at', 'detached_at', 'last_activity'}，按最近活动排序
+        self.terminals = OrderedDict()
+        self.counters = {'reattached': 0, 'expired': 0, 'reaped': 0, 'evicted': 0}
+
+        thread = threading.Thread(target=self._reap_loop, name="terminal-reaper", daemon=True)
+        thread.start()
+
+    def register(self, terminal_id, user_id, sid=None):
+        """登记新会话，sid 为空表示通过 HTTP API 使用的会话"""
+        now = time.time()
+        with self.lock:
+            self.terminals[terminal_id] = {
+                'user_id': str(user_id),
+                'sid': sid,
+                'created_at': now,
+                'detached_at': None,
+                'last_activity': now
+            }
+            evicted = []
+            while len(self.terminals) > self.max_sessions:
+                evicted.append(self.terminals.popitem(last=False)[0])
+            self.counters['evicted'] += len(evicted)
+        self._close_all(evicted)
+
+    def touch(self, terminal_id):
+        """记录会话活动（输入或输出）"""
+        with self.lock:
+            terminal = self.terminals.get(terminal_id)
+            if terminal:
+                terminal['last_activity'] = time.time()
+                self.terminals.move_to_end(terminal_id)
+
+    def attach(self, terminal_id, user_id, sid):
+        """将终端绑定到新的连接，返回 (是否成功, 之前绑定的连接)"""
+        with self.lock:
+            terminal = self.terminals.get(terminal_id)
+            if not terminal or terminal['user_id'] != str(user_id):
+                return False, None
+            previous_sid = terminal['sid']
+            terminal['sid'] = sid
+            terminal['detached_at'] = None
+            terminal['last_activity'] = time.time()
+            self.terminals.move_to_end(terminal_id)
+            self.counters['reattached'] += 1
+            return True, previous_sid
+
+    def detach(self, terminal_id, sid):
+        """连接断开：会话进入保留期，返回是否解除了绑定（终端已绑定到其他连接时不处理）"""
+        with self.lock:
+            terminal = self.terminals.get(terminal_id)
+            if terminal and terminal['sid'] == sid:
+                terminal['sid'] = None
+                terminal['detached_at'] = time.time()
+                return True
+            return False
+
+    def remove(self, terminal_id):
+        with self.lock:
+            return self.terminals.pop(terminal_id, None) is not None
+
+    def get_user_terminals(self, user_id):
+        with self.lock:
+            return [
+                {
+                    'terminal_id': terminal_id,
+                    'created_at': terminal['created_at'],
+                    'attached': terminal['sid'] is not None
+                }
+                for terminal_id, terminal in self.terminals.items()
+                if terminal['user_id'] == str(user_id)
+            ]
+
+    def _close_all(self, terminal_ids):
+        for terminal_id in terminal_ids:
+            try:
+                self.close_session(terminal_id)
+            except Exception as e:
+                print(f"关闭终端会话失败: {e}")
+
+    def _reap_loop(self):
+        interval = max(1, min(30, self.grace_period / 2, self.idle_timeout / 2))
+        while True:
+            time.sleep(interval)
+            self.reap()
+
+    def reap(self):
+        """关闭保留期已过和空闲超时的会话"""
+        now = time.time()
+        with self.lock:
+            expired = [
+                terminal_id for terminal_id, terminal in self.terminals.items()
+                if terminal['detached_at'] and now - terminal['detached_at'] > self.grace_period
+            ]
+            for terminal_id in expired:
+                del self.terminals[terminal_id]
+
+            # 按最近活动排序，从最久未活动的开始检查
+            idle = []
+            for terminal_id, terminal in self.terminals.items():
+                if now - terminal['last_activity'] <= self.idle_timeout:
+                    break
+                idle.append(terminal_id)
+            for terminal_id in idle:
+                del self.terminals[terminal_id]
+
+            self.counters['expired'] += len(expired)
+            self.counters['reaped'] += len(idle)
+        self._close_all(expired + idle)
+
+    def get_stats(self):
+        now = time.time()
+        with self.lock:
+            detached = sum(1 for terminal in self.terminals.values() if terminal['detached_at'])
+            idle = sum(1 for terminal in self.terminals.values()
+                       if now - terminal['last_activity'] > IDLE_REPORT_SECONDS)
+            return dict(
+                self.counters,
+                live=len(self.terminals),
+                idle=idle,
+                attached=sum(1 for terminal in self.terminals.values() if terminal['sid']),
+                detached=detached,
+                max_sessions=self.max_sessions,
+                grace_period=self.grace_period,
+                idle_timeout=self.idle_timeout
+            )
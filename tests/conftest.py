@@ -0,0 +1,115 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config
+
+# 导入 app 之前把所有数据目录指向临时目录，测试不读写仓库中的数据库和环境
+DATA_DIR = tempfile.mkdtemp(prefix="rust-ide-test-")
+Config.PROOT_ENV_BASE = os.path.join(DATA_DIR, "proot_environments")
+Config.RUST_WORKSPACE_BASE = os.path.join(DATA_DIR, "workspace")
+Config.USER_STORE_PATH = os.path.join(DATA_DIR, "user_db.sqlite3")
+Config.USER_DB_PATH = os.path.join(DATA_DIR, "user_db.json")
+Config.ENV_REGISTRY_PATH = os.path.join(DATA_DIR, "environments.sqlite3")
+Config.ARTIFACT_CACHE_DIR = os.path.join(DATA_DIR, "artifacts")
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def ide():
+    """导入 app 模块（只导入一次，模块级的管理器在整个测试会话中共享）"""
+    import app
+    return app
+
+@pytest.fixture
+def user(ide, monkeypatch):
+    """已登录的用户：新建环境，token 验证直接成功"""
+    user_id = f"test-{os.urandom(4).hex()}"
+    token = f"token-{user_id}"
+    monkeypatch.setattr(ide.token_cache, 'get', lambda t: {"status": "success", "data": {"id": user_id}})
+    env_id = ide.proot_manager.create_environment(user_id)
+    ide.user_db.set_user_environment(user_id, env_id)
+    client = ide.app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session['user_id'] = user_id
+        flask_session['user_token'] = token
+        flask_session['environment_id'] = env_id
+    return {
+        'user_id': user_id,
+        'env_id': env_id,
+        'env': ide.proot_manager.get_environment(env_id),
+        'client': client
+    }
+
+class SocketClient:
+    """真实的 Socket.IO 客户端（polling 传输），记录收到的所有事件"""
+
+    def __init__(self, url, cookie):
+        import queue
+        import socketio
+        self.events = queue.Queue()
+        self.sio = socketio.Client()
+        self.sio.on('*', lambda name, *args: self.events.put({'name': name, 'args': list(args)}))
+        self.sio.connect(url, headers={'Cookie': cookie}, transports=['polling'])
+
+    def emit(self, name, data=None):
+        self.sio.emit(name, data)
+
+    def wait_for(self, name, timeout=30, collected=None):
+        """等待 name 事件，返回其参数；collected 收集期间收到的所有事件"""
+        import queue
+        import time
+        deadline = time.time() + timeout
+        while True:
+            try:
+                event = self.events.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                raise AssertionError(f"没有收到 {name} 事件")
+            if collected is not None:
+                collected.append(event)
+            if event['name'] == name:
+                return event['args'][0] if event['args'] else None
+
+    def disconnect(self):
+        self.sio.disconnect()
+
+@pytest.fixture(scope="session")
+def server_url(ide):
+    """在后台线程中运行应用（与 socketio.run 相同的 threading 模式服务器）"""
+    import logging
+    import threading
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, ide.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+@pytest.fixture
+def connect_socket(ide, user, server_url):
+    """以 user 的会话建立新的 Socket.IO 连接（可多次调用，模拟断线重连）"""
+    cookie = user['client'].get_cookie(Config.SESSION_COOKIE_NAME)
+    clients = []
+
+    def connect():
+        client = SocketClient(server_url, f"{cookie.key}={cookie.value}")
+        clients.append(client)
+        client.wait_for('connected')
+        return client
+
+    yield connect
+    for client in clients:
+        if client.sio.connected:
+            client.disconnect()
+
+@pytest.fixture
+def socket_client(connect_socket):
+    return connect_socket()
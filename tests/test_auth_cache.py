@@ -0,0 +1,109 @@
+import time
+import threading
+
+import pytest
+
+from auth_cache import TokenCache
+
+class Interrupted(BaseException):
+    pass
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+def make_cache(fetch, ttl=60, negative_ttl=10, max_entries=100):
+    return TokenCache(fetch, ttl, negative_ttl, max_entries)
+
+def test_caches_success_and_invalid_results():
+    calls = []
+    def fetch(token):
+        calls.append(token)
+        return {"status": "success" if token == "good" else "error"}
+    cache = make_cache(fetch)
+    for _ in range(3):
+        assert cache.get("good")['status'] == 'success'
+        assert cache.get("bad")['status'] == 'error'
+    assert calls == ["good", "bad"]
+    cache.invalidate("good")
+    cache.get("good")
+    assert calls == ["good", "bad", "good"]
+
+def test_transient_errors_are_not_cached():
+    calls = []
+    def fetch(token):
+        calls.append(token)
+        raise ConnectionError("down")
+    cache = make_cache(fetch)
+    first = cache.get("t")
+    assert first['transient'] and first['status'] == 'error'
+    cache.get("t")
+    assert len(calls) == 2
+    assert cache.get_stats()['transient_errors'] == 2
+
+def test_concurrent_lookups_share_one_fetch():
+    release = threading.Event()
+    calls = []
+    def fetch(token):
+        calls.append(token)
+        release.wait(5)
+        return {"status": "success"}
+    cache = make_cache(fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("t"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: cache.get_stats()['coalesced'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == ["t"]
+    assert [result['status'] for result in results] == ['success'] * 5
+
+def test_validator_raising_does_not_strand_waiters():
+    entered = threading.Event()
+    release = threading.Event()
+    def fetch(token):
+        entered.set()
+        release.wait(5)
+        raise Interrupted()
+    cache = make_cache(fetch)
+
+    leader_error = []
+    def leader():
+        try:
+            cache.get("t")
+        except Interrupted as e:
+            leader_error.append(e)
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    entered.wait(5)
+    follower_result = []
+    follower = threading.Thread(target=lambda: follower_result.append(cache.get("t")))
+    follower.start()
+    wait_until(lambda: cache.get_stats()['coalesced'] == 1)
+    release.set()
+    leader_thread.join(5)
+    follower.join(5)
+
+    assert leader_error and not follower.is_alive()
+    assert follower_result[0]['transient'] is True
+    assert cache.get_stats()['inflight'] == 0
+
+def test_malformed_validator_result_is_released():
+    cache = make_cache(lambda token: None)
+    with pytest.raises(AttributeError):
+        cache.get("t")
+    assert cache.get_stats()['inflight'] == 0
+
+def test_evicts_least_recently_used():
+    cache = make_cache(lambda token: {"status": "success"}, max_entries=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    stats = cache.get_stats()
+    assert (stats['entries'], stats['evictions']) == (2, 1)
+    assert list(cache.entries) == ["a", "c"]
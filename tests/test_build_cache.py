@@ -0,0 +1,74 @@
+import os
+
+from build_cache import ArtifactCache, read_project_files
+
+def write_project(workspace, main="fn main() {}\n", cargo_toml='[package]\nname = "demo"\nversion = "0.1.0"\n'):
+    os.makedirs(os.path.join(workspace, "src"), exist_ok=True)
+    with open(os.path.join(workspace, "Cargo.toml"), "w") as f:
+        f.write(cargo_toml)
+    with open(os.path.join(workspace, "src", "main.rs"), "w") as f:
+        f.write(main)
+
+def make_binary(path, size):
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return path
+
+def test_key_depends_on_sources_and_profile(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 1024)
+    workspace = str(tmp_path / "ws")
+    write_project(workspace)
+    key = cache.compute_key(workspace, 'debug')
+    assert key == cache.compute_key(workspace, 'debug')
+    assert key != cache.compute_key(workspace, 'release')
+
+    write_project(workspace, main="fn main() { println!(); }\n")
+    assert cache.compute_key(workspace, 'debug') != key
+
+def test_key_from_files_matches_key_from_disk(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 1024)
+    workspace = str(tmp_path / "ws")
+    write_project(workspace)
+    files = read_project_files(workspace)
+    assert cache.compute_key_for_files(files, 'check') == cache.compute_key(workspace, 'check')
+
+def test_path_dependencies_are_not_cached(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 1024)
+    workspace = str(tmp_path / "ws")
+    write_project(workspace, cargo_toml='[dependencies]\nlocal = { path = "../local" }\n')
+    assert cache.compute_key(workspace, 'debug') is None
+    assert cache.compute_key(str(tmp_path / "missing"), 'debug') is None
+
+def test_put_get_and_lru_eviction(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 100)
+    binary = make_binary(str(tmp_path / "bin"), 40)
+    assert cache.get("aa1") is None
+    assert cache.put("aa1", binary)
+    assert cache.put("bb2", binary)
+    assert cache.get("aa1")  # aa1 变为最近使用
+    assert cache.put("cc3", binary)
+
+    assert cache.get("bb2") is None
+    assert open(cache.get("aa1"), "rb").read() == b"\0" * 40
+    stats = cache.get_stats()
+    assert stats['entries'] == 2
+    assert stats['size_bytes'] == 80
+    assert stats['evictions'] == 1
+
+def test_oversized_binary_is_not_stored(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), 10)
+    assert cache.put("aa1", make_binary(str(tmp_path / "bin"), 11)) is False
+    assert cache.get_stats()['entries'] == 0
+
+def test_index_is_restored_and_temp_files_removed(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache = ArtifactCache(cache_dir, 100)
+    cache.put("aa1", make_binary(str(tmp_path / "bin"), 10))
+    leftover = os.path.join(cache_dir, "bb", "bb2.tmp-123")
+    os.makedirs(os.path.dirname(leftover))
+    make_binary(leftover, 5)
+
+    restored = ArtifactCache(cache_dir, 100)
+    assert restored.get("aa1")
+    assert restored.get_stats()['size_bytes'] == 10
+    assert not os.path.exists(leftover)
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+import requests
+
+from byusi_client import ByUsiClient, CircuitBreaker
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self.payload = payload if payload is not None else {"status": "success"}
+
+    def json(self):
+        return self.payload
+
+def make_client(monkeypatch, responses, max_retries=2, breaker_threshold=3, breaker_reset=30):
+    """responses 中的每一项是 FakeResponse 或要抛出的异常，按顺序用于每次请求"""
+    client = ByUsiClient("http://byusi.invalid/user/", 1, 1, max_retries, 0,
+                         2, breaker_threshold, breaker_reset)
+    calls = []
+    def post(url, data, timeout):
+        calls.append(data['action'])
+        response = responses.pop(0)
+        if isinstance(response, BaseException):
+            raise response
+        return response
+    monkeypatch.setattr(client.session, 'post', post)
+    return client, calls
+
+def test_breaker_opens_after_threshold_and_probes_after_reset():
+    breaker = CircuitBreaker(2, 0.05)
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow() == 'probe'
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow() is True
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(1, 0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow() == 'probe'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert breaker.trips == 2
+
+def test_probe_that_raises_does_not_wedge_the_breaker(monkeypatch):
+    client, calls = make_client(monkeypatch, [requests.ConnectionError("refused"), KeyError("boom"),
+                                              FakeResponse()], max_retries=0, breaker_threshold=1,
+                                breaker_reset=0.05)
+    assert client.call('get_user', token='t')['transient']
+    assert client.breaker.state == 'open'
+    time.sleep(0.06)
+    with pytest.raises(KeyError):
+        client.call('get_user', token='t')
+    assert client.breaker.state == 'half_open'
+    assert client.call('get_user', token='t') == {"status": "success"}
+    assert client.breaker.state == 'closed'
+
+def test_get_user_retries_timeouts_and_server_errors(monkeypatch):
+    client, calls = make_client(monkeypatch, [requests.ReadTimeout("slow"), FakeResponse(502), FakeResponse()])
+    assert client.call('get_user', token='t') == {"status": "success"}
+    assert calls == ['get_user'] * 3
+
+@pytest.mark.parametrize('action', ['login', 'register'])
+def test_non_idempotent_actions_do_not_retry_after_sending(monkeypatch, action):
+    client, calls = make_client(monkeypatch, [requests.ReadTimeout("slow"), FakeResponse()])
+    assert client.call(action)['transient']
+    assert calls == [action]
+
+    client, calls = make_client(monkeypatch, [FakeResponse(503), FakeResponse()])
+    assert client.call(action)['transient']
+    assert calls == [action]
+
+@pytest.mark.parametrize('action', ['get_user', 'login', 'register'])
+def test_every_action_retries_when_the_connection_was_never_made(monkeypatch, action):
+    client, calls = make_client(monkeypatch, [requests.ConnectTimeout("connect"), FakeResponse()])
+    assert client.call(action) == {"status": "success"}
+    assert calls == [action, action]
+
+def test_open_breaker_rejects_without_sending(monkeypatch):
+    client, calls = make_client(monkeypatch, [requests.ConnectionError("down")], max_retries=0,
+                                breaker_threshold=1)
+    client.call('get_user')
+    assert client.call('get_user')['message'] == "认证服务暂时不可用"
+    assert calls == ['get_user']
+    assert client.get_stats()['rejected'] == 1
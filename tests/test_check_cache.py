@@ -0,0 +1,25 @@
+import shutil
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which("cargo") is None, reason="需要 cargo")
+
+def test_unchanged_code_is_served_from_cache_while_a_check_runs(ide, user):
+    manager = ide.proot_manager
+    code = 'fn main() { let unused = 1; }'
+    first = manager.check_rust_code(user['env_id'], code)
+    assert first['status'] == 'success', first
+    assert first['cached'] is False
+
+    # 模拟同一环境正在进行另一次检查
+    lock = manager._check_lock(user['env_id'])
+    assert lock.acquire(blocking=False)
+    try:
+        again = manager.check_rust_code(user['env_id'], code)
+        changed = manager.check_rust_code(user['env_id'], code + '\n// edited')
+    finally:
+        lock.release()
+
+    assert again['cached'] is True
+    assert again['diagnostics'] == first['diagnostics']
+    assert changed == {"status": "busy", "message": "Check in progress"}
@@ -0,0 +1,57 @@
+import os
+
+from env_registry import EnvironmentRegistry, directory_size
+
+def make_environment(env_id, user_id=1, initialized=False):
+    return {'id': env_id, 'user_id': user_id, 'path': f"/envs/{env_id}", 'created_at': 1.0, 'initialized': initialized}
+
+def test_add_get_and_remove(tmp_path):
+    registry = EnvironmentRegistry(str(tmp_path / "envs.sqlite3"))
+    try:
+        assert registry.add(make_environment('e1'))
+        environment = registry.get('e1')
+        assert environment['id'] == 'e1'
+        assert environment['user_id'] == '1'
+        assert environment['initialized'] is False
+
+        assert registry.set_initialized('e1')
+        assert registry.update_size('e1', 2048)
+        environment = registry.get('e1')
+        assert environment['initialized'] is True
+        assert environment['initialized_at'] and environment['size_updated_at']
+        assert registry.get_stats() == {'environments': 1, 'initialized': 1, 'size_bytes': 2048}
+
+        assert registry.remove('e1')
+        assert registry.get('e1') is None
+        assert registry.remove('e1') is False
+    finally:
+        registry.close()
+
+def test_existing_environments_are_imported_only_once(tmp_path):
+    path = str(tmp_path / "envs.sqlite3")
+    calls = []
+
+    def load():
+        calls.append(1)
+        return [make_environment('e1', initialized=True), make_environment('e2')]
+
+    registry = EnvironmentRegistry(path)
+    assert registry.import_once(load) == 2
+    registry.close()
+
+    reopened = EnvironmentRegistry(path)
+    try:
+        assert reopened.import_once(load) == 0
+        assert len(calls) == 1
+        assert reopened.get_stats()['environments'] == 2
+    finally:
+        reopened.close()
+
+def test_directory_size_does_not_follow_symlinks(tmp_path):
+    os.makedirs(tmp_path / "root" / "sub")
+    (tmp_path / "root" / "a").write_bytes(b"x" * 10)
+    (tmp_path / "root" / "sub" / "b").write_bytes(b"y" * 5)
+    (tmp_path / "outside").write_bytes(b"z" * 1000)
+    os.symlink(tmp_path / "outside", tmp_path / "root" / "link")
+    link_size = os.lstat(tmp_path / "root" / "link").st_size
+    assert directory_size(str(tmp_path / "root")) == 15 + link_size
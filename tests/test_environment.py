@@ -0,0 +1,56 @@
+import os
+
+def test_without_proot_commands_run_in_the_simple_environment(ide, user, monkeypatch):
+    manager = ide.proot_manager
+    env = user['env']
+    monkeypatch.setattr(manager, 'proot_available', False)
+    monkeypatch.setitem(env, 'initialized', True)
+    with open(os.path.join(env['path'], "start.sh"), "w") as f:
+        f.write("#!/bin/sh\nexec sh\n")
+    spawned = manager.sandbox_pool.get_stats()['spawned']
+
+    assert manager._sandbox_command(env) is None
+    result = manager.execute_in_environment(user['env_id'], 'pwd')
+    assert result['status'] == 'success'
+    assert result['output'].strip() == os.path.realpath(os.path.join(env['path'], "home", "user"))
+    assert manager.sandbox_pool.get_stats()['spawned'] == spawned
+
+def test_initialized_environment_uses_the_sandbox_pool(ide, user, monkeypatch):
+    manager = ide.proot_manager
+    env = user['env']
+    monkeypatch.setattr(manager, 'proot_available', True)
+    monkeypatch.setitem(env, 'initialized', True)
+    start_script = os.path.join(env['path'], "start.sh")
+    with open(start_script, "w") as f:
+        f.write(f"#!/bin/sh\ncd {env['path']} && exec sh\n")
+    os.chmod(start_script, 0o755)
+
+    first = manager.execute_in_environment(user['env_id'], 'echo pooled', cwd=env['path'])
+    second = manager.execute_in_environment(user['env_id'], 'echo again', cwd=env['path'])
+    assert (first['output'], second['output']) == ('pooled\n', 'again\n')
+    manager.sandbox_pool.close_environment(user['env_id'])
+
+def test_execute_api_runs_in_the_environment(user):
+    response = user['client'].post('/api/execute', json={'command': 'cat; echo "cwd=$(basename $PWD)"', 'input': 'in\n'})
+    result = response.get_json()
+    assert result['status'] == 'success'
+    assert result['output'] == 'in\ncwd=user\n'
+
+def test_deleted_environment_closes_its_sandbox_workers(ide, user, monkeypatch):
+    import shutil
+    manager = ide.proot_manager
+    env = user['env']
+    monkeypatch.setattr(manager, 'proot_available', True)
+    monkeypatch.setitem(env, 'initialized', True)
+    start_script = os.path.join(env['path'], "start.sh")
+    with open(start_script, "w") as f:
+        f.write("#!/bin/sh\nexec sh\n")
+    os.chmod(start_script, 0o755)
+    assert manager.execute_in_environment(user['env_id'], 'true', cwd='/')['status'] == 'success'
+    worker = manager.sandbox_pool.idle[user['env_id']][0]
+
+    shutil.rmtree(env['path'])
+    assert manager.get_environment(user['env_id']) is None
+    assert not worker.is_alive()
+    assert user['env_id'] not in manager.sandbox_pool.live_counts
+    assert manager.registry.get(user['env_id']) is None
@@ -0,0 +1,24 @@
+import os
+
+def test_external_change_is_pushed_as_delta(user, socket_client):
+    # 客户端加载过的目录才会被监听
+    response = user['client'].get('/api/files/tree?path=/home/user&depth=1').get_json()
+    assert response['status'] == 'success'
+
+    workspace = os.path.join(user['env']['path'], "home", "user")
+    with open(os.path.join(workspace, "notes.txt"), "w") as f:
+        f.write("outside the editor\n")
+
+    delta = socket_client.wait_for('file_tree_delta', timeout=10)
+    added = [event for event in delta['events'] if event['type'] == 'added']
+    assert [event['path'] for event in added] == ['/home/user/notes.txt']
+    assert added[0]['node']['name'] == 'notes.txt'
+
+def test_ignored_entries_are_marked(user, socket_client):
+    user['client'].get('/api/files/tree?path=/home/user&depth=1')
+    workspace = os.path.join(user['env']['path'], "home", "user")
+    os.makedirs(os.path.join(workspace, "target"), exist_ok=True)
+
+    delta = socket_client.wait_for('file_tree_delta', timeout=10)
+    nodes = {event['path']: event['node'] for event in delta['events'] if event['type'] == 'added'}
+    assert nodes['/home/user/target'].get('ignored') is True
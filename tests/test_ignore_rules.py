@@ -0,0 +1,60 @@
+import os
+
+from ignore_rules import IgnoreRules, IgnoreRulesCache, compile_pattern
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+def test_blank_lines_and_comments_are_skipped():
+    assert compile_pattern("") is None
+    assert compile_pattern("# comment") is None
+    regex, negate, dir_only, anchored = compile_pattern("\\#literal")
+    assert regex.match("#literal") and not negate
+
+def test_default_patterns_and_directory_only_rules(tmp_path):
+    root = str(tmp_path)
+    rules = IgnoreRules(root, ["target/", "*.log"])
+    assert rules.is_ignored(os.path.join(root, "target"), True)
+    assert not rules.is_ignored(os.path.join(root, "target"), False)
+    assert rules.is_ignored(os.path.join(root, "src", "debug.log"), False)
+    assert not rules.is_ignored(os.path.join(root, "src", "main.rs"), False)
+
+def test_gitignore_negation_and_anchoring(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, ".gitignore"), "*.tmp\n!keep.tmp\n/build\ndocs/**/*.html\n")
+    rules = IgnoreRules(root)
+    assert rules.is_ignored(os.path.join(root, "a.tmp"), False)
+    assert not rules.is_ignored(os.path.join(root, "keep.tmp"), False)
+    assert rules.is_ignored(os.path.join(root, "build"), True)
+    assert not rules.is_ignored(os.path.join(root, "src", "build"), True)
+    assert rules.is_ignored(os.path.join(root, "docs", "a", "b", "page.html"), False)
+
+def test_nested_ignore_file_and_ignored_parent(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, ".gitignore"), "out/\n")
+    write(os.path.join(root, "sub", ".ignore"), "*.rs\n")
+    write(os.path.join(root, "out", ".gitignore"), "!*\n")
+    rules = IgnoreRules(root)
+    assert rules.is_ignored(os.path.join(root, "sub", "main.rs"), False)
+    assert not rules.is_ignored(os.path.join(root, "main.rs"), False)
+    # 被忽略目录中的忽略文件不再生效
+    assert rules.is_ignored(os.path.join(root, "out", "file"), False)
+
+def test_rules_are_recompiled_when_the_file_changes(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, ".gitignore"), "*.a\n")
+    rules = IgnoreRules(root)
+    assert rules.is_ignored(os.path.join(root, "x.a"), False)
+    assert rules.is_ignored(os.path.join(root, "y.a"), False)
+    assert rules.get_stats()['hits'] >= 1
+
+    write(os.path.join(root, ".gitignore"), "*.bb\n")
+    assert not rules.is_ignored(os.path.join(root, "x.a"), False)
+    assert rules.is_ignored(os.path.join(root, "x.bb"), False)
+
+def test_cache_returns_one_instance_per_root(tmp_path):
+    cache = IgnoreRulesCache(["target/"])
+    assert cache.get(str(tmp_path)) is cache.get(str(tmp_path) + "/")
+    assert cache.get(str(tmp_path)) is not cache.get(str(tmp_path / "other"))
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from output_coalescer import OutputCoalescer
+from ring_buffer import RingBuffer
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+class FakeTerminal:
+    """一个终端的回滚缓冲区，记录暂停/恢复和推送的帧"""
+
+    def __init__(self, capacity=1 << 20):
+        self.buffer = RingBuffer(capacity)
+        self.frames = []
+        self.paused = []
+        self.lock = threading.Lock()
+
+    def write(self, coalescer, data):
+        end_offset = self.buffer.write(data)
+        coalescer.notify('t1', data, end_offset)
+
+    def read_output(self, terminal_id, offset, max_bytes):
+        return self.buffer.read(offset, max_bytes)
+
+    def pause_output(self, terminal_id):
+        self.paused.append(True)
+        return True
+
+    def resume_output(self, terminal_id):
+        self.paused.append(False)
+        return True
+
+    def emit_frame(self, terminal_id, data, end_offset):
+        with self.lock:
+            self.frames.append((bytes(data), end_offset))
+
+    def received(self):
+        with self.lock:
+            return b"".join(data for data, _ in self.frames)
+
+def make_coalescer(terminal, frame_rate=1000, frame_bytes=4, ack_window=8, backlog_limit=16, pause_timeout=60):
+    return OutputCoalescer(
+        terminal.read_output, terminal.pause_output, terminal.resume_output, terminal.emit_frame,
+        frame_rate, frame_bytes, ack_window, backlog_limit, pause_timeout
+    )
+
+def test_output_is_split_into_frames():
+    terminal = FakeTerminal()
+    coalescer = make_coalescer(terminal)
+    coalescer.attach('t1', 0, 0)
+    terminal.write(coalescer, b"abcdef")
+    wait_until(lambda: terminal.received() == b"abcdef")
+    assert [offset for _, offset in terminal.frames] == [4, 6]
+    assert coalescer.get_stats('t1')['frames_emitted'] == 2
+
+def test_sending_stops_at_the_ack_window():
+    terminal = FakeTerminal()
+    coalescer = make_coalescer(terminal)
+    coalescer.attach('t1', 0, 0)
+    terminal.write(coalescer, b"0123456789ab")
+    wait_until(lambda: len(terminal.received()) == 8)
+    time.sleep(0.05)
+    assert terminal.received() == b"01234567"
+
+    coalescer.ack('t1', 8)
+    wait_until(lambda: terminal.received() == b"0123456789ab")
+
+def test_reading_pauses_at_the_backlog_limit():
+    terminal = FakeTerminal()
+    coalescer = make_coalescer(terminal)
+    coalescer.attach('t1', 0, 0)
+    terminal.write(coalescer, b"x" * 16)
+    assert terminal.paused == [True]
+    assert coalescer.get_stats('t1')['paused'] is True
+
+    wait_until(lambda: len(terminal.received()) == 8)
+    coalescer.ack('t1', 8)
+    assert terminal.paused == [True, False]
+
+def test_backlog_is_dropped_after_the_pause_timeout():
+    terminal = FakeTerminal()
+    coalescer = make_coalescer(terminal, pause_timeout=0.05)
+    coalescer.attach('t1', 0, 0)
+    terminal.write(coalescer, b"a" * 8)
+    wait_until(lambda: len(terminal.received()) == 8)
+    terminal.write(coalescer, b"b" * 40 + b"tail")
+
+    # 客户端一直不确认：恢复读取，只推送最新的一帧并提示省略的字节数
+    wait_until(lambda: b"tail" in terminal.received())
+    assert terminal.paused == [True, False]
+    assert "[已省略 40 字节输出]".encode('utf-8') in terminal.received()
+    assert coalescer.get_stats('t1')['lagging'] is True
+
+def test_detach_resumes_a_paused_terminal():
+    terminal = FakeTerminal()
+    coalescer = make_coalescer(terminal)
+    coalescer.attach('t1', 0, 0)
+    terminal.write(coalescer, b"x" * 16)
+    coalescer.detach('t1')
+    assert terminal.paused == [True, False]
+    assert coalescer.get_stats('t1') is None
+    assert coalescer.get_stats()['pauses'] == 1
@@ -0,0 +1,41 @@
+import sys
+import time
+
+from process_runner import run_process, with_limits
+
+def test_captures_output_input_and_exit_code():
+    result = run_process(["sh", "-c", "cat; echo err >&2; exit 4"], input_data="hello\n", timeout=5)
+    assert (result['stdout'], result['stderr'], result['exit_code']) == ("hello\n", "err\n", 4)
+    assert not result['timed_out']
+    assert result['usage']['output_bytes'] == len("hello\nerr\n")
+
+def test_streams_output_to_callback():
+    chunks = []
+    result = run_process(["sh", "-c", "echo one; echo two >&2"], timeout=5,
+                         on_output=lambda stream, text: chunks.append((stream, text)))
+    assert result['stdout'] == result['stderr'] == ""
+    assert sorted(chunks) == [('stderr', 'two\n'), ('stdout', 'one\n')]
+
+def test_timeout_kills_process_group():
+    start = time.time()
+    result = run_process(["sh", "-c", "sleep 30 & sleep 30"], timeout=0.5)
+    assert result['timed_out']
+    assert time.time() - start < 5
+
+def test_process_that_closes_its_streams_still_times_out():
+    start = time.time()
+    result = run_process(["sh", "-c", "exec >/dev/null 2>&1; sleep 30"], timeout=0.5)
+    assert result['timed_out']
+    assert time.time() - start < 5
+
+def test_process_that_closes_its_streams_is_waited_for():
+    result = run_process(["sh", "-c", "exec >/dev/null 2>&1; sleep 0.3; exit 7"], timeout=5)
+    assert (result['timed_out'], result['exit_code']) == (False, 7)
+    assert result['wall_time'] >= 0.3
+
+def test_limits_are_applied():
+    assert with_limits(["true"]) == ["true"]
+    result = run_process(["sh", "-c", "ulimit -v; ulimit -t"], timeout=5, memory_mb=64, cpu_seconds=3)
+    assert result['stdout'].split() == [str(64 * 1024), "3"]
+    result = run_process([sys.executable, "-c", "b = bytearray(256 * 1024 * 1024)"], timeout=10, memory_mb=64)
+    assert result['exit_code'] != 0
@@ -0,0 +1,37 @@
+from ring_buffer import RingBuffer, utf8_continuation_length
+
+def test_read_across_wraparound():
+    buffer = RingBuffer(8)
+    buffer.write(b"abcdef")
+    data, offset, missed = buffer.read(0)
+    assert (data, offset, missed) == (b"abcdef", 6, 0)
+
+    buffer.write(b"ghij")
+    data, offset, missed = buffer.read(6)
+    assert (data, offset, missed) == (b"ghij", 10, 0)
+    assert buffer.start_offset == 2
+
+def test_overwritten_cursor_reports_missed_bytes():
+    buffer = RingBuffer(4)
+    buffer.write(b"0123456789")
+    data, offset, missed = buffer.read(3)
+    assert (data, offset, missed) == (b"6789", 10, 3)
+    assert buffer.get_stats()['overruns'] == 1
+
+def test_max_bytes_limits_a_read():
+    buffer = RingBuffer(16)
+    buffer.write(b"hello world")
+    assert buffer.read(0, max_bytes=5) == (b"hello", 5, 0)
+    assert buffer.read(5, max_bytes=100) == (b" world", 11, 0)
+
+def test_wait_returns_when_data_arrives():
+    buffer = RingBuffer(4)
+    assert buffer.wait(0, 0.01) is False
+    buffer.write(b"x")
+    assert buffer.wait(0, 0.01) is True
+
+def test_utf8_continuation_length():
+    encoded = "中文".encode('utf-8')
+    assert utf8_continuation_length(encoded) == 0
+    assert utf8_continuation_length(encoded[1:]) == 2
+    assert utf8_continuation_length(encoded[2:]) == 1
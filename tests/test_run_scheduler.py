@@ -0,0 +1,69 @@
+import threading
+import time
+
+from run_scheduler import RunScheduler
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+def blocking_job(release, started=None, result=None):
+    def run():
+        if started is not None:
+            started.set()
+        release.wait(5)
+        return result
+    return run
+
+def test_job_runs_and_keeps_its_result():
+    scheduler = RunScheduler(1, 10, 5, 1.0)
+    job = scheduler.submit('u1', lambda: {"status": "success"})
+    assert job['state'] in ('queued', 'running', 'done')
+    wait_until(lambda: scheduler.get_job(job['job_id'])['state'] == 'done')
+    assert scheduler.get_job(job['job_id'])['result'] == {"status": "success"}
+    assert scheduler.get_stats()['completed'] == 1
+
+def test_exception_becomes_an_error_result():
+    scheduler = RunScheduler(1, 10, 5, 1.0)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    job = scheduler.submit('u1', fail)
+    wait_until(lambda: scheduler.get_job(job['job_id'])['state'] == 'done')
+    assert scheduler.get_job(job['job_id'])['result'] == {"status": "error", "message": "boom"}
+
+def test_queue_limits_reject_new_jobs():
+    release = threading.Event()
+    started = threading.Event()
+    scheduler = RunScheduler(1, 2, 1, 1.0)
+    scheduler.submit('u1', blocking_job(release, started))
+    assert started.wait(5)
+
+    assert scheduler.submit('u1', blocking_job(release))
+    assert scheduler.submit('u1', blocking_job(release)) is None  # 每个用户最多排队 1 个
+    assert scheduler.submit('u2', blocking_job(release))
+    assert scheduler.submit('u3', blocking_job(release)) is None  # 队列已满
+    assert scheduler.get_stats()['rejected'] == 2
+    release.set()
+
+def test_users_take_turns_and_one_user_runs_one_job_at_a_time():
+    release = threading.Event()
+    started = threading.Event()
+    order = []
+    scheduler = RunScheduler(2, 10, 5, 2.0)
+    scheduler.submit('busy', blocking_job(release, started))
+    assert started.wait(5)
+
+    # busy 用户已有任务在运行，它排队的任务要等前一个结束，空闲的 worker 先运行其他用户的任务
+    queued = scheduler.submit('busy', lambda: order.append('busy'))
+    other = scheduler.submit('other', lambda: order.append('other'))
+    assert queued['queue_position'] == 1
+    assert other['queue_position'] == 2
+    wait_until(lambda: order == ['other'])
+    assert scheduler.get_job(queued['job_id'])['state'] == 'queued'
+
+    release.set()
+    wait_until(lambda: order == ['other', 'busy'])
@@ -0,0 +1,26 @@
+import shutil
+
+import pytest
+
+pytestmark = pytest.mark.skipif(shutil.which("cargo") is None, reason="需要 cargo")
+
+def test_run_rust_streams_output_and_finishes(socket_client):
+    code = 'fn main() { println!("hello from test"); eprintln!("to stderr"); }'
+    socket_client.emit('run_rust', {'code': code})
+    events = []
+    result = socket_client.wait_for('run_finished', timeout=120, collected=events)
+
+    assert result['status'] == 'success', result
+    assert result['exit_code'] == 0
+    names = [event['name'] for event in events]
+    assert names[0] == 'run_queued'
+    outputs = [event['args'][0] for event in events if event['name'] == 'run_output']
+    stdout = ''.join(chunk['data'] for chunk in outputs if chunk['stream'] == 'stdout')
+    stderr = ''.join(chunk['data'] for chunk in outputs if chunk['stream'] == 'stderr')
+    assert stdout == 'hello from test\n'
+    assert stderr == 'to stderr\n'
+
+def test_run_rust_reports_compile_error(socket_client):
+    socket_client.emit('run_rust', {'code': 'fn main() { let x: i32 = "no"; }'})
+    result = socket_client.wait_for('run_finished', timeout=120)
+    assert result['status'] == 'compile_error'
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from sandbox_pool import SandboxPool
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(max_per_env=1, idle_timeout=60, spawn_timeout=5)
+    yield pool
+    pool.close_environment('env')
+
+def run(pool, command, input_data="", timeout=5, cwd='/tmp'):
+    return pool.execute('env', ['sh'], command, cwd, input_data, timeout=timeout)
+
+def test_reuses_worker_and_reports_exit_code(pool):
+    first = run(pool, 'echo hello; echo oops >&2; exit 3')
+    assert first['status'] == 'success'
+    assert (first['output'], first['error'], first['exit_code']) == ('hello\n', 'oops\n', 3)
+    assert run(pool, 'cat', input_data='line one\nline two')['output'] == 'line one\nline two\n'
+    stats = pool.get_stats()
+    assert (stats['spawned'], stats['reused']) == (1, 1)
+
+def test_syntax_error_returns_immediately(pool):
+    start = time.time()
+    result = run(pool, 'echo "unbalanced', timeout=10)
+    assert time.time() - start < 5
+    assert result['status'] == 'success'
+    assert result['exit_code'] != 0
+    assert run(pool, 'echo )')['exit_code'] != 0
+    assert run(pool, 'echo still alive')['output'] == 'still alive\n'
+    assert pool.get_stats()['spawned'] == 1
+
+def test_command_cannot_change_the_resident_shell(pool):
+    run(pool, 'true ); cd /; export LEAK=1; (true')
+    run(pool, 'cd /; export LEAK=1; trap "echo trapped" EXIT')
+    result = run(pool, 'pwd; echo "leak=${LEAK:-}"')
+    assert result['output'] == '/tmp\nleak=\n'
+
+def test_timeout_discards_worker(pool):
+    assert run(pool, 'sleep 5', timeout=0.5)['status'] == 'timeout'
+    assert pool.get_stats()['discarded'] == 1
+    assert run(pool, 'echo fresh')['output'] == 'fresh\n'
+
+def test_close_environment_ends_busy_workers_when_they_return(pool):
+    import threading
+    thread = threading.Thread(target=run, args=(pool, 'sleep 0.5'))
+    thread.start()
+    time.sleep(0.2)
+    pool.close_environment('env')
+    thread.join()
+    stats = pool.get_stats()
+    assert (stats['live'], stats['idle']) == (0, 0)
@@ -0,0 +1,33 @@
+import types
+
+import pytest
+
+import terminal_backend
+from terminal_backend import BACKEND_FUNCTIONS, load_terminal_backend
+
+def test_preferred_backend_is_loaded():
+    name, module = load_terminal_backend('subprocess')
+    assert name == 'subprocess'
+    assert all(hasattr(module, function) for function in BACKEND_FUNCTIONS)
+
+def test_unavailable_backend_falls_back(monkeypatch):
+    real_import = terminal_backend.importlib.import_module
+
+    def import_module(module_name):
+        if module_name == 'cpp_bindings':
+            raise OSError("libterminal.so: cannot open shared object file")
+        if module_name == 'python_terminal':
+            return types.ModuleType(module_name)  # 缺少包装函数
+        return real_import(module_name)
+
+    monkeypatch.setattr(terminal_backend.importlib, 'import_module', import_module)
+    assert load_terminal_backend('cpp')[0] == 'subprocess'
+    assert load_terminal_backend('unknown')[0] == 'subprocess'
+
+def test_no_usable_backend_raises(monkeypatch):
+    def import_module(module_name):
+        raise ImportError(module_name)
+
+    monkeypatch.setattr(terminal_backend.importlib, 'import_module', import_module)
+    with pytest.raises(ImportError):
+        load_terminal_backend()
@@ -0,0 +1,32 @@
+import time
+
+import pytest
+
+from config import Config
+
+def python_manager():
+    from python_terminal import PythonTerminalManager
+    return PythonTerminalManager()
+
+def cpp_manager():
+    try:
+        from cpp_bindings import CppTerminalManager
+    except OSError:
+        pytest.skip("libterminal.so 不可用")
+    return CppTerminalManager()
+
+@pytest.fixture(params=[python_manager, cpp_manager], ids=['pty', 'cpp'])
+def manager(request):
+    return request.param()
+
+def test_write_input_gives_up_when_the_program_stops_reading(manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'TERMINAL_INPUT_TIMEOUT', 0.5)
+    session_id = manager.create_session(str(tmp_path))
+    try:
+        assert manager.write_input(session_id, "stty raw -echo; sleep 30\n")
+        time.sleep(0.3)
+        start = time.time()
+        assert manager.write_input(session_id, b"x" * (4 * 1024 * 1024)) is False
+        assert time.time() - start < 3
+    finally:
+        manager.close_session(session_id)
@@ -0,0 +1,68 @@
+import os
+import threading
+
+from terminal_mux import TerminalMultiplexer
+
+def test_data_and_close_callbacks():
+    mux = TerminalMultiplexer()
+    read_fd, write_fd = os.pipe()
+    received = []
+    closed = threading.Event()
+    got_data = threading.Event()
+
+    def on_data(view):
+        received.append(bytes(view))
+        got_data.set()
+
+    mux.register(read_fd, on_data, closed.set)
+    os.write(write_fd, b"hello")
+    assert got_data.wait(5)
+    assert b"".join(received) == b"hello"
+    assert mux.get_stats()['watched_fds'] == 1
+
+    os.close(write_fd)
+    assert closed.wait(5)
+    assert mux.get_stats()['watched_fds'] == 0
+    os.close(read_fd)
+
+def test_paused_fd_is_not_read_until_resumed():
+    mux = TerminalMultiplexer()
+    read_fd, write_fd = os.pipe()
+    got_data = threading.Event()
+    mux.register(read_fd, lambda view: got_data.set())
+
+    assert mux.pause(read_fd)
+    assert mux.get_stats()['paused_fds'] == 1
+    os.write(write_fd, b"x")
+    assert not got_data.wait(0.1)
+
+    assert mux.resume(read_fd)
+    assert got_data.wait(5)
+    assert mux.resume(read_fd) is False
+    assert mux.unregister(read_fd)
+    os.close(read_fd)
+    os.close(write_fd)
+
+def test_custom_reader_is_used():
+    mux = TerminalMultiplexer()
+    read_fd, write_fd = os.pipe()
+    received = threading.Event()
+    chunks = []
+
+    def read_into(buffer):
+        data = os.read(read_fd, 3)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def on_data(view):
+        chunks.append(bytes(view))
+        if b"".join(chunks) == b"abcdef":
+            received.set()
+
+    mux.register(read_fd, on_data, read_into=read_into)
+    os.write(write_fd, b"abcdef")
+    assert received.wait(5)
+    assert all(len(chunk) <= 3 for chunk in chunks)
+    mux.unregister(read_fd)
+    os.close(read_fd)
+    os.close(write_fd)
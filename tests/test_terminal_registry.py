@@ -0,0 +1,68 @@
+import time
+
+from terminal_registry import TerminalRegistry
+
+def make_registry(grace_period=60, idle_timeout=600, max_sessions=10):
+    closed = []
+    return TerminalRegistry(closed.append, grace_period, idle_timeout, max_sessions), closed
+
+def test_only_the_owner_can_reattach():
+    registry, closed = make_registry()
+    registry.register('t1', 'alice', 'sid-1')
+    assert registry.attach('t1', 'bob', 'sid-2') == (False, None)
+    assert registry.attach('t1', 'alice', 'sid-2') == (True, 'sid-1')
+    assert registry.attach('missing', 'alice', 'sid-2') == (False, None)
+    assert registry.get_stats()['reattached'] == 1
+
+def test_detach_ignores_a_stale_connection():
+    registry, closed = make_registry()
+    registry.register('t1', 'alice', 'sid-1')
+    registry.attach('t1', 'alice', 'sid-2')
+    assert registry.detach('t1', 'sid-1') is False
+    assert registry.detach('t1', 'sid-2') is True
+    assert registry.get_user_terminals('alice')[0]['attached'] is False
+
+def test_detached_sessions_expire_after_the_grace_period():
+    registry, closed = make_registry(grace_period=60)
+    registry.register('kept', 'alice', 'sid-1')
+    registry.register('gone', 'alice', 'sid-2')
+    registry.detach('gone', 'sid-2')
+    registry.terminals['gone']['detached_at'] = time.time() - 61
+    registry.reap()
+    assert closed == ['gone']
+    assert [t['terminal_id'] for t in registry.get_user_terminals('alice')] == ['kept']
+    assert registry.get_stats()['expired'] == 1
+
+def test_idle_sessions_are_reaped():
+    registry, closed = make_registry(idle_timeout=600)
+    registry.register('idle', 'alice', 'sid-1')
+    registry.register('active', 'alice', 'sid-2')
+    registry.terminals['idle']['last_activity'] = time.time() - 601
+    registry.reap()
+    assert closed == ['idle']
+    assert registry.get_stats()['reaped'] == 1
+
+def test_least_recently_active_session_is_evicted_at_the_limit():
+    registry, closed = make_registry(max_sessions=2)
+    registry.register('t1', 'alice')
+    registry.register('t2', 'bob')
+    registry.touch('t1')
+    registry.register('t3', 'carol')
+    assert closed == ['t2']
+    assert registry.get_stats()['live'] == 2
+
+def test_close_errors_do_not_stop_other_closes(capsys):
+    def close(terminal_id):
+        if terminal_id == 't1':
+            raise RuntimeError("boom")
+        closed.append(terminal_id)
+
+    closed = []
+    registry = TerminalRegistry(close, 60, 600, 10)
+    registry.register('t1', 'alice')
+    registry.register('t2', 'alice')
+    for terminal in registry.terminals.values():
+        terminal['last_activity'] = 0
+    registry.reap()
+    assert closed == ['t2']
+    assert "boom" in capsys.readouterr().out
@@ -0,0 +1,87 @@
+from config import Config
+
+def start_terminal(socket_client):
+    socket_client.emit('start_terminal')
+    started = socket_client.wait_for('terminal_started')
+    assert started['stream'] is True
+    return started['terminal_id']
+
+def read_frames(socket_client, until, timeout=10):
+    """收集 terminal_output 帧（二进制 data），直到 until(已收到的字节) 为真，返回 (字节, 最后的偏移量)"""
+    received = bytearray()
+    offset = None
+    while not until(received):
+        frame = socket_client.wait_for('terminal_output', timeout)
+        if 'data' in frame:
+            received.extend(frame['data'])
+            offset = frame['offset']
+    return bytes(received), offset
+
+def test_terminal_streams_interactive_input(socket_client):
+    start_terminal(socket_client)
+    # 程序运行中逐次写入的原始输入直接到达程序，输出立即推送
+    socket_client.emit('terminal_stream_input', {'data': 'echo ready-$((1+1)); read name; echo "hi-$name"\n'})
+    read_frames(socket_client, lambda data: b'ready-2' in data)
+    socket_client.emit('terminal_stream_input', {'data': 'web\n'})
+    output, _ = read_frames(socket_client, lambda data: b'hi-web' in data)
+    assert b'hi-web' in output
+
+def test_terminal_frame_is_delivered(socket_client):
+    start_terminal(socket_client)
+    socket_client.emit('terminal_stream_input', {'data': 'echo frame-$((40+2))\n'})
+    output, offset = read_frames(socket_client, lambda data: b'frame-42' in data)
+    assert offset >= len(output)
+
+def test_terminal_output_pauses_at_ack_window(socket_client):
+    start_terminal(socket_client)
+    total = Config.TERMINAL_ACK_WINDOW * 3
+    socket_client.emit('terminal_stream_input', {'data': f"yes x | head -c {total}; echo; echo end-$((6*7))\n"})
+
+    # 不确认时，已发送未确认的输出不超过确认窗口（加上最后一帧）
+    output, offset = read_frames(socket_client, lambda data: len(data) >= Config.TERMINAL_ACK_WINDOW)
+    assert len(output) <= Config.TERMINAL_ACK_WINDOW + Config.TERMINAL_FRAME_BYTES
+    events = []
+    try:
+        socket_client.wait_for('never', timeout=1, collected=events)
+    except AssertionError:
+        pass
+    assert not [event for event in events if event['name'] == 'terminal_output']
+
+    # 确认后继续推送，直到命令结束
+    received = bytearray(output)
+    while b'end-42' not in received:
+        socket_client.emit('terminal_ack', {'offset': offset})
+        chunk, next_offset = read_frames(socket_client, lambda data: len(data) > 0)
+        received.extend(chunk)
+        offset = next_offset
+    assert received.count(b'x') >= total // 2
+
+def test_reconnected_client_replays_scrollback(socket_client, connect_socket):
+    terminal_id = start_terminal(socket_client)
+    socket_client.emit('terminal_stream_input', {'data': 'echo before-$((1+2))\n'})
+    read_frames(socket_client, lambda data: b'before-3' in data)
+    socket_client.disconnect()
+
+    # 新连接从偏移量 0 重放回滚缓冲区，之后的输出继续推送到新连接
+    client = connect_socket()
+    client.emit('attach_terminal', {'terminal_id': terminal_id, 'offset': 0})
+    attached = client.wait_for('terminal_attached')
+    assert attached['terminal_id'] == terminal_id
+    assert attached['offset'] == 0
+    replayed, _ = read_frames(client, lambda data: b'before-3' in data)
+    assert b'before-3' in replayed
+    client.emit('terminal_stream_input', {'data': 'echo after-$((2+2))\n'})
+    read_frames(client, lambda data: b'after-4' in data)
+
+def test_attach_to_unknown_terminal_fails(socket_client):
+    socket_client.emit('attach_terminal', {'terminal_id': 'no-such-terminal', 'offset': 0})
+    failed = socket_client.wait_for('terminal_attach_failed')
+    assert failed == {'terminal_id': 'no-such-terminal', 'message': 'Terminal not found'}
+
+def test_idle_terminal_is_closed(ide, user, socket_client, monkeypatch):
+    terminal_id = start_terminal(socket_client)
+    monkeypatch.setattr(ide.terminal_registry, 'idle_timeout', -1)
+    ide.terminal_registry.reap()
+    closed = socket_client.wait_for('terminal_closed')
+    assert closed == {'terminal_id': terminal_id}
+    assert ide.terminal_registry.get_user_terminals(user['user_id']) == []
@@ -0,0 +1,29 @@
+from usage_stats import UsageStats
+
+def test_totals_cover_only_the_history_window():
+    stats = UsageStats(history_size=2)
+    stats.record('u1', 'run', {'user_cpu': 1.0, 'sys_cpu': 0.5, 'wall_time': 2.0, 'output_bytes': 10})
+    stats.record('u1', 'build', {'user_cpu': 2.0, 'sys_cpu': 0.0, 'wall_time': 3.0, 'output_bytes': 0, 'max_rss_kb': 900})
+    stats.record('u1', 'run', {'user_cpu': 4.0, 'sys_cpu': 1.0, 'wall_time': 5.0, 'output_bytes': 5, 'max_rss_kb': 100})
+
+    summary = stats.get_user_summary('u1')
+    assert summary['executions'] == 2
+    assert summary['user_cpu'] == 6.0
+    assert summary['sys_cpu'] == 1.0
+    assert summary['output_bytes'] == 5
+    assert summary['peak_rss_kb'] == 900
+    assert [entry['kind'] for entry in summary['recent']] == ['build', 'run']
+
+def test_empty_usage_is_ignored():
+    stats = UsageStats(history_size=5)
+    stats.record('u1', 'run', None)
+    assert stats.get_user_summary('u1')['executions'] == 0
+
+def test_top_users_are_ranked_by_cpu_time():
+    stats = UsageStats(history_size=5)
+    stats.record('light', 'run', {'user_cpu': 0.1, 'sys_cpu': 0.1})
+    stats.record('heavy', 'run', {'user_cpu': 3.0, 'sys_cpu': 1.0})
+    ranking = stats.get_top_users()
+    assert [item['user_id'] for item in ranking] == ['heavy', 'light']
+    assert ranking[0]['cpu_time'] == 4.0
+    assert stats.get_top_users(limit=1) == ranking[:1]
@@ -0,0 +1,60 @@
+import json
+import os
+
+from user_store import UserDB
+
+def test_environment_and_initialization_state(tmp_path):
+    db = UserDB(str(tmp_path / "users.sqlite3"))
+    try:
+        assert db.get_user_environment('u1') is None
+        assert db.set_user_environment('u1', 'env-1')
+        assert db.get_user_environment('u1') == 'env-1'
+        assert db.is_proot_initialized('u1') is False
+        assert db.set_proot_initialized('u1')
+        assert db.is_proot_initialized('u1') is True
+        assert db.list_environments() == [('u1', 'env-1', True)]
+    finally:
+        db.close()
+
+def test_last_used_is_batched_until_flush(tmp_path):
+    db = UserDB(str(tmp_path / "users.sqlite3"), flush_interval=3600)
+    try:
+        assert db.update_last_used('u1')
+        assert db.update_last_used('u2')
+        assert db.get_stats()['pending'] == 2
+        assert db.count_users() == 0
+        assert db.flush() == 2
+        assert db.count_users() == 2
+        assert db.get_stats()['pending'] == 0
+    finally:
+        db.close()
+
+def test_close_writes_pending_updates(tmp_path):
+    path = str(tmp_path / "users.sqlite3")
+    db = UserDB(path, flush_interval=3600)
+    db.set_user_environment('u1', 'env-1')
+    db.update_last_used('u2')
+    db.close()
+    assert db.update_last_used('u3') is False
+
+    reopened = UserDB(path)
+    try:
+        assert reopened.count_users() == 2
+        assert reopened.get_user_environment('u1') == 'env-1'
+    finally:
+        reopened.close()
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = str(tmp_path / "user_db.json")
+    with open(legacy, "w", encoding="utf-8") as f:
+        json.dump({"u1": {"environment_id": "env-1", "proot_initialized": True}, "bad": "entry"}, f)
+
+    db = UserDB(str(tmp_path / "users.sqlite3"), legacy_json_path=legacy)
+    try:
+        assert db.get_user_environment('u1') == 'env-1'
+        assert db.is_proot_initialized('u1') is True
+        assert db.count_users() == 1
+        assert not os.path.exists(legacy)
+        assert os.path.exists(legacy + ".migrated")
+    finally:
+        db.close()
@@ -0,0 +1,90 @@
+import os
+import queue
+
+import pytest
+
+from workspace_watcher import WorkspaceWatcher
+
+def scan(path):
+    with os.scandir(path) as iterator:
+        return sorted(((entry.name, entry.is_dir()) for entry in iterator), key=lambda item: (not item[1], item[0]))
+
+@pytest.fixture(params=['inotify', 'polling'])
+def watched(request, tmp_path):
+    """订阅一个环境并缓存其工作区根目录，返回 (watcher, 工作区, 变更队列)"""
+    deltas = queue.Queue()
+    watcher = WorkspaceWatcher(lambda env_path, user_id, events: deltas.put(events),
+                               backend=request.param, debounce=0.05, poll_interval=0.05)
+    if request.param == 'inotify' and watcher.backend != 'inotify':
+        pytest.skip("inotify 不可用")
+    env_path = str(tmp_path)
+    workspace = os.path.join(env_path, "home", "user")
+    os.makedirs(workspace)
+    watcher.subscribe(env_path, 'u1')
+    watcher.scan_directory(env_path, workspace, scan)
+    yield watcher, env_path, workspace, deltas
+    watcher.unsubscribe(env_path)
+
+def next_events(deltas, timeout=5):
+    try:
+        return deltas.get(timeout=timeout)
+    except queue.Empty:
+        raise AssertionError("没有收到文件变更")
+
+def test_cached_directory_is_not_read_again(watched):
+    watcher, env_path, workspace, _ = watched
+
+    def fail(path):
+        raise AssertionError("不应读取磁盘")
+
+    assert watcher.scan_directory(env_path, workspace, fail) == []
+    assert watcher.get_stats()['cache_hits'] == 1
+
+def test_unsubscribed_environment_is_not_cached(tmp_path):
+    watcher = WorkspaceWatcher(lambda *args: None, backend='polling')
+    calls = []
+    for _ in range(2):
+        watcher.scan_directory(str(tmp_path), str(tmp_path), lambda path: calls.append(path) or [])
+    assert len(calls) == 2
+
+def test_new_and_removed_files_are_pushed(watched):
+    watcher, env_path, workspace, deltas = watched
+    path = os.path.join(workspace, "a.rs")
+    with open(path, "w") as f:
+        f.write("fn main() {}\n")
+    events = next_events(deltas)
+    assert {'type': 'added', 'path': '/home/user/a.rs', 'is_dir': False} in events
+    assert watcher.scan_directory(env_path, workspace, scan) == [('a.rs', False)]
+
+    os.remove(path)
+    events = next_events(deltas)
+    assert {'type': 'removed', 'path': '/home/user/a.rs', 'is_dir': False} in events
+    assert watcher.scan_directory(env_path, workspace, scan) == []
+
+def test_refresh_pushes_changes_immediately(watched):
+    watcher, env_path, workspace, deltas = watched
+    os.makedirs(os.path.join(workspace, "src"))
+    watcher.refresh(env_path, [os.path.join(workspace, "src")])
+    events = next_events(deltas, timeout=0.01)
+    assert events == [{'type': 'added', 'path': '/home/user/src', 'is_dir': True}]
+
+def test_too_many_changes_become_one_invalidation(watched):
+    watcher, env_path, workspace, deltas = watched
+    watcher.max_events = 3
+    watcher.debounce = 10  # 只由 refresh 推送，避免后台线程中途分批
+    for index in range(5):
+        open(os.path.join(workspace, f"f{index}"), "w").close()
+    watcher.refresh(env_path, [workspace])
+    events = next_events(deltas)
+    assert events == [{'type': 'invalidated', 'path': '/home/user'}]
+
+def test_rename_is_paired_with_inotify(watched):
+    watcher, env_path, workspace, deltas = watched
+    if watcher.backend != 'inotify':
+        pytest.skip("轮询只能检测到删除和新增")
+    open(os.path.join(workspace, "old.txt"), "w").close()
+    next_events(deltas)
+    os.rename(os.path.join(workspace, "old.txt"), os.path.join(workspace, "new.txt"))
+    events = next_events(deltas)
+    assert events == [{'type': 'renamed', 'path': '/home/user/new.txt', 'is_dir': False,
+                       'old_path': '/home/user/old.txt'}]
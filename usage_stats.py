@@ -0,0 +1,63 @@
+import time
+import threading
+from collections import deque
+
+USAGE_FIELDS = ('user_cpu', 'sys_cpu', 'wall_time', 'output_bytes')
+
+class UsageStats:
+    """按用户滚动记录最近若干次执行的资源使用情况"""
+
+    def __init__(self, history_size):
+        self.history_size = history_size
+        self.lock = threading.Lock()
+        self.history = {}  # user_id -> deque(记录)
+        self.totals = {}  # user_id -> 窗口内各字段的累计值
+
+    def record(self, user_id, kind, usage):
+        """记录一次执行，kind 为 build / run / command"""
+        if not usage:
+            return
+        user_key = str(user_id)
+        entry = dict(usage, kind=kind, timestamp=time.time())
+
+        with self.lock:
+            records = self.history.setdefault(user_key, deque())
+            totals = self.totals.setdefault(user_key, dict.fromkeys(USAGE_FIELDS, 0))
+            records.append(entry)
+            self._add(totals, entry, 1)
+            if len(records) > self.history_size:
+                self._add(totals, records.popleft(), -1)
+
+    def _add(self, totals, entry, sign):
+        for field in USAGE_FIELDS:
+            totals[field] += sign * (entry.get(field) or 0)
+
+    def get_user_summary(self, user_id, recent=10):
+        user_key = str(user_id)
+        with self.lock:
+            records = list(self.history.get(user_key, ()))
+            totals = dict(self.totals.get(user_key, dict.fromkeys(USAGE_FIELDS, 0)))
+
+        rss_values = [r['max_rss_kb'] for r in records if r.get('max_rss_kb')]
+        summary = {field: round(value, 3) for field, value in totals.items()}
+        summary.update(
+            executions=len(records),
+            peak_rss_kb=max(rss_values) if rss_values else None,
+            recent=records[-recent:]
+        )
+        return summary
+
+    def get_top_users(self, limit=10):
+        """按窗口内 CPU 时间（用户态 + 内核态）排序的用户"""
+        with self.lock:
+            ranking = [
+                {
+                    'user_id': user_key,
+                    'cpu_time': round(totals['user_cpu'] + totals['sys_cpu'], 3),
+                    'wall_time': round(totals['wall_time'], 3),
+                    'executions': len(self.history[user_key])
+                }
+                for user_key, totals in self.totals.items()
+            ]
+        ranking.sort(key=lambda item: item['cpu_time'], reverse=True)
+        return ranking[:limit]
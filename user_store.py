@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    environment_id TEXT,
+    environment_type TEXT,
+    created_at REAL,
+    last_used REAL,
+    proot_initialized INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+class UserDB:
+    """用户数据（环境 ID、初始化状态、最近使用时间），保存在 SQLite 中
+
+    使用 WAL 模式，每次修改只更新对应用户的一行，写入开销与用户数无关；
+    每次写入都是一个事务，进程崩溃不会损坏数据库。
+    最近使用时间只记录在内存中，由后台线程每 flush_interval 秒（或积累 flush_threshold
+    个用户后）批量写入，请求处理中不读写磁盘；close() 时写入剩余的记录。
+    首次启动时如果存在旧版的 JSON 文件（legacy_json_path），将其导入数据库，
+    并重命名为 .migrated，之后不再读取。
+    """
+
+    def __init__(self, db_path, legacy_json_path=None, flush_interval=30, flush_threshold=1000):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.flush_threshold = max(1, flush_threshold)
+        self.lock = threading.Lock()
+        self.pending_condition = threading.Condition()
+        self.pending_last_used = {}  # user_id -> 尚未写入的最近使用时间
+        self.closed = False
+        self.counters = {'updates': 0, 'flushes': 0, 'flushed_rows': 0, 'flush_errors': 0}
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # WAL 模式下仍然保证崩溃后一致
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute(SCHEMA)
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self._migrate_json(legacy_json_path)
+
+        self.flusher = threading.Thread(target=self._flush_loop, name="user-db-flusher", daemon=True)
+        self.flusher.start()
+
+    def _migrate_json(self, json_path):
+        """导入旧版 user_db.json（已存在的用户不覆盖，重复导入无副作用）"""
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"读取旧用户数据库失败: {e}")
+            return
+
+        rows = [
+            (
+                str(user_id),
+                user.get('environment_id'),
+                user.get('environment_type'),
+                user.get('created_at'),
+                user.get('last_used'),
+                1 if user.get('proot_initialized') else 0
+            )
+            for user_id, user in data.items()
+            if isinstance(user, dict)
+        ]
+        try:
+            with self.lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO users (user_id, environment_id, environment_type, "
+                        "created_at, last_used, proot_initialized) VALUES (?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            os.replace(json_path, json_path + ".migrated")
+            print(f"已从 {json_path} 导入 {len(rows)} 个用户")
+        except Exception as e:
+            print(f"导入旧用户数据库失败: {e}")
+
+    def _execute(self, sql, params=()):
+        """执行一条写入语句，返回影响的行数，失败返回 None"""
+        try:
+            with self.lock:
+                return self.conn.execute(sql, params).rowcount
+        except sqlite3.Error as e:
+            print(f"保存数据库失败: {e}")
+            return None
+
+    def _query_one(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def get_user_environment(self, user_id):
+        row = self._query_one("SELECT environment_id FROM users WHERE user_id = ?", (str(user_id),))
+        return row[0] if row else None
+
+    def set_user_environment(self, user_id, env_id, env_type="proot"):
+        now = time.time()
+        return self._execute(
+            "INSERT INTO users (user_id, environment_id, environment_type, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+            "environment_id = excluded.environment_id, environment_type = excluded.environment_type, "
+            "created_at = excluded.created_at, last_used = excluded.last_used",
+            (str(user_id), env_id, env_type, now, now)
+        ) is not None
+
+    def update_last_used(self, user_id):
+        """记录最近使用时间（只写内存，由后台线程批量写入，数据库中没有的用户写入时新建记录）
+
+        close() 之后不再记录，返回 False。
+        """
+        with self.pending_condition:
+            if self.closed:
+                return False
+            self.pending_last_used[str(user_id)] = time.time()
+            self.counters['updates'] += 1
+            if len(self.pending_last_used) >= self.flush_threshold:
+                self.pending_condition.notify()
+        return True
+
+    def _flush_loop(self):
+        while True:
+            with self.pending_condition:
+                self.pending_condition.wait_for(
+                    lambda: self.closed or len(self.pending_last_used) >= self.flush_threshold,
+                    self.flush_interval
+                )
+                if self.closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """把内存中的最近使用时间写入数据库（一个事务）"""
+        with self.pending_condition:
+            pending, self.pending_last_used = self.pending_last_used, {}
+        if not pending:
+            return 0
+
+        rows = list(pending.items())
+        try:
+            with self.lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # 取较大值，避免覆盖 set_user_environment 刚写入的更新时间
+                    self.conn.executemany(
+                        "INSERT INTO users (user_id, last_used) VALUES (?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET "
+                        "last_used = MAX(COALESCE(last_used, 0), excluded.last_used)",
+                        rows
+                    )
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            print(f"保存数据库失败: {e}")
+            with self.pending_condition:
+                # 放回待写入记录，保留较新的时间
+                for user_id, last_used in pending.items():
+                    if last_used > self.pending_last_used.get(user_id, 0):
+                        self.pending_last_used[user_id] = last_used
+                self.counters['flush_errors'] += 1
+            return 0
+
+        with self.pending_condition:
+            self.counters['flushes'] += 1
+            self.counters['flushed_rows'] += len(rows)
+        return len(rows)
+
+    def set_proot_initialized(self, user_id, initialized=True):
+        """设置 proot 环境初始化状态"""
+        return self._execute(
+            "INSERT INTO users (user_id, proot_initialized) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET proot_initialized = excluded.proot_initialized",
+            (str(user_id), 1 if initialized else 0)
+        ) is not None
+
+    def is_proot_initialized(self, user_id):
+        """检查 proot 环境是否已初始化"""
+        row = self._query_one("SELECT proot_initialized FROM users WHERE user_id = ?", (str(user_id),))
+        return bool(row and row[0])
+
+    def list_environments(self):
+        """所有记录了环境的用户，返回 [(user_id, environment_id, proot_initialized)]"""
+        with self.lock:
+            return [
+                (user_id, env_id, bool(initialized))
+                for user_id, env_id, initialized in self.conn.execute(
+                    "SELECT user_id, environment_id, proot_initialized FROM users WHERE environment_id IS NOT NULL"
+                )
+            ]
+
+    def count_users(self):
+        return self._query_one("SELECT COUNT(*) FROM users")[0]
+
+    def get_stats(self):
+        with self.pending_condition:
+            return dict(self.counters, pending=len(self.pending_last_used))
+
+    def close(self):
+        """停止后台线程，写入剩余的最近使用时间并关闭数据库"""
+        with self.pending_condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.pending_condition.notify()
+        self.flusher.join()
+        self.flush()
+        with self.lock:
+            self.conn.close()
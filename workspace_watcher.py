@@ -0,0 +1,482 @@
+import os
+import time
+import errno
+import struct
+import ctypes
+import selectors
+import threading
+
+from ignore_rules import IGNORE_FILES
+
+# inotify 常量（<sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+READ_SIZE = 65536
+
+class Inotify:
+    """inotify 的 ctypes 封装，不可用时（非 Linux）构造函数抛出 OSError"""
+
+    def __init__(self):
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            self._init = libc.inotify_init1
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+        except (OSError, AttributeError) as e:
+            raise OSError(f"inotify 不可用: {e}")
+        self._init.argtypes = [ctypes.c_int]
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = self._init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def remove_watch(self, wd):
+        self._rm_watch(self.fd, wd)  # 目录已删除时内核已移除监听，忽略错误
+
+    def read_events(self):
+        """读取所有已到达的事件，返回 [(wd, mask, cookie, name)]"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                events.append((wd, mask, cookie, name))
+
+class WorkspaceTree:
+    """一个环境的目录缓存：只缓存客户端加载过的目录，并监听这些目录的变化"""
+
+    def __init__(self, env_path, root, user_id):
+        self.env_path = env_path
+        self.root = root
+        self.user_id = user_id
+        self.subscribers = 0
+        self.directories = {}  # 绝对路径 -> {'entries': {名称: 是否目录}, 'sorted', 'wd', 'stats'}
+        self.pending = []  # 尚未推送的变更
+        self.pending_since = None
+        self.modified = set()  # 本批次中已新增或已记录为 modified 的路径（不再重复推送 modified）
+        self.moves = {}  # inotify cookie -> 等待配对的 IN_MOVED_FROM 事件
+        self.scanning = {}  # 已监听、正在读取的目录 -> 读取期间收到的 inotify 事件
+        self.overflowed = False
+
+    def contains(self, path):
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def virtual_path(self, path):
+        """宿主机上的路径 -> 环境中的路径（与文件树接口中的 path 相同）"""
+        return '/' + os.path.relpath(path, self.env_path)
+
+class WorkspaceWatcher:
+    """工作区文件树缓存与变更推送
+
+    每个环境一棵 WorkspaceTree，只缓存客户端请求过的目录（按层加载的文件树），
+    列目录时直接返回缓存，不再读取磁盘。缓存的目录用 inotify 监听（所有环境共用
+    一个 inotify 实例和一个线程），没有 inotify 时每 poll_interval 秒重新扫描缓存的目录。
+    变更（added / removed / renamed / modified）更新缓存，并在 debounce 秒内合并后
+    回调 on_delta(env_path, user_id, events)；单批变更超过 max_events 时改为一个
+    invalidated 事件，由客户端重新加载。
+    没有订阅者（客户端连接）的环境不缓存，列目录时直接读取磁盘。
+    """
+
+    def __init__(self, on_delta, backend='auto', workspace='/home/user', debounce=0.1,
+                 poll_interval=2, max_directories=2000, max_events=500):
+        self.on_delta = on_delta
+        self.workspace = workspace.strip('/')
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.max_directories = max_directories
+        self.max_events = max_events
+        self.lock = threading.Lock()
+        self.trees = {}  # env_path -> WorkspaceTree
+        self.watches = {}  # inotify wd -> (WorkspaceTree, 目录路径)
+        self.thread = None
+        self.next_poll = 0
+        self.rescan_pending = False  # inotify 事件队列溢出后需要重新扫描
+        self.counters = {'cache_hits': 0, 'cache_misses': 0, 'events': 0, 'batches': 0,
+                         'overflows': 0, 'polls': 0, 'watch_errors': 0}
+        self.selector = selectors.DefaultSelector()
+
+        self.inotify = None
+        if backend in ('auto', 'inotify'):
+            try:
+                self.inotify = Inotify()
+                self.selector.register(self.inotify.fd, selectors.EVENT_READ)
+            except OSError as e:
+                print(f"{e}，文件变更改为轮询检测")
+        self.backend = 'inotify' if self.inotify else 'polling'
+
+    def subscribe(self, env_path, user_id):
+        """客户端连接时调用，开始缓存并监听该环境的工作区"""
+        env_path = os.path.abspath(env_path)
+        with self.lock:
+            tree = self.trees.get(env_path)
+            if tree is None:
+                tree = WorkspaceTree(env_path, os.path.join(env_path, self.workspace), user_id)
+                self.trees[env_path] = tree
+            tree.subscribers += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name="workspace-watcher", daemon=True)
+                self.thread.start()
+
+    def unsubscribe(self, env_path):
+        """客户端断开时调用，最后一个客户端断开后丢弃缓存并停止监听"""
+        env_path = os.path.abspath(env_path)
+        with self.lock:
+            tree = self.trees.get(env_path)
+            if tree is None:
+                return
+            tree.subscribers -= 1
+            if tree.subscribers <= 0:
+                self._drop(tree, tree.root)
+                del self.trees[env_path]
+
+    def scan_directory(self, env_path, path, scan):
+        """列出目录内容：已缓存时返回缓存，否则用 scan(path) 读取并缓存（先监听后读取，不会漏掉变更）"""
+        env_path = os.path.abspath(env_path)
+        path = os.path.abspath(path)
+        with self.lock:
+            tree = self.trees.get(env_path)
+            if tree is not None and tree.contains(path) and path not in tree.scanning:
+                directory = tree.directories.get(path)
+                if directory is not None:
+                    self.counters['cache_hits'] += 1
+                    if directory['sorted'] is None:
+                        directory['sorted'] = sorted(directory['entries'].items(),
+                                                     key=lambda item: (not item[1], item[0].lower()))
+                    return directory['sorted']
+                self.counters['cache_misses'] += 1
+                if len(tree.directories) >= self.max_directories:
+                    tree = None
+            else:
+                tree = None
+        if tree is None:
+            return scan(path)
+
+        wd = None
+        if self.inotify:
+            try:
+                wd = self.inotify.add_watch(path)
+            except OSError as e:
+                with self.lock:
+                    self.counters['watch_errors'] += 1
+                if e.errno not in (errno.ENOENT, errno.ENOTDIR):  # 由 scan 报告
+                    print(f"监听目录失败: {e}")
+                return scan(path)
+
+        with self.lock:
+            if self.trees.get(env_path) is not tree or path in tree.directories or path in tree.scanning:
+                # 订阅已取消，或其他请求已经（正在）缓存该目录
+                if wd is not None and wd not in self.watches:
+                    self.inotify.remove_watch(wd)
+                tree = None
+            else:
+                # 读取前登记监听，读取期间到达的事件先缓存，读取完成后按顺序重放
+                tree.scanning[path] = []
+                if wd is not None:
+                    self.watches[wd] = (tree, path)
+        if tree is None:
+            return scan(path)
+
+        try:
+            entries = scan(path)
+        except OSError:
+            with self.lock:
+                tree.scanning.pop(path, None)
+                if wd is not None and self.watches.pop(wd, None):
+                    self.inotify.remove_watch(wd)
+            raise
+
+        with self.lock:
+            events = tree.scanning.pop(path, [])
+            if self.trees.get(env_path) is not tree:
+                # 读取期间订阅已取消
+                if wd is not None and self.watches.get(wd, (None,))[0] is tree:
+                    del self.watches[wd]
+                    self.inotify.remove_watch(wd)
+                return entries
+            tree.directories[path] = {'entries': dict(entries), 'sorted': entries, 'wd': wd, 'stats': None}
+            if not events:
+                return entries
+            for event in events:
+                self._handle_event(*event)
+            directory = tree.directories.get(path)
+            if directory is None:
+                return entries
+            if directory['sorted'] is None:
+                directory['sorted'] = sorted(directory['entries'].items(),
+                                             key=lambda item: (not item[1], item[0].lower()))
+            return directory['sorted']
+
+    def refresh(self, env_path, paths):
+        """文件接口修改磁盘后调用：重新扫描 paths 所在的已缓存目录并立即推送变更"""
+        env_path = os.path.abspath(env_path)
+        with self.lock:
+            tree = self.trees.get(env_path)
+            if tree is None:
+                return
+            directories = set()
+            for path in paths:
+                path = os.path.abspath(path)
+                while tree.contains(path):
+                    if path in tree.directories:
+                        directories.add(path)
+                    path = os.path.dirname(path)
+        for path in directories:
+            listing = self._list(path, False)
+            with self.lock:
+                if self.trees.get(env_path) is tree:
+                    self._apply_listing(tree, path, listing)
+        self._flush([tree])
+
+    def _list(self, path, track_stats):
+        """读取目录：返回 ({名称: 是否目录}, {文件名: (mtime, 大小)} 或 None)，目录不存在返回 None"""
+        entries = {}
+        stats = {} if track_stats else None
+        try:
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    try:
+                        is_dir = entry.is_dir()
+                        if track_stats and not is_dir:
+                            stat = entry.stat()
+                            stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        is_dir = False
+                    entries[entry.name] = is_dir
+        except OSError:
+            return None
+        return entries, stats
+
+    def _apply_listing(self, tree, path, listing):
+        """把目录的最新内容与缓存比较，记录差异"""
+        directory = tree.directories.get(path)
+        if directory is None:
+            return
+        if listing is None:
+            # 目录已不存在，由父目录的扫描记录删除
+            self._drop(tree, path)
+            return
+        entries, stats = listing
+        old_entries = directory['entries']
+        for name, is_dir in list(old_entries.items()):
+            if entries.get(name) != is_dir:
+                self._removed(tree, path, name)
+        for name, is_dir in entries.items():
+            if name not in old_entries:
+                self._added(tree, path, name, is_dir)
+        if stats is not None:
+            if directory['stats'] is not None:
+                for name, stat in stats.items():
+                    previous = directory['stats'].get(name)
+                    if previous is not None and previous != stat:
+                        self._modified(tree, path, name)
+            directory['stats'] = stats
+
+    def _added(self, tree, path, name, is_dir, old_path=None):
+        directory = tree.directories[path]
+        if directory['entries'].get(name) == is_dir and old_path is None:
+            return  # 已经记录（如文件接口刷新后又收到 inotify 事件）
+        if name in directory['entries']:
+            self._removed(tree, path, name)
+        directory['entries'][name] = is_dir
+        directory['sorted'] = None
+        event = {'type': 'added', 'path': tree.virtual_path(os.path.join(path, name)), 'is_dir': is_dir}
+        tree.modified.add(event['path'])
+        if old_path is not None:
+            event['type'] = 'renamed'
+            event['old_path'] = old_path
+        self._record(tree, event)
+        if name in IGNORE_FILES:
+            self._record(tree, {'type': 'invalidated', 'path': tree.virtual_path(path)})
+
+    def _removed(self, tree, path, name, cookie=None):
+        directory = tree.directories[path]
+        if name not in directory['entries']:
+            return
+        is_dir = directory['entries'].pop(name)
+        directory['sorted'] = None
+        if directory['stats'] is not None:
+            directory['stats'].pop(name, None)
+        if is_dir:
+            self._drop(tree, os.path.join(path, name))
+        event = {'type': 'removed', 'path': tree.virtual_path(os.path.join(path, name)), 'is_dir': is_dir}
+        if cookie is not None:
+            tree.moves[cookie] = event  # 等待同一 cookie 的 IN_MOVED_TO，配对后记录为 renamed
+            if tree.pending_since is None:
+                tree.pending_since = time.monotonic()
+        else:
+            self._record(tree, event)
+        if name in IGNORE_FILES:
+            self._record(tree, {'type': 'invalidated', 'path': tree.virtual_path(path)})
+
+    def _modified(self, tree, path, name):
+        virtual_path = tree.virtual_path(os.path.join(path, name))
+        if virtual_path in tree.modified:
+            return
+        tree.modified.add(virtual_path)
+        self._record(tree, {'type': 'modified', 'path': virtual_path, 'is_dir': False})
+        if name in IGNORE_FILES:
+            self._record(tree, {'type': 'invalidated', 'path': tree.virtual_path(path)})
+
+    def _record(self, tree, event):
+        if tree.pending_since is None:
+            tree.pending_since = time.monotonic()
+        self.counters['events'] += 1
+        if tree.overflowed or (event['type'] == 'invalidated' and event in tree.pending):
+            return
+        if len(tree.pending) >= self.max_events:
+            # 变更太多时客户端直接重新加载整个文件树
+            tree.pending = [{'type': 'invalidated', 'path': tree.virtual_path(tree.root)}]
+            tree.overflowed = True
+            self.counters['overflows'] += 1
+            return
+        tree.pending.append(event)
+
+    def _drop(self, tree, path):
+        """丢弃 path 及其子目录的缓存并停止监听"""
+        prefix = path + os.sep
+        for directory_path in [p for p in tree.directories if p == path or p.startswith(prefix)]:
+            wd = tree.directories.pop(directory_path)['wd']
+            if wd is not None and self.watches.pop(wd, None):
+                self.inotify.remove_watch(wd)
+
+    def _handle_event(self, wd, mask, cookie, name):
+        if mask & IN_Q_OVERFLOW:
+            # 事件队列溢出：由 _loop 在释放锁后重新扫描所有缓存的目录
+            self.counters['overflows'] += 1
+            self.rescan_pending = True
+            return
+
+        watch = self.watches.get(wd)
+        if watch is None:
+            return
+        tree, path = watch
+        if path in tree.scanning:
+            tree.scanning[path].append((wd, mask, cookie, name))
+            return
+        if mask & IN_IGNORED:
+            # 目录已删除，内核已移除监听
+            self.watches.pop(wd, None)
+            directory = tree.directories.get(path)
+            if directory is not None:
+                directory['wd'] = None
+                self._drop(tree, path)
+            return
+        if path not in tree.directories or not name:
+            return
+
+        is_dir = bool(mask & IN_ISDIR)
+        if mask & IN_MOVED_TO:
+            move = tree.moves.pop(cookie, None) if cookie else None
+            self._added(tree, path, name, is_dir, move['path'] if move else None)
+        elif mask & IN_CREATE:
+            self._added(tree, path, name, is_dir)
+        elif mask & IN_MOVED_FROM:
+            self._removed(tree, path, name, cookie or None)
+        elif mask & IN_DELETE:
+            self._removed(tree, path, name)
+        elif mask & IN_CLOSE_WRITE and not is_dir:
+            self._modified(tree, path, name)
+
+    def _rescan(self, track_stats):
+        """重新扫描所有缓存的目录（不持有锁读取磁盘），track_stats 时同时比较文件的修改时间"""
+        with self.lock:
+            targets = [(tree, path) for tree in self.trees.values() for path in tree.directories]
+        for tree, path in targets:
+            listing = self._list(path, track_stats)
+            with self.lock:
+                if self.trees.get(tree.env_path) is tree:
+                    self._apply_listing(tree, path, listing)
+
+    def _flush(self, trees=None, now=None):
+        """推送已到期（now 为 None 时为全部）的变更"""
+        batches = []
+        with self.lock:
+            for tree in (trees if trees is not None else list(self.trees.values())):
+                if tree.pending_since is None:
+                    continue
+                if now is not None and tree.pending_since is not None and now - tree.pending_since < self.debounce:
+                    continue
+                # 没有配对的 IN_MOVED_FROM：移出了工作区
+                for event in tree.moves.values():
+                    self._record(tree, event)
+                events = tree.pending
+                tree.pending, tree.pending_since, tree.moves, tree.overflowed = [], None, {}, False
+                tree.modified = set()
+                if events:
+                    self.counters['batches'] += 1
+                    batches.append((tree.env_path, tree.user_id, events))
+
+        for env_path, user_id, events in batches:
+            try:
+                self.on_delta(env_path, user_id, events)
+            except Exception as e:
+                print(f"推送文件变更失败: {e}")
+
+    def _next_timeout(self, now):
+        deadlines = [tree.pending_since + self.debounce for tree in self.trees.values() if tree.pending_since is not None]
+        if not self.inotify:
+            deadlines.append(self.next_poll)
+        if not deadlines:
+            return None
+        return max(0, min(deadlines) - now)
+
+    def _loop(self):
+        while True:
+            with self.lock:
+                timeout = self._next_timeout(time.monotonic())
+            if self.inotify:
+                if self.selector.select(timeout):
+                    events = self.inotify.read_events()
+                    with self.lock:
+                        for event in events:
+                            self._handle_event(*event)
+                        rescan, self.rescan_pending = self.rescan_pending, False
+                    if rescan:
+                        self._rescan(False)
+            else:
+                time.sleep(timeout)
+                if time.monotonic() >= self.next_poll:
+                    with self.lock:
+                        self.counters['polls'] += 1
+                    self._rescan(True)
+                    self.next_poll = time.monotonic() + self.poll_interval
+            self._flush(now=time.monotonic())
+
+    def get_stats(self):
+        with self.lock:
+            return dict(
+                self.counters,
+                backend=self.backend,
+                environments=len(self.trees),
+                cached_directories=sum(len(tree.directories) for tree in self.trees.values()),
+                watches=len(self.watches)
+            )